@@ -0,0 +1,94 @@
+"""
+Write-coalescing tracker for UserSession.last_active_at.
+
+Requests only touch the cache: the last-seen timestamp of each session is
+stored under its session key, and refreshed at most once per
+SESSION_ACTIVITY_GRANULARITY seconds. ``flush_session_activity`` (Celery beat
+or the management command of the same name) copies the cached timestamps
+into ``user_sessions`` in batches, writing only rows that are at least one
+granularity behind.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger('accounts')
+
+ACTIVITY_GRANULARITY = getattr(settings, 'SESSION_ACTIVITY_GRANULARITY', 60)
+FLUSH_BATCH_SIZE = 500
+
+
+def _cache_key(session_key: str) -> str:
+    return f'accounts:activity:{session_key}'
+
+
+def record_activity(request) -> None:
+    """Note that the request's session is active; never writes to the database on the hot path"""
+    session_key = request.session.session_key
+    if not session_key:
+        return
+
+    key = _cache_key(session_key)
+    now = timezone.now().timestamp()
+    last_seen = cache.get(key)
+    if last_seen is not None and now - last_seen < ACTIVITY_GRANULARITY:
+        return
+
+    cache.set(key, now, settings.SESSION_COOKIE_AGE)
+    if last_seen is None:
+        # First sighting since the cache entry expired: make sure the session
+        # is tracked at all (the login signal normally created it already).
+        _ensure_session_record(request, session_key)
+
+
+def _ensure_session_record(request, session_key: str) -> None:
+    from .models import UserSession
+    from .utils import get_client_ip
+
+    UserSession.objects.get_or_create(
+        user=request.user,
+        session_key=session_key,
+        is_active=True,
+        defaults={
+            'ip_address': get_client_ip(request) or '127.0.0.1',
+            'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+        }
+    )
+
+
+def flush_session_activity() -> int:
+    """Persist cached last-seen timestamps for active sessions. Returns the number of rows written."""
+    from .models import UserSession
+
+    granularity = timedelta(seconds=ACTIVITY_GRANULARITY)
+    written = 0
+    batch = []
+
+    def write(rows):
+        keys = {_cache_key(row.session_key): row for row in rows}
+        changed = []
+        for key, last_seen in cache.get_many(list(keys)).items():
+            row = keys[key]
+            seen_at = datetime.fromtimestamp(last_seen, tz=dt_timezone.utc)
+            if seen_at - row.last_active_at >= granularity:
+                row.last_active_at = seen_at
+                changed.append(row)
+        if changed:
+            UserSession.objects.bulk_update(changed, ['last_active_at'])
+        return len(changed)
+
+    sessions = UserSession.objects.filter(is_active=True).only('id', 'session_key', 'last_active_at')
+    for session in sessions.iterator(chunk_size=FLUSH_BATCH_SIZE):
+        batch.append(session)
+        if len(batch) >= FLUSH_BATCH_SIZE:
+            written += write(batch)
+            batch = []
+    if batch:
+        written += write(batch)
+
+    if written:
+        logger.info(f"Flushed activity for {written} sessions")
+    return written
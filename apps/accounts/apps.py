@@ -5,4 +5,6 @@ class AccountsConfig(AppConfig):
     name = 'apps.accounts'
 
     def ready(self):
-        import apps.accounts.signals
\ No newline at end of file
+        import apps.accounts.signals
+        from apps.accounts import search
+        search.register()
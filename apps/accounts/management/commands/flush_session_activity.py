@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from apps.accounts.activity import flush_session_activity
+
+
+class Command(BaseCommand):
+    help = 'Writes cached session last-seen times to the user_sessions table.'
+
+    def handle(self, *args, **options):
+        written = flush_session_activity()
+        self.stdout.write(self.style.SUCCESS(f'Updated activity for {written} sessions.'))
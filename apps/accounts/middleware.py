@@ -7,12 +7,18 @@ from django.db import IntegrityError, DatabaseError, OperationalError
 from django.core.exceptions import ValidationError
 from django.contrib import messages
 from django.utils.deprecation import MiddlewareMixin
-from .models import UserSession
+from .activity import record_activity
 
 logger = logging.getLogger(__name__)
 
 class UserActivityMiddleware:
-    """Middleware to track user activity and update session records"""
+    """
+    Middleware to track user activity on session records.
+
+    Last-seen times are coalesced in the cache (see activity.py) and flushed
+    to UserSession in batches, so ordinary requests do not write to the
+    database.
+    """
     
     def __init__(self, get_response):
         self.get_response = get_response
@@ -21,37 +27,16 @@ class UserActivityMiddleware:
         # Before processing the request
         if request.user.is_authenticated and hasattr(request, 'session'):
             try:
-                session = UserSession.objects.get(
-                    user=request.user,
-                    session_key=request.session.session_key,
-                    is_active=True
-                )
-                session.last_activity = timezone.now()
-                session.save(update_fields=['last_activity'])
-            except UserSession.DoesNotExist:
-                # Create session record if it doesn't exist
-                UserSession.objects.create(
-                    user=request.user,
-                    session_key=request.session.session_key,
-                    ip_address=self.get_client_ip(request),
-                    user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                    is_active=True
-                )
+                record_activity(request)
+            except Exception as e:
+                # Activity tracking must never break the request
+                logger.warning(f"Failed to record session activity for {request.user.username}: {e}")
 
         response = self.get_response(request)
         
         # After processing the request
         return response
 
-    def get_client_ip(self, request):
-        """Get client IP address from request"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-
 
 class SessionSecurityMiddleware:
     """Middleware for session security enhancements"""
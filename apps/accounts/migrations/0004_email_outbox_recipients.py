@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='recipients',
+            field=models.JSONField(blank=True, default=list, help_text='Per-recipient message versions for batched sends'),
+        ),
+    ]
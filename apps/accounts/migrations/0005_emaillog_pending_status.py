@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_email_outbox_recipients'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emaillog',
+            name='status',
+            field=models.CharField(
+                choices=[
+                    ('PENDING', 'Pending'), ('SENT', 'Sent'), ('DELIVERED', 'Delivered'), ('BOUNCED', 'Bounced'),
+                    ('OPENED', 'Opened'), ('CLICKED', 'Clicked'), ('FAILED', 'Failed'),
+                ],
+                default='SENT',
+                max_length=20,
+            ),
+        ),
+    ]
@@ -4,6 +4,9 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.core.tracking import ChangeTrackingMixin
 
 
 class Role(models.Model):
@@ -21,7 +24,7 @@ class Role(models.Model):
         return self.name
 
 
-class UserProfile(models.Model):
+class UserProfile(ChangeTrackingMixin, models.Model):
     """Extended user profile information"""
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -71,6 +74,7 @@ class EmailLog(models.Model):
     """Telemetry of email sends (Brevo/other providers)"""
     
     STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
         ('SENT', 'Sent'),
         ('DELIVERED', 'Delivered'),
         ('BOUNCED', 'Bounced'),
@@ -106,6 +110,45 @@ class EmailLog(models.Model):
         return f"Email to {self.to_email} - {self.subject}"
 
 
+class EmailOutbox(models.Model):
+    """Transactional outbox of rendered emails waiting for delivery"""
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    email_log = models.ForeignKey(EmailLog, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox_entries')
+    to_email = models.EmailField()
+    to_name = models.CharField(max_length=255, blank=True)
+    subject = models.CharField(max_length=255)
+    template_name = models.CharField(max_length=100, blank=True)
+    html_content = models.TextField()
+    text_content = models.TextField(blank=True)
+    recipients = models.JSONField(default=list, blank=True, help_text="Per-recipient message versions for batched sends")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    message_id = models.CharField(max_length=255, blank=True, help_text="Provider message ID")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'email_outbox'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='email_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Outbox email to {self.to_email} - {self.subject} ({self.status})"
+
+
 class UserSession(models.Model):
     """Track user sessions"""
 
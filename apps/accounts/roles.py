@@ -0,0 +1,61 @@
+"""
+Role resolution shared by every permission check.
+
+A user's role names are resolved with a single query, memoised on the user
+object for the rest of the request (``request.user`` is the same instance
+throughout) and kept in the shared cache across requests. The cache entry is
+dropped by the UserProfile/Role signal handlers in ``signals.py``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+ROLE_CACHE_TIMEOUT = getattr(settings, 'ROLE_CACHE_TIMEOUT', 300)
+
+# Roles allowed to review and approve projects
+MANAGER_ROLES = ('Admin', 'Approver')
+
+_REQUEST_ATTR = '_docuhub_roles'
+
+
+def _cache_key(user_id) -> str:
+    return f'accounts:roles:{user_id}'
+
+
+def get_user_roles(user) -> frozenset:
+    """Return the set of role names held by ``user`` (empty for anonymous users)"""
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, _REQUEST_ATTR, None)
+    if roles is not None:
+        return roles
+
+    key = _cache_key(user.pk)
+    cached = cache.get(key)
+    if cached is None:
+        from .models import UserProfile
+        cached = tuple(
+            name for name in UserProfile.objects.filter(user_id=user.pk).values_list('role__name', flat=True)
+            if name
+        )
+        cache.set(key, cached, ROLE_CACHE_TIMEOUT)
+
+    roles = frozenset(cached)
+    setattr(user, _REQUEST_ATTR, roles)
+    return roles
+
+
+def has_role(user, *role_names) -> bool:
+    """True if ``user`` holds any of ``role_names``"""
+    return not get_user_roles(user).isdisjoint(role_names)
+
+
+def invalidate_user_roles(*user_ids) -> None:
+    """Drop cached role sets, e.g. after a profile's role changed"""
+    if user_ids:
+        cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+def forget_user_roles(user) -> None:
+    """Drop the per-request memo on a user instance"""
+    user.__dict__.pop(_REQUEST_ATTR, None)
@@ -0,0 +1,33 @@
+"""Search source for users; registered from AccountsConfig.ready()"""
+from django.contrib.auth.models import User
+
+from apps.core import search
+
+from .models import UserProfile
+
+
+def _join(*parts) -> str:
+    return ' '.join(part for part in parts if part)
+
+
+def build_user(user) -> dict:
+    try:
+        profile = user.profile
+    except UserProfile.DoesNotExist:
+        profile = None
+    return {
+        'title': user.get_full_name(),
+        'keywords': _join(user.username, user.email, profile and profile.phone_number),
+        'body': profile.department if profile else '',
+    }
+
+
+def register():
+    search.register(
+        'user', User, build_user,
+        fields={'username', 'email', 'first_name', 'last_name'},
+        queryset=lambda: User.objects.select_related('profile'),
+    )
+    search.register_dependent(
+        UserProfile, 'user', lambda profile: [profile.user], fields={'phone_number', 'department'},
+    )
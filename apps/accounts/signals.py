@@ -5,7 +5,8 @@ from django.contrib.auth.models import User
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.utils import timezone
 from django.db import IntegrityError, DatabaseError
-from .models import UserProfile, UserSession, NotificationPreferences
+from .models import Role, UserProfile, UserSession, NotificationPreferences
+from .roles import invalidate_user_roles, forget_user_roles
 
 logger = logging.getLogger(__name__)
 
@@ -142,4 +143,19 @@ def cleanup_user_data(sender, instance, **kwargs):
     except DatabaseError as e:
         logger.error(f"DatabaseError cleaning up data for deleted user {instance.username}: {e}")
     except Exception as e:
-        logger.error(f"Unexpected error cleaning up data for deleted user {instance.username}: {e}")
\ No newline at end of file
+        logger.error(f"Unexpected error cleaning up data for deleted user {instance.username}: {e}")
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_roles(sender, instance, **kwargs):
+    """Drop the cached role set when a user's profile changes"""
+    invalidate_user_roles(instance.user_id)
+    if UserProfile.user.is_cached(instance):
+        forget_user_roles(instance.user)
+
+@receiver(post_save, sender=Role)
+def invalidate_role_members(sender, instance, created, **kwargs):
+    """Renaming a role changes the role set of everyone holding it"""
+    if created:
+        return
+    invalidate_user_roles(*UserProfile.objects.filter(role=instance).values_list('user_id', flat=True))
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .activity import flush_session_activity as flush_activity
+
+
+@shared_task(ignore_result=True)
+def flush_session_activity():
+    """Periodic batch write of cached session activity"""
+    return flush_activity()
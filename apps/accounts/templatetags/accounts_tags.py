@@ -1,4 +1,5 @@
 from django import template
+from apps.accounts.roles import has_role as user_has_role
 
 register = template.Library()
 
@@ -7,9 +8,4 @@ def has_role(user, role_name):
     """
     Checks if a user has a specific role.
     """
-    if not user.is_authenticated:
-        return False
-    try:
-        return user.profile.role.name == role_name
-    except AttributeError:
-        return False
+    return user_has_role(user, role_name)
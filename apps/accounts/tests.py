@@ -0,0 +1,47 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone
+from apps.accounts import activity
+from apps.accounts.models import UserSession
+
+User = get_user_model()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SessionActivityTrackerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='active', email='active@example.com', password='password123')
+        self.session = UserSession.objects.create(
+            user=self.user, session_key='sess-1', ip_address='10.0.0.1', is_active=True
+        )
+        UserSession.objects.filter(pk=self.session.pk).update(last_active_at=timezone.now() - timedelta(hours=1))
+
+    def make_request(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        request.user = self.user
+        request.session = type('Session', (), {'session_key': 'sess-1'})()
+        return request
+
+    def test_repeat_requests_do_not_touch_the_database(self):
+        request = self.make_request()
+        with self.assertNumQueries(1):  # existence check on first sighting only
+            activity.record_activity(request)
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                activity.record_activity(request)
+
+    def test_flush_writes_stale_rows_in_one_batch(self):
+        activity.record_activity(self.make_request())
+        # select active sessions, bulk update
+        with self.assertNumQueries(2):
+            self.assertEqual(activity.flush_session_activity(), 1)
+        self.session.refresh_from_db()
+        self.assertLess(timezone.now() - self.session.last_active_at, timedelta(minutes=1))
+
+    def test_flush_skips_rows_within_granularity(self):
+        UserSession.objects.filter(pk=self.session.pk).update(last_active_at=timezone.now())
+        activity.record_activity(self.make_request())
+        self.assertEqual(activity.flush_session_activity(), 0)
@@ -21,6 +21,7 @@ from .forms import (
     AdminUserCreationForm, AdminUserUpdateForm, UserSearchForm, PasswordResetRequestForm
 )
 from .utils import get_client_ip, get_user_statistics, send_account_setup_email, is_admin_role_user
+from apps.core.search import search_ids
 
 try:
     from apps.projects.models import Project
@@ -153,12 +154,7 @@ def admin_users_list(request):
         status = form.cleaned_data.get('status')
 
         if search_query:
-            users = users.filter(
-                Q(username__icontains=search_query) |
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(email__icontains=search_query)
-            )
+            users = users.filter(pk__in=search_ids('user', search_query))
         if role:
             users = users.filter(profile__role=role)
         if status == 'active':
@@ -239,7 +235,7 @@ def admin_user_edit(request, user_id):
 def admin_user_sessions(request, user_id):
     """Admin view to list all of a user's login sessions."""
     user = get_object_or_404(User.objects.select_related('profile'), pk=user_id)
-    session_list = UserSession.objects.filter(user=user).order_by('-created_at')
+    session_list = UserSession.objects.filter(user=user).order_by('-login_at')
 
     paginator = Paginator(session_list, 20)
     page_number = request.GET.get('page')
@@ -349,6 +345,9 @@ from django.contrib.auth import authenticate
 from django.views.decorators.csrf import csrf_exempt
 # from .models import Role  # Role model removed in ERD restructure
 from .serializers import UserProfileSerializer, ChangePasswordSerializer
+from apps.core.pagination import (
+    DefaultCursorPagination, EXPORT_CONTENT_TYPES, export_response, iter_export_rows
+)
 from django.contrib.auth import update_session_auth_hash
 
 @csrf_exempt
@@ -497,10 +496,52 @@ def api_password_reset_request(request):
 
 # --- User Management API Views ---
 
+class UserCursorPagination(DefaultCursorPagination):
+    ordering = ('-date_joined', '-id')
+
+
+def _user_payload(user):
+    """API representation of a user and their profile"""
+    profile = user.profile
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_active': user.is_active,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'date_joined': user.date_joined.isoformat(),
+        'last_login': user.last_login.isoformat() if user.last_login else None,
+        'profile': {
+            'department': profile.department,
+            'phone_number': profile.phone_number,
+            'job_title': profile.job_title,
+            'employee_id': profile.employee_id,
+            'bio': profile.bio,
+            'location': profile.location,
+            'hire_date': profile.hire_date.isoformat() if profile.hire_date else None,
+            'is_active_employee': profile.is_active_employee,
+            'email_notifications': profile.email_notifications,
+            'sms_notifications': profile.sms_notifications,
+            'role': {
+                'id': str(profile.role.id),
+                'name': profile.role.name,
+                'description': profile.role.description,
+            } if profile.role else None
+        }
+    }
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def api_users_list(request):
-    """API endpoint to list all users with filtering"""
+    """
+    API endpoint to list users with filtering.
+
+    Pages with a cursor (``next`` / ``previous`` links); ``?export=ndjson``
+    or ``?export=json`` streams every matching user instead.
+    """
     if not request.user.is_staff:
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
     
@@ -512,13 +553,7 @@ def api_users_list(request):
     status_filter = request.GET.get('status', '')
     
     if search:
-        users = users.filter(
-            Q(username__icontains=search) |
-            Q(first_name__icontains=search) |
-            Q(last_name__icontains=search) |
-            Q(email__icontains=search) |
-            Q(profile__employee_id__icontains=search)
-        )
+        users = users.filter(pk__in=search_ids('user', search))
     
     if role_id:
         users = users.filter(profile__role_id=role_id)
@@ -530,41 +565,21 @@ def api_users_list(request):
     elif status_filter == 'staff':
         users = users.filter(is_staff=True)
     
-    # Serialize user data
-    user_data = []
-    for user in users:
-        profile = user.profile
-        user_data.append({
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'is_active': user.is_active,
-            'is_staff': user.is_staff,
-            'is_superuser': user.is_superuser,
-            'date_joined': user.date_joined.isoformat(),
-            'last_login': user.last_login.isoformat() if user.last_login else None,
-            'profile': {
-                'department': profile.department,
-                'phone_number': profile.phone_number,
-                'job_title': profile.job_title,
-                'employee_id': profile.employee_id,
-                'bio': profile.bio,
-                'location': profile.location,
-                'hire_date': profile.hire_date.isoformat() if profile.hire_date else None,
-                'is_active_employee': profile.is_active_employee,
-                'email_notifications': profile.email_notifications,
-                'sms_notifications': profile.sms_notifications,
-                'role': {
-                    'id': str(profile.role.id),
-                    'name': profile.role.name,
-                    'description': profile.role.description,
-                } if profile.role else None
-            }
-        })
+    export = request.GET.get('export')
+    if export:
+        if export not in EXPORT_CONTENT_TYPES:
+            return Response({'error': f"export must be one of: {', '.join(EXPORT_CONTENT_TYPES)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        rows = iter_export_rows(users.order_by(*UserCursorPagination.ordering), _user_payload)
+        return export_response(rows, export, filename='users')
     
-    return Response({'users': user_data}, status=status.HTTP_200_OK)
+    paginator = UserCursorPagination()
+    page = paginator.paginate_queryset(users, request)
+    return Response({
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'users': [_user_payload(user) for user in page],
+    }, status=status.HTTP_200_OK)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.core import search
+from apps.core.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search documents (and inverted index postings) from the source tables.'
+
+    def add_arguments(self, parser):
+        kinds = [kind for kind, _ in SearchDocument.KIND_CHOICES]
+        parser.add_argument('--kind', choices=kinds, action='append',
+                            help='Only rebuild this kind (repeatable); default is all')
+
+    def handle(self, *args, **options):
+        for kind in options['kind'] or [kind for kind, _ in SearchDocument.KIND_CHOICES]:
+            count = search.rebuild(kind)
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} {kind} search documents."))
@@ -2,43 +2,111 @@
 Custom middleware for security enhancements and rate limiting.
 """
 import logging
-from django.http import HttpResponseTooManyRequests, JsonResponse
+import re
+import time
+from functools import wraps
+from urllib.parse import unquote_plus
+
+from django.http import HttpResponse, JsonResponse
 from django.utils.deprecation import MiddlewareMixin
-from django.core.cache import cache
 from django.conf import settings
-from django.utils import timezone
-from datetime import timedelta
 import hashlib
 
+from . import ratelimit
+
 logger = logging.getLogger('security')
 
 
+# Content Security Policy
+CONTENT_SECURITY_POLICY = (
+    "default-src 'self'; "
+    "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com "
+    "https://cdn.tailwindcss.com https://unpkg.com; "
+    "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
+    "img-src 'self' data: https:; "
+    "font-src 'self' https://cdnjs.cloudflare.com; "
+    "connect-src 'self'; "
+    "frame-ancestors 'none';"
+)
+
+# Headers that are identical on every response, built once at import
+STATIC_SECURITY_HEADERS = (
+    ('X-Content-Type-Options', 'nosniff'),
+    ('X-Frame-Options', 'DENY'),
+    ('X-XSS-Protection', '1; mode=block'),
+    ('Referrer-Policy', 'strict-origin-when-cross-origin'),
+    ('Content-Security-Policy', CONTENT_SECURITY_POLICY),
+)
+HSTS_HEADER = 'max-age=31536000; includeSubDomains; preload'
+
+# Probes for software this site does not run; its own /admin/ pages are not suspicious
+SUSPICIOUS_PATTERNS = (
+    'wp-admin',
+    'phpmyadmin',
+    '.php',
+    '../',
+    'eval(',
+    'script>',
+)
+
+# SQL is only suspicious as a statement shape, so words like "selected" or
+# "dropdown" in an ordinary query string do not match
+SQL_INJECTION_PATTERNS = (
+    r'\bunion\b(?:\s+all)?\s+\bselect\b',
+    r'\bselect\b.+\bfrom\b',
+    r'\bdrop\s+(?:table|database)\b',
+)
+
+# All patterns in one case-insensitive alternation so a request is scanned once
+SUSPICIOUS_REQUEST_RE = re.compile(
+    '|'.join([re.escape(pattern) for pattern in SUSPICIOUS_PATTERNS] + list(SQL_INJECTION_PATTERNS)),
+    re.IGNORECASE
+)
+
+_TIMINGS_ATTR = '_security_timings'
+
+
+def timed(name):
+    """Record the wall time of a middleware hook in the request's timing counters"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return method(self, request, *args, **kwargs)
+            finally:
+                timings = request.__dict__.setdefault(_TIMINGS_ATTR, {})
+                timings[name] = timings.get(name, 0) + time.perf_counter_ns() - start
+        return wrapper
+    return decorator
+
+
+def get_request_timings(request) -> dict:
+    """Nanoseconds spent in each timed middleware hook for ``request``"""
+    return dict(getattr(request, _TIMINGS_ATTR, {}))
+
+
 class SecurityHeadersMiddleware(MiddlewareMixin):
     """
     Add security headers to all responses.
+
+    With ``SECURITY_SERVER_TIMING`` enabled the request's middleware timing
+    counters are also reported in a ``Server-Timing`` header.
     """
+    @timed('security_headers')
     def process_response(self, request, response):
-        # Security headers
-        response['X-Content-Type-Options'] = 'nosniff'
-        response['X-Frame-Options'] = 'DENY'
-        response['X-XSS-Protection'] = '1; mode=block'
-        response['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-        
-        # Content Security Policy
-        csp = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
-            "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
-            "img-src 'self' data: https:; "
-            "font-src 'self' https://cdnjs.cloudflare.com; "
-            "connect-src 'self'; "
-            "frame-ancestors 'none';"
-        )
-        response['Content-Security-Policy'] = csp
+        for header, value in STATIC_SECURITY_HEADERS:
+            response[header] = value
         
         # HSTS header (only for HTTPS)
         if request.is_secure():
-            response['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains; preload'
+            response['Strict-Transport-Security'] = HSTS_HEADER
+        
+        if getattr(settings, 'SECURITY_SERVER_TIMING', False):
+            response['Server-Timing'] = ', '.join(
+                f"{name};dur={elapsed / 1_000_000:.3f}"
+                for name, elapsed in get_request_timings(request).items()
+            )
         
         return response
 
@@ -46,78 +114,58 @@ class SecurityHeadersMiddleware(MiddlewareMixin):
 class RateLimitMiddleware(MiddlewareMixin):
     """
     Custom rate limiting middleware for form submissions and sensitive operations.
+
+    Off unless RATELIMIT_MIDDLEWARE_ENABLE is set (as well as RATELIMIT_ENABLE):
+    the route limits count every request under a prefix, page views included.
     """
     
     def __init__(self, get_response):
         self.get_response = get_response
         super().__init__(get_response)
+        # Compile the route table once instead of on every request
+        self.rules = ratelimit.get_rules()
     
+    @timed('rate_limit')
     def process_request(self, request):
-        if not getattr(settings, 'RATELIMIT_ENABLE', True):
+        if not (getattr(settings, 'RATELIMIT_MIDDLEWARE_ENABLE', False)
+                and getattr(settings, 'RATELIMIT_ENABLE', True)):
             return None
         
-        # Define rate limits for different endpoints
-        rate_limits = {
-            # Authentication endpoints
-            '/accounts/login/': {'limit': 5, 'window': 300},  # 5 attempts per 5 minutes
-            '/accounts/register/': {'limit': 3, 'window': 3600},  # 3 attempts per hour
-            
-            # Project submission endpoints
-            '/projects/': {'limit': 100, 'window': 3600},  # 100 requests per hour
-            '/api/projects/': {'limit': 200, 'window': 3600},  # 200 API requests per hour
-            
-            # Admin endpoints
-            '/admin/': {'limit': 1000, 'window': 3600},  # 1000 requests per hour for admin
-            
-            # Bulk operations (more restrictive)
-            '/projects/admin/bulk-action/': {'limit': 10, 'window': 600},  # 10 bulk operations per 10 minutes
-        }
-        
         # Check if this path should be rate limited
-        path = request.path
-        rate_config = None
-        
-        for pattern, config in rate_limits.items():
-            if path.startswith(pattern):
-                rate_config = config
-                break
-        
-        if not rate_config:
+        matched = self.rules.match(request.path)
+        if not matched:
             return None
+        prefix, (limit, window) = matched
         
-        # Create unique key for user/IP combination
+        # One counter per user/IP and rule
         if request.user.is_authenticated:
-            key_base = f"rate_limit:{request.user.id}:{path}"
+            key_base = f"user:{request.user.id}:{prefix}"
         else:
-            ip = self.get_client_ip(request)
-            key_base = f"rate_limit:ip:{ip}:{path}"
+            key_base = f"ip:{self.get_client_ip(request)}:{prefix}"
         
         # Hash the key to ensure consistent length
         key = hashlib.md5(key_base.encode()).hexdigest()
+        result = ratelimit.hit(key, limit, window)
         
-        # Check current count
-        current_count = cache.get(key, 0)
-        
-        if current_count >= rate_config['limit']:
-            logger.warning(
-                f"Rate limit exceeded for {key_base}. "
-                f"Count: {current_count}, Limit: {rate_config['limit']}"
-            )
-            
-            if request.path.startswith('/api/'):
-                return JsonResponse({
-                    'error': 'Rate limit exceeded',
-                    'detail': f"Too many requests. Limit: {rate_config['limit']} per {rate_config['window']} seconds."
-                }, status=429)
-            else:
-                return HttpResponseTooManyRequests(
-                    "Too many requests. Please try again later."
-                )
+        if result.allowed:
+            return None
         
-        # Increment counter
-        cache.set(key, current_count + 1, rate_config['window'])
+        logger.warning(
+            f"Rate limit exceeded for {key_base}. "
+            f"Count: {result.count:.0f}, Limit: {limit}"
+        )
         
-        return None
+        if request.path.startswith('/api/'):
+            response = JsonResponse({
+                'error': 'Rate limit exceeded',
+                'detail': f"Too many requests. Limit: {limit} per {window} seconds."
+            }, status=429)
+        else:
+            response = HttpResponse(
+                "Too many requests. Please try again later.", status=429
+            )
+        response['Retry-After'] = str(result.retry_after)
+        return response
     
     def get_client_ip(self, request):
         """Get client IP address from request."""
@@ -134,35 +182,23 @@ class AuditLoggingMiddleware(MiddlewareMixin):
     Log security-relevant events and suspicious activities.
     """
     
+    @timed('audit')
     def process_request(self, request):
-        # Log potentially suspicious requests
-        suspicious_patterns = [
-            'admin',
-            'wp-admin',
-            'phpmyadmin',
-            '.php',
-            '../',
-            'eval(',
-            'script>',
-            'SELECT',
-            'UNION',
-            'DROP',
-        ]
+        # Log potentially suspicious requests; the query string is decoded so
+        # percent-encoded payloads are caught too
+        query = request.META.get('QUERY_STRING', '')
+        target = f"{request.path}?{unquote_plus(query)}" if query else request.path
         
-        path = request.path.lower()
-        query = request.GET.urlencode().lower()
-        
-        for pattern in suspicious_patterns:
-            if pattern in path or pattern in query:
-                logger.warning(
-                    f"Suspicious request detected: {request.method} {request.path} "
-                    f"from {self.get_client_ip(request)} "
-                    f"User-Agent: {request.META.get('HTTP_USER_AGENT', 'Unknown')}"
-                )
-                break
+        if SUSPICIOUS_REQUEST_RE.search(target):
+            logger.warning(
+                f"Suspicious request detected: {request.method} {request.path} "
+                f"from {self.get_client_ip(request)} "
+                f"User-Agent: {request.META.get('HTTP_USER_AGENT', 'Unknown')}"
+            )
         
         return None
     
+    @timed('audit')
     def process_response(self, request, response):
         # Log failed authentication attempts
         if (request.path.startswith('/accounts/login/') and 
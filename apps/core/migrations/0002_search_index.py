@@ -0,0 +1,74 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+FULLTEXT_INDEXES = [
+    ("search_document_fulltext", "title, keywords, body"),
+    ("search_document_title_ft", "title"),
+    ("search_document_keywords_ft", "keywords"),
+]
+
+
+def create_fulltext_indexes(apps, schema_editor):
+    """FULLTEXT indexes for the MySQL search backend; other databases use search_terms"""
+    if schema_editor.connection.vendor != "mysql":
+        return
+    for name, columns in FULLTEXT_INDEXES:
+        schema_editor.execute(f"CREATE FULLTEXT INDEX {name} ON search_documents ({columns})")
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    for name, _ in FULLTEXT_INDEXES:
+        schema_editor.execute(f"DROP INDEX {name} ON search_documents")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("project", "Project"), ("document", "Document"), ("user", "User")],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.CharField(max_length=64)),
+                ("title", models.CharField(blank=True, max_length=255)),
+                (
+                    "keywords",
+                    models.CharField(blank=True, help_text="Identifiers matched ahead of text", max_length=255),
+                ),
+                ("body", models.TextField(blank=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "search_documents",
+                "unique_together": {("kind", "object_id")},
+            },
+        ),
+        migrations.CreateModel(
+            name="SearchTerm",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", models.CharField(max_length=20)),
+                ("term", models.CharField(max_length=64)),
+                ("object_id", models.CharField(max_length=64)),
+                ("weight", models.PositiveSmallIntegerField(default=1)),
+            ],
+            options={
+                "db_table": "search_terms",
+                "unique_together": {("kind", "term", "object_id")},
+                "indexes": [models.Index(fields=["kind", "object_id"], name="search_term_object_idx")],
+            },
+        ),
+        migrations.RunPython(create_fulltext_indexes, drop_fulltext_indexes),
+    ]
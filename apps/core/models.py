@@ -63,4 +63,46 @@ class VersionImprovement(models.Model):
         verbose_name_plural = "Version Improvements"
     
     def __str__(self):
-        return f"{self.version} - {self.title}"
\ No newline at end of file
+        return f"{self.version} - {self.title}"
+
+class SearchDocument(models.Model):
+    """Denormalised search text for one project, document or user"""
+
+    KIND_CHOICES = [
+        ('project', 'Project'),
+        ('document', 'Document'),
+        ('user', 'User'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=64)
+    title = models.CharField(max_length=255, blank=True)
+    keywords = models.CharField(max_length=255, blank=True, help_text="Identifiers matched ahead of text")
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'search_documents'
+        unique_together = ['kind', 'object_id']
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id}"
+
+
+class SearchTerm(models.Model):
+    """One posting of the portable inverted index: a term occurring in a search document"""
+
+    kind = models.CharField(max_length=20)
+    term = models.CharField(max_length=64)
+    object_id = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        db_table = 'search_terms'
+        unique_together = ['kind', 'term', 'object_id']
+        indexes = [
+            models.Index(fields=['kind', 'object_id'], name='search_term_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.term}:{self.object_id}"
@@ -0,0 +1,110 @@
+"""
+Cursor pagination and streaming exports for API collections.
+
+Collections page with an opaque cursor on an indexed timestamp, so a page
+is one ``WHERE created_at < ... LIMIT n`` query: no COUNT and no OFFSET
+scan, however deep the client pages. Admin tooling that needs the whole
+set uses an export instead, which streams rows from ``.iterator()`` and
+encodes them a chunk at a time, so response memory does not grow with the
+table.
+"""
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+EXPORT_CHUNK_SIZE = getattr(settings, 'API_EXPORT_CHUNK_SIZE', 500)
+
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+class DefaultCursorPagination(CursorPagination):
+    """Newest first by ``created_at``; ties fall back to the primary key"""
+
+    ordering = ('-created_at', '-pk')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def _encode(row) -> str:
+    return json.dumps(row, cls=JSONEncoder, ensure_ascii=False)
+
+
+def iter_export_rows(queryset, serialize, chunk_size=None):
+    """Yield ``serialize(obj)`` for every row of ``queryset`` without caching the result set"""
+    for obj in queryset.iterator(chunk_size=chunk_size or EXPORT_CHUNK_SIZE):
+        yield serialize(obj)
+
+
+def _chunked(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(_encode(row))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_ndjson(rows, chunk_size=None):
+    """One JSON document per line"""
+    for chunk in _chunked(rows, chunk_size or EXPORT_CHUNK_SIZE):
+        yield '\n'.join(chunk) + '\n'
+
+
+def stream_json(rows, chunk_size=None):
+    """A single JSON array, written incrementally"""
+    yield '['
+    separator = ''
+    for chunk in _chunked(rows, chunk_size or EXPORT_CHUNK_SIZE):
+        yield separator + ','.join(chunk)
+        separator = ','
+    yield ']'
+
+
+def export_response(rows, encoding='ndjson', filename=None) -> StreamingHttpResponse:
+    """Stream ``rows`` as NDJSON (the default) or as a JSON array"""
+    if encoding not in EXPORT_CONTENT_TYPES:
+        raise ValueError(f"Unsupported export encoding: {encoding}")
+    stream = stream_json(rows) if encoding == 'json' else stream_ndjson(rows)
+    response = StreamingHttpResponse(stream, content_type=EXPORT_CONTENT_TYPES[encoding])
+    if filename:
+        extension = 'json' if encoding == 'json' else 'ndjson'
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
+
+
+class StreamingExportMixin:
+    """
+    Adds ``GET <collection>/export/`` to a viewset: every row the list view
+    would return, across all pages, streamed through the viewset's
+    serializer. ``?encoding=json`` returns an array instead of NDJSON.
+    Access is limited to ``export_permission_classes``.
+    """
+
+    export_permission_classes = ()
+    export_filename = None
+
+    def get_permissions(self):
+        if self.action == 'export':
+            return [permission() for permission in self.export_permission_classes]
+        return super().get_permissions()
+
+    def get_export_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    @action(detail=False, methods=['get'])
+    def export(self, request, *args, **kwargs):
+        encoding = request.query_params.get('encoding', 'ndjson')
+        if encoding not in EXPORT_CONTENT_TYPES:
+            raise ValidationError({'encoding': f"Must be one of: {', '.join(EXPORT_CONTENT_TYPES)}"})
+        rows = iter_export_rows(self.get_export_queryset(), lambda obj: self.get_serializer(obj).data)
+        return export_response(rows, encoding, filename=self.export_filename)
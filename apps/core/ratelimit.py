@@ -0,0 +1,166 @@
+"""
+Sliding-window rate limiting shared by the middleware and the DRF throttles.
+
+Each limit is approximated with two fixed buckets: the hit count of the
+current window plus the previous window's count weighted by how much of it
+still overlaps the sliding window. On Redis both buckets are read and the
+current one incremented by a single Lua script, so a check is one atomic
+round trip and the bucket TTL is only set when the bucket is created. Other
+cache backends fall back to ``add`` + ``incr``; if the cache is unreachable
+the counters are kept in process memory until it comes back.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger('security')
+
+# Path prefix -> (limit, window in seconds); the longest matching prefix wins
+DEFAULT_RATELIMIT_RULES = {
+    # Authentication endpoints
+    '/accounts/login/': (5, 300),
+    '/accounts/register/': (3, 3600),
+    # Project endpoints
+    '/projects/': (100, 3600),
+    '/api/projects/': (200, 3600),
+    # Admin endpoints
+    '/admin/': (1000, 3600),
+    # Bulk operations (more restrictive)
+    '/projects/admin/bulk-action/': (10, 600),
+}
+
+_SLIDING_WINDOW_SCRIPT = """
+local current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+local previous = redis.call('GET', KEYS[2])
+return {current, tonumber(previous) or 0}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    count: float
+    retry_after: int
+
+
+class PrefixTrie:
+    """Longest-prefix lookup over path segments, built once per process"""
+
+    _VALUE = object()
+
+    def __init__(self, rules=None):
+        self._root = {}
+        for prefix, value in (rules or {}).items():
+            self.insert(prefix, value)
+
+    @staticmethod
+    def _segments(path):
+        return [segment for segment in path.split('/') if segment]
+
+    def insert(self, prefix, value):
+        node = self._root
+        for segment in self._segments(prefix):
+            node = node.setdefault(segment, {})
+        node[self._VALUE] = (prefix, value)
+
+    def match(self, path):
+        """Return ``(prefix, value)`` for the longest rule covering ``path``, or None"""
+        node = self._root
+        found = node.get(self._VALUE)
+        for segment in self._segments(path):
+            node = node.get(segment)
+            if node is None:
+                break
+            found = node.get(self._VALUE, found)
+        return found
+
+
+class _LocalCounters:
+    """Process-local bucket counters used while the shared cache is down"""
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def hit(self, current_key, previous_key, ttl, now):
+        with self._lock:
+            if len(self._buckets) >= self.MAX_KEYS:
+                self._buckets = {k: v for k, v in self._buckets.items() if v[1] > now}
+            count, expires = self._buckets.get(current_key, (0, now + ttl))
+            if expires <= now:
+                count, expires = 0, now + ttl
+            self._buckets[current_key] = (count + 1, expires)
+            previous, previous_expires = self._buckets.get(previous_key, (0, 0))
+            return count + 1, previous if previous_expires > now else 0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+_local_counters = _LocalCounters()
+
+
+def _get_cache():
+    return caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+
+def _redis_hit(cache, current_key, previous_key, ttl):
+    current_key = cache.make_and_validate_key(current_key)
+    previous_key = cache.make_and_validate_key(previous_key)
+    client = cache._cache.get_client(current_key, write=True)
+    current, previous = client.eval(_SLIDING_WINDOW_SCRIPT, 2, current_key, previous_key, ttl)
+    return int(current), int(previous)
+
+
+def _cache_hit(cache, current_key, previous_key, ttl):
+    cache.add(current_key, 0, ttl)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # Bucket expired between add() and incr()
+        cache.add(current_key, 1, ttl)
+        current = 1
+    return current, int(cache.get(previous_key) or 0)
+
+
+def hit(key, limit, window, now=None) -> RateLimitResult:
+    """Count one request against ``key`` and report whether it is within ``limit`` per ``window`` seconds"""
+    now = time.time() if now is None else now
+    bucket = int(now // window)
+    current_key = f'ratelimit:{key}:{window}:{bucket}'
+    previous_key = f'ratelimit:{key}:{window}:{bucket - 1}'
+    # The current bucket has to outlive its own window to serve as the previous one
+    ttl = window * 2
+
+    try:
+        cache = _get_cache()
+        if isinstance(cache, RedisCache):
+            current, previous = _redis_hit(cache, current_key, previous_key, ttl)
+        else:
+            current, previous = _cache_hit(cache, current_key, previous_key, ttl)
+    except Exception:
+        logger.warning("Rate limit cache unavailable, using local counters", exc_info=True)
+        current, previous = _local_counters.hit(current_key, previous_key, ttl, now)
+
+    elapsed = now - bucket * window
+    count = previous * (window - elapsed) / window + current
+    allowed = count <= limit
+    retry_after = 0 if allowed else max(1, int(window - elapsed))
+    return RateLimitResult(allowed=allowed, limit=limit, count=count, retry_after=retry_after)
+
+
+def get_rules() -> PrefixTrie:
+    """Compile ``RATELIMIT_RULES`` (or the defaults) into a prefix trie"""
+    return PrefixTrie(getattr(settings, 'RATELIMIT_RULES', DEFAULT_RATELIMIT_RULES))
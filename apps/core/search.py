@@ -0,0 +1,302 @@
+"""
+Full-text search over projects, documents and users.
+
+Each searchable object has one denormalised ``SearchDocument`` row
+(title, identifier keywords, body text), kept current by the signal
+receivers ``register()`` connects. Queries never touch the source tables:
+every query term is matched as a prefix (``tow`` finds "Tower", ``a00``
+finds document A001; a trailing ``*`` is accepted and ignored), all terms
+must match, and results are ranked with keyword hits above title hits
+above body hits.
+
+Two backends answer queries:
+
+* ``mysql`` uses FULLTEXT indexes on ``search_documents`` in boolean mode.
+  Terms shorter than ``SEARCH_MYSQL_MIN_TOKEN`` (InnoDB's
+  ``innodb_ft_min_token_size``) are not in that index and are dropped.
+* ``inverted`` keeps postings in ``search_terms``, one row per
+  (kind, term, object) with a weight. A prefix is a range scan on the
+  unique (kind, term, object_id) index, so it works on any database.
+
+``SEARCH_BACKEND`` picks one; by default MySQL gets ``mysql`` and
+everything else ``inverted``. After switching backend, run
+``manage.py rebuild_search_index``.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from functools import reduce
+from operator import or_
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+
+from .models import SearchDocument, SearchTerm
+
+logger = logging.getLogger('core')
+
+SEARCH_RESULT_LIMIT = getattr(settings, 'SEARCH_RESULT_LIMIT', 1000)
+SEARCH_MYSQL_MIN_TOKEN = getattr(settings, 'SEARCH_MYSQL_MIN_TOKEN', 3)
+MAX_QUERY_TERMS = 8
+MAX_TERM_LENGTH = 64
+REBUILD_CHUNK_SIZE = 500
+
+# Field -> weight of a term found in it; a term keeps its highest weight
+FIELD_WEIGHTS = {'keywords': 4, 'title': 2, 'body': 1}
+# Added on top of the weight when a query term matches a whole term
+EXACT_MATCH_BONUS = 1
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric runs of ``text``"""
+    return [token[:MAX_TERM_LENGTH] for token in _TOKEN_RE.findall((text or '').lower())]
+
+
+def parse_query(query: str) -> List[str]:
+    """Distinct query terms, in order, at most MAX_QUERY_TERMS"""
+    terms = list(dict.fromkeys(tokenize(query)))
+    return terms[:MAX_QUERY_TERMS]
+
+
+@dataclass(frozen=True)
+class SearchSource:
+    kind: str
+    model: type
+    # instance -> {'title': ..., 'keywords': ..., 'body': ...}
+    build: Callable
+    # Model fields the search document is built from; saves with
+    # update_fields outside this set do not reindex
+    fields: frozenset
+    # Queryset used by rebuild(), e.g. with select_related for build()
+    queryset: Optional[Callable] = None
+
+    def get_queryset(self):
+        return self.queryset() if self.queryset else self.model._default_manager.all()
+
+
+_sources: Dict[str, SearchSource] = {}
+
+
+def register(kind: str, model, build: Callable, fields, queryset: Optional[Callable] = None) -> None:
+    """Make ``model`` searchable as ``kind`` and keep its search document current"""
+    source = SearchSource(kind, model, build, frozenset(fields), queryset)
+    _sources[kind] = source
+
+    def saved(sender, instance, update_fields=None, raw=False, **kwargs):
+        if raw or (update_fields and source.fields.isdisjoint(update_fields)):
+            return
+        transaction.on_commit(lambda: _safely(index_object, source, instance))
+
+    def deleted(sender, instance, **kwargs):
+        object_id = str(instance.pk)
+        transaction.on_commit(lambda: _safely(remove_object, kind, object_id))
+
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=f'search-index-{kind}')
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=f'search-remove-{kind}')
+
+
+def register_dependent(model, kind: str, objects: Callable, fields) -> None:
+    """
+    Reindex the ``kind`` objects ``objects(instance)`` returns when a
+    ``model`` row their search documents are built from is saved with one of
+    ``fields`` changed. Models with in-memory change tracking are checked
+    against it, so a save that leaves ``fields`` alone reindexes nothing.
+    """
+    source = get_source(kind)
+    fields = frozenset(fields)
+
+    def saved(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+        if raw or (update_fields and fields.isdisjoint(update_fields)):
+            return
+        changed = getattr(instance, 'changed_fields', None)
+        if not created and changed is not None and fields.isdisjoint(changed):
+            return
+        transaction.on_commit(lambda: _safely(index_objects, source, objects(instance)))
+
+    post_save.connect(
+        saved, sender=model, weak=False, dispatch_uid=f'search-index-{kind}-{model._meta.label_lower}'
+    )
+
+
+def get_source(kind: str) -> SearchSource:
+    return _sources[kind]
+
+
+def _safely(function, *args) -> None:
+    # A stale search document must never fail the write that triggered it
+    try:
+        function(*args)
+    except Exception:
+        logger.exception(f"Search index update failed for {args}")
+
+
+def _postings(kind: str, object_id: str, fields: Dict[str, str]) -> List[SearchTerm]:
+    weights = {}
+    for field_name, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(fields.get(field_name, '')):
+            weights[term] = max(weights.get(term, 0), weight)
+    return [
+        SearchTerm(kind=kind, term=term, object_id=object_id, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+
+def _document(kind: str, object_id: str, fields: Dict[str, str]) -> SearchDocument:
+    return SearchDocument(
+        kind=kind,
+        object_id=object_id,
+        title=(fields.get('title') or '')[:255],
+        keywords=(fields.get('keywords') or '')[:255],
+        body=fields.get('body') or '',
+    )
+
+
+class InvertedIndexBackend:
+    """Postings in ``search_terms``, matched by term prefix and ranked by summed weight"""
+
+    uses_postings = True
+
+    @staticmethod
+    def _prefix(term: str) -> Q:
+        if connection.vendor == 'sqlite':
+            # SQLite's LIKE is case-insensitive and cannot use the binary
+            # collated term index; a range on the code points can
+            return Q(term__gte=term, term__lt=term + '\U0010ffff')
+        return Q(term__startswith=term)
+
+    def search(self, kind: str, terms: List[str], limit: int) -> List[Tuple[str, int]]:
+        matches = [self._prefix(term) for term in terms]
+        # kind inside each branch so every branch is its own index range scan
+        postings = SearchTerm.objects.filter(reduce(or_, (Q(kind=kind) & match for match in matches)))
+        # One flag per query term: the object has a posting starting with it
+        flags = {
+            f'matched_{i}': Max(Case(When(match, then=Value(1)), default=Value(0), output_field=IntegerField()))
+            for i, match in enumerate(matches)
+        }
+        score = Sum(Case(
+            When(term__in=terms, then=Value(EXACT_MATCH_BONUS)), default=Value(0), output_field=IntegerField()
+        )) + Sum('weight')
+        return list(
+            postings.order_by().values('object_id')
+            .annotate(score=score, **flags)
+            .filter(**{name: 1 for name in flags})
+            .order_by('-score', 'object_id')
+            .values_list('object_id', 'score')[:limit]
+        )
+
+
+class MySQLFulltextBackend:
+    """FULLTEXT MATCH ... AGAINST in boolean mode on ``search_documents``"""
+
+    uses_postings = False
+
+    _MATCH = 'MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)'
+
+    def search(self, kind: str, terms: List[str], limit: int) -> List[Tuple[str, int]]:
+        terms = [term for term in terms if len(term) >= SEARCH_MYSQL_MIN_TOKEN]
+        if not terms:
+            return []
+        boolean_query = ' '.join(f'+{term}*' for term in terms)
+
+        def match(columns, weight=1):
+            sql = self._MATCH.format(columns=columns)
+            return RawSQL(sql if weight == 1 else f'{sql} * {weight}', [boolean_query])
+
+        score = (
+            match('keywords', FIELD_WEIGHTS['keywords'])
+            + match('title', FIELD_WEIGHTS['title'])
+            + match('title, keywords, body')
+        )
+        return list(
+            SearchDocument.objects.filter(kind=kind)
+            .annotate(relevance=match('title, keywords, body'), score=score)
+            .filter(relevance__gt=0)
+            .order_by('-score', 'object_id')
+            .values_list('object_id', 'score')[:limit]
+        )
+
+
+BACKENDS = {
+    'inverted': InvertedIndexBackend,
+    'mysql': MySQLFulltextBackend,
+}
+
+
+def get_backend():
+    name = getattr(settings, 'SEARCH_BACKEND', None)
+    if not name:
+        name = 'mysql' if connection.vendor == 'mysql' else 'inverted'
+    return BACKENDS[name]()
+
+
+def index_object(source: SearchSource, instance) -> None:
+    """Write the search document (and postings, for the inverted index) of one object"""
+    object_id = str(instance.pk)
+    fields = source.build(instance)
+    document = _document(source.kind, object_id, fields)
+    with transaction.atomic():
+        SearchDocument.objects.update_or_create(
+            kind=source.kind, object_id=object_id,
+            defaults={'title': document.title, 'keywords': document.keywords, 'body': document.body}
+        )
+        if get_backend().uses_postings:
+            SearchTerm.objects.filter(kind=source.kind, object_id=object_id).delete()
+            SearchTerm.objects.bulk_create(_postings(source.kind, object_id, fields))
+
+
+def index_objects(source: SearchSource, instances) -> None:
+    for instance in instances:
+        index_object(source, instance)
+
+
+def remove_object(kind: str, object_id: str) -> None:
+    with transaction.atomic():
+        SearchDocument.objects.filter(kind=kind, object_id=object_id).delete()
+        SearchTerm.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def rebuild(kind: str) -> int:
+    """Rebuild every search document of ``kind`` from its source table; returns the count"""
+    source = get_source(kind)
+    uses_postings = get_backend().uses_postings
+    count = 0
+    with transaction.atomic():
+        SearchDocument.objects.filter(kind=kind).delete()
+        SearchTerm.objects.filter(kind=kind).delete()
+        documents, postings = [], []
+        for instance in source.get_queryset().iterator(chunk_size=REBUILD_CHUNK_SIZE):
+            object_id = str(instance.pk)
+            fields = source.build(instance)
+            documents.append(_document(kind, object_id, fields))
+            if uses_postings:
+                postings.extend(_postings(kind, object_id, fields))
+            if len(documents) >= REBUILD_CHUNK_SIZE:
+                count += _flush(documents, postings)
+                documents, postings = [], []
+        count += _flush(documents, postings)
+    return count
+
+
+def _flush(documents, postings) -> int:
+    SearchDocument.objects.bulk_create(documents)
+    SearchTerm.objects.bulk_create(postings, batch_size=REBUILD_CHUNK_SIZE)
+    return len(documents)
+
+
+def search(kind: str, query: str, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+    """``(object_id, score)`` pairs of ``kind`` matching ``query``, best first"""
+    terms = parse_query(query)
+    if not terms:
+        return []
+    return get_backend().search(kind, terms, limit or SEARCH_RESULT_LIMIT)
+
+
+def search_ids(kind: str, query: str, limit: Optional[int] = None) -> List[str]:
+    """Primary keys of the best ``limit`` matches, for ``filter(pk__in=...)``"""
+    return [object_id for object_id, _ in search(kind, query, limit)]
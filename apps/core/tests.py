@@ -1,3 +1,210 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from apps.projects.models import Document, Project, ProjectGroup
+
+from . import ratelimit, search
+from .middleware import (
+    CONTENT_SECURITY_POLICY, AuditLoggingMiddleware, RateLimitMiddleware,
+    SecurityHeadersMiddleware, get_request_timings,
+)
+from .models import SearchDocument, SearchTerm
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RateLimiterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ratelimit._local_counters.clear()
+
+    def test_trie_matches_longest_prefix(self):
+        trie = ratelimit.PrefixTrie(ratelimit.DEFAULT_RATELIMIT_RULES)
+
+        self.assertEqual(trie.match('/projects/admin/bulk-action/')[1], (10, 600))
+        self.assertEqual(trie.match('/projects/12/')[1], (100, 3600))
+        self.assertEqual(trie.match('/api/projects/5/')[0], '/api/projects/')
+        self.assertIsNone(trie.match('/projectsx/'))
+        self.assertIsNone(trie.match('/'))
+
+    def test_hit_blocks_past_the_limit(self):
+        results = [ratelimit.hit('k', 3, 60, now=1200.0) for _ in range(4)]
+
+        self.assertEqual([r.allowed for r in results], [True, True, True, False])
+        self.assertEqual(results[-1].retry_after, 60)
+
+    def test_previous_window_is_weighted_into_the_count(self):
+        for _ in range(4):
+            ratelimit.hit('k', 4, 60, now=1200.0)
+
+        # Halfway into the next window half of the previous hits still count
+        result = ratelimit.hit('k', 4, 60, now=1290.0)
+        self.assertEqual(result.count, 3)
+        self.assertTrue(result.allowed)
+        # Two windows later none of them do
+        self.assertEqual(ratelimit.hit('k', 4, 60, now=1390.0).count, 1)
+
+    def test_falls_back_to_local_counters_when_cache_fails(self):
+        with mock.patch.object(ratelimit, '_cache_hit', side_effect=ConnectionError):
+            results = [ratelimit.hit('k', 2, 60, now=1200.0) for _ in range(3)]
+
+        self.assertEqual([r.allowed for r in results], [True, True, False])
+
+    @override_settings(
+        RATELIMIT_ENABLE=True, RATELIMIT_MIDDLEWARE_ENABLE=True, RATELIMIT_RULES={'/accounts/login/': (2, 300)}
+    )
+    def test_middleware_returns_429_with_retry_after(self):
+        middleware = RateLimitMiddleware(lambda request: None)
+        factory = RequestFactory()
+
+        def request(path):
+            req = factory.post(path, REMOTE_ADDR='10.0.0.1')
+            req.user = AnonymousUser()
+            return middleware.process_request(req)
+
+        self.assertIsNone(request('/accounts/login/'))
+        self.assertIsNone(request('/accounts/login/'))
+        self.assertIsNone(request('/projects/'))
+        response = request('/accounts/login/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+    @override_settings(RATELIMIT_ENABLE=True, RATELIMIT_RULES={'/projects/': (1, 3600)})
+    def test_middleware_is_off_without_its_own_flag(self):
+        middleware = RateLimitMiddleware(lambda request: None)
+        req = RequestFactory().get('/projects/', REMOTE_ADDR='10.0.0.1')
+        req.user = AnonymousUser()
+
+        self.assertEqual([middleware.process_request(req) for _ in range(3)], [None, None, None])
+
+
+class SecurityMiddlewareTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_detector_scans_path_and_decoded_query(self):
+        middleware = AuditLoggingMiddleware(lambda request: None)
+
+        with self.assertLogs('security', level='WARNING') as logs:
+            middleware.process_request(self.factory.get('/search/', {'q': '1 union select'}))
+            middleware.process_request(self.factory.get('/static/../etc/passwd'))
+            middleware.process_request(self.factory.get('/search/', {'q': "x'; DROP TABLE projects;--"}))
+            middleware.process_request(self.factory.get('/search/', {'q': 'select name from users'}))
+        self.assertEqual(len(logs.output), 4)
+
+        with self.assertNoLogs('security', level='WARNING'):
+            middleware.process_request(self.factory.get('/projects/', {'page': '2'}))
+            middleware.process_request(self.factory.get('/projects/', {'status': 'selected', 'view': 'dropdown'}))
+            middleware.process_request(self.factory.get('/search/', {'q': 'drop ceiling union hall'}))
+            middleware.process_request(self.factory.get('/projects/admin/bulk-action/'))
+
+    @override_settings(SECURITY_SERVER_TIMING=True)
+    def test_headers_and_timing_counters(self):
+        request = self.factory.get('/projects/')
+        AuditLoggingMiddleware(lambda r: None).process_request(request)
+        response = SecurityHeadersMiddleware(lambda r: None).process_response(request, HttpResponse())
+
+        self.assertEqual(response['Content-Security-Policy'], CONTENT_SECURITY_POLICY)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        self.assertNotIn('Strict-Transport-Security', response)
+        self.assertEqual(set(get_request_timings(request)), {'audit', 'security_headers'})
+        self.assertIn('audit;dur=', response['Server-Timing'])
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user(
+                username='searcher', email='searcher@example.com', password='password123',
+                first_name='Dana', last_name='Reyes'
+            )
+            group = ProjectGroup.objects.create(name='Harbour', code='HB-7', created_by=self.user)
+            self.tower = Project.objects.create(
+                project_group=group, version_number=1, project_name='Harbour Tower',
+                project_description='Mixed use tower by the marina', created_by=self.user
+            )
+            self.marina = Project.objects.create(
+                project_group=group, version_number=2, project_name='Marina Walk',
+                project_description='Promenade beside Harbour Tower', created_by=self.user
+            )
+            self.plan = Document.objects.create(
+                project=self.tower, document_number='A001', title='Ground floor plan', created_by=self.user
+            )
+            Document.objects.create(
+                project=self.tower, document_number='B001', title='Section', created_by=self.user
+            )
+
+    def test_prefix_terms_all_match_and_rank_title_above_body(self):
+        self.assertEqual(search.search_ids('document', 'A00*'), [str(self.plan.pk)])
+        self.assertEqual(search.search_ids('document', 'a00 floor'), [str(self.plan.pk)])
+        self.assertEqual(search.search_ids('document', 'a00 section'), [])
+        self.assertEqual(
+            search.search_ids('project', 'harb tow'), [str(self.tower.pk), str(self.marina.pk)]
+        )
+        self.assertEqual(search.search_ids('user', 'rey'), [str(self.user.pk)])
+        self.assertEqual(search.search_ids('project', '  ** '), [])
+
+    def test_signals_reindex_and_remove(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.title = 'Roof plan'
+            self.plan.save()
+        self.assertEqual(search.search_ids('document', 'roof'), [str(self.plan.pk)])
+        self.assertEqual(search.search_ids('document', 'ground'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.delete()
+        self.assertEqual(search.search_ids('document', 'roof'), [])
+        self.assertFalse(SearchTerm.objects.filter(object_id=str(self.plan.pk)).exists())
+
+    def test_saves_of_unindexed_fields_do_not_reindex(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+    def test_profile_changes_reindex_the_user(self):
+        profile = User.objects.get(pk=self.user.pk).profile
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.department = 'Structural'
+            profile.phone_number = '555-0142'
+            profile.save()
+        self.assertEqual(search.search_ids('user', 'struct'), [str(self.user.pk)])
+        self.assertEqual(search.search_ids('user', '0142'), [str(self.user.pk)])
+
+        # Every user save also saves the profile; an unchanged one reindexes nothing
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+    def test_group_rename_reindexes_its_projects(self):
+        group = ProjectGroup.objects.get(pk=self.tower.project_group_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            group.name = 'Quayside'
+            group.code = 'QS-1'
+            group.save()
+        self.assertEqual(
+            sorted(search.search_ids('project', 'qs')), sorted([str(self.tower.pk), str(self.marina.pk)])
+        )
+        self.assertEqual(len(search.search_ids('project', 'quayside')), 2)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            group.client_name = 'Port Authority'
+            group.save()
+        self.assertEqual(callbacks, [])
+
+    def test_rebuild_command_restores_the_index(self):
+        SearchDocument.objects.all().delete()
+        SearchTerm.objects.all().delete()
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual(SearchDocument.objects.filter(kind='document').count(), 2)
+        self.assertEqual(search.search_ids('project', 'marina walk'), [str(self.marina.pk)])
@@ -0,0 +1,62 @@
+"""Model mixin shared by apps whose signal handlers need to know what a save changed"""
+
+
+class ChangeTrackingMixin:
+    """
+    Track field changes in memory, without re-reading the row.
+
+    Values are snapshotted when an instance is loaded from the database
+    (``from_db``) and again after every save or refresh, so ``changed_fields``
+    and ``old_value()`` are available to save() overrides and pre/post_save
+    handlers at no query cost. New instances report every field as changed.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _snapshot_loaded_values(self, field_names=None):
+        loaded = getattr(self, '_loaded_values', None)
+        if field_names is None or loaded is None:
+            deferred = self.get_deferred_fields()
+            self._loaded_values = {
+                field.attname: getattr(self, field.attname)
+                for field in self._meta.concrete_fields
+                if field.attname not in deferred
+            }
+            return
+        # Only the written/re-read fields are known to match the database
+        for name in field_names:
+            attname = self._meta.get_field(name).attname
+            loaded[attname] = getattr(self, attname)
+
+    @property
+    def changed_fields(self):
+        """Attnames that differ from the values last loaded from or saved to the database"""
+        loaded = getattr(self, '_loaded_values', None)
+        if self._state.adding or loaded is None:
+            return {field.attname for field in self._meta.concrete_fields}
+        return {
+            attname for attname, value in loaded.items()
+            if getattr(self, attname) != value
+        }
+
+    def has_changed(self, field_name):
+        return self._meta.get_field(field_name).attname in self.changed_fields
+
+    def old_value(self, field_name):
+        """The value of ``field_name`` as last loaded or saved; None for new instances"""
+        loaded = getattr(self, '_loaded_values', None)
+        if self._state.adding or loaded is None:
+            return None
+        return loaded.get(self._meta.get_field(field_name).attname)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_loaded_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot_loaded_values(fields)
@@ -20,41 +20,18 @@ def dashboard(request):
     from apps.projects.permissions import IsProjectManager
     is_admin = IsProjectManager.has_permission(request.user)
     
-    # Fetch stats for the current user
-    user_projects = Project.objects.filter(created_by=request.user)
-    user_documents = Document.objects.filter(project__created_by=request.user)
-    stats = {
-        'total_projects': user_projects.values('project_group_id').distinct().count(),
-        'draft_documents': user_documents.filter(status='Draft').count(),
-        'pending_documents': user_documents.filter(status='Pending_Review').count(),
-        'approved_documents': user_documents.filter(status='Approved').count(),
-        'total_documents': user_documents.count(),
-    }
+    from apps.projects.services import ProjectStatsService
 
-    # Fetch recent projects for the user
-    # Fetch all projects for the user, ordered by project_group and then by version_number (descending)
-    # This allows easy grouping and selection of the latest version in Python
-    all_user_projects = user_projects.order_by('project_group', '-version_number')
+    # Counts come from one aggregate query per scope and are briefly cached
+    stats = ProjectStatsService.get_dashboard_stats(request.user)
 
-    # Manually filter to get only the latest version for each project_group
-    seen_project_groups = set()
-    recent_projects = []
-    for project in all_user_projects:
-        if project.project_group_id not in seen_project_groups:
-            recent_projects.append(project)
-            seen_project_groups.add(project.project_group_id)
-    
-    # Limit to the 5 most recently updated unique projects
-    recent_projects = sorted(recent_projects, key=lambda p: p.updated_at, reverse=True)[:5]
+    # Latest version of each of the user's projects, 5 most recently updated
+    recent_projects = ProjectStatsService.get_recent_projects(request.user, limit=5)
     
     # Fetch admin stats if the user is a staff member or has approver role
     admin_stats = {}
     if is_admin:
-        admin_stats = {
-            'pending_approvals': Document.objects.filter(status='Pending_Review').count(),
-            'total_projects': Project.objects.count(),
-            'total_users': User.objects.count(),
-        }
+        admin_stats = ProjectStatsService.get_site_dashboard_stats()
 
     context = {
         'stats': stats,
@@ -0,0 +1,46 @@
+class FakeBrevoResponse:
+    def __init__(self, status_code, data=None, text=''):
+        self.status_code = status_code
+        self._data = data or {}
+        self.text = text
+
+    def json(self):
+        return self._data
+
+
+class FakeBrevoTransport:
+    """
+    In-memory stand-in for BrevoHttpTransport.
+
+    Point settings.EMAIL_TRANSPORT at this class in tests or local development.
+    Sent payloads are collected in ``FakeBrevoTransport.outbox`` (class level, like
+    django.core.mail.outbox); ``fail_next`` makes the following sends return an error.
+    """
+
+    outbox = []
+    _failures = []
+
+    def is_configured(self):
+        return True
+
+    def send(self, payload):
+        if FakeBrevoTransport._failures:
+            status_code = FakeBrevoTransport._failures.pop(0)
+            return FakeBrevoResponse(status_code, text='Simulated Brevo failure')
+        FakeBrevoTransport.outbox.append(payload)
+        number = len(FakeBrevoTransport.outbox)
+        if 'messageVersions' in payload:
+            # Batched sends answer with one id per message version, in order
+            return FakeBrevoResponse(201, {'messageIds': [
+                f'<fake-{number}.{index}@brevo>' for index in range(len(payload['messageVersions']))
+            ]})
+        return FakeBrevoResponse(201, {'messageId': f'<fake-{number}@brevo>'})
+
+    @classmethod
+    def fail_next(cls, count=1, status_code=500):
+        cls._failures.extend([status_code] * count)
+
+    @classmethod
+    def reset(cls):
+        cls.outbox.clear()
+        cls._failures.clear()
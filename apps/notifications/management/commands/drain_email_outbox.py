@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.notifications.services import EmailDeliveryService
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending and retry-due emails from the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Maximum number of emails to process')
+
+    def handle(self, *args, **options):
+        results = EmailDeliveryService().drain(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Outbox drained: {results['sent']} sent, {results['failed']} failed or rescheduled."
+        ))
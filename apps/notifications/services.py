@@ -1,44 +1,275 @@
+import logging
+import random
 import requests
 import json
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, Value, When
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.html import escape
+from django.utils.module_loading import import_string
 from typing import Dict, List, Optional
-from apps.accounts.models import EmailLog
+from apps.accounts.models import EmailLog, EmailOutbox
+
+logger = logging.getLogger('notifications')
+
+
+class BrevoHttpTransport:
+    """Thin HTTP client for the Brevo transactional email endpoint"""
 
-class BrevoEmailService:
     def __init__(self):
         self.api_key = getattr(settings, 'BREVO_API_KEY', '')
         self.api_url = getattr(settings, 'BREVO_API_URL', 'https://api.brevo.com/v3/smtp/email')
+        self.timeout = getattr(settings, 'BREVO_API_TIMEOUT', 10)
         self.headers = {
             'accept': 'application/json',
             'api-key': self.api_key,
             'content-type': 'application/json'
         }
-    
-    def send_custom_email(self, template_name: str, to_email: str, 
-                         to_name: str, subject: str, context: Dict, project=None) -> bool:
-        """Send email using custom HTML template"""
-        
-        # Create email log entry
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def send(self, payload: Dict) -> requests.Response:
+        return requests.post(
+            self.api_url,
+            headers=self.headers,
+            data=json.dumps(payload),
+            timeout=self.timeout
+        )
+
+
+def get_email_transport():
+    """Instantiate the transport configured in settings.EMAIL_TRANSPORT"""
+    transport_path = getattr(settings, 'EMAIL_TRANSPORT', 'apps.notifications.services.BrevoHttpTransport')
+    return import_string(transport_path)()
+
+
+class EmailDeliveryService:
+    """
+    Outbox-backed delivery pipeline.
+
+    ``enqueue`` stores a rendered message in the outbox inside the caller's
+    transaction and schedules dispatch with ``transaction.on_commit``; a rolled
+    back request therefore never emails anybody. Dispatch depends on
+    settings.EMAIL_DELIVERY_MODE:
+
+    - ``celery``: hand the outbox id to the ``deliver_email`` task
+    - ``eager``: deliver in-process right after commit (tests, local dev)
+    - ``outbox``: leave it for ``drain_email_outbox`` (cron / beat)
+
+    ``deliver`` claims a row, posts it and records the outcome. Failures are
+    retried with exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS; a row
+    that reached SENT is never posted again, so redelivered tasks are no-ops.
+    """
+
+    # Client errors that will not succeed on retry
+    PERMANENT_FAILURE_CODES = {400, 401, 403}
+
+    def __init__(self, transport=None):
+        self.transport = transport or get_email_transport()
+        self.mode = getattr(settings, 'EMAIL_DELIVERY_MODE', 'celery')
+        self.max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+        self.retry_base = getattr(settings, 'EMAIL_OUTBOX_RETRY_BASE_SECONDS', 30)
+        self.retry_cap = getattr(settings, 'EMAIL_OUTBOX_RETRY_MAX_SECONDS', 3600)
+        self.send_lease = getattr(settings, 'EMAIL_OUTBOX_SEND_LEASE_SECONDS', 300)
+
+    def enqueue(self, to_email: str, to_name: str, subject: str, html_content: str,
+                text_content: str = '', template_name: str = '', email_log=None,
+                idempotency_key: Optional[str] = None, recipients: Optional[List[Dict]] = None) -> bool:
+        """
+        Store a rendered email in the outbox; re-enqueuing the same key is a no-op.
+
+        ``recipients`` turns the entry into a batched send: each item is
+        ``{'email', 'name', 'params', 'log_id'}`` and becomes one Brevo message
+        version sharing the stored body.
+        """
+        entry, created = EmailOutbox.objects.get_or_create(
+            idempotency_key=idempotency_key or uuid.uuid4().hex,
+            defaults={
+                'email_log': email_log,
+                'to_email': to_email,
+                'to_name': to_name,
+                'subject': subject,
+                'template_name': template_name,
+                'html_content': html_content,
+                'text_content': text_content,
+                'recipients': recipients or [],
+            }
+        )
+        if created:
+            transaction.on_commit(lambda: self.dispatch(entry.pk))
+        else:
+            logger.info(f"Email {entry.idempotency_key} already queued, skipping duplicate")
+        return True
+
+    def dispatch(self, outbox_id) -> None:
+        """Route a committed outbox entry to the configured delivery mode"""
+        if self.mode == 'eager':
+            self.deliver(outbox_id)
+        elif self.mode == 'celery':
+            try:
+                from .tasks import deliver_email
+                deliver_email.delay(str(outbox_id))
+            except Exception as e:
+                # The row is durable; the periodic drain will pick it up.
+                logger.warning(f"Could not hand email {outbox_id} to the worker queue: {e}")
+
+    def deliver(self, outbox_id) -> bool:
+        """Claim and send one outbox entry. Returns True when it was sent."""
+        entry = self._claim(outbox_id)
+        if entry is None:
+            return False
+
+        payload = {
+            'sender': {
+                'email': getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@docuhub.com'),
+                'name': getattr(settings, 'BREVO_SENDER_NAME', 'DocuHub System')
+            },
+            'subject': entry.subject,
+            'htmlContent': entry.html_content,
+            'textContent': entry.text_content,
+            'headers': {'X-Idempotency-Key': entry.idempotency_key},
+        }
+        if entry.recipients:
+            payload['messageVersions'] = [
+                {'to': [{'email': r['email'], 'name': r['name']}], 'params': r.get('params', {})}
+                for r in entry.recipients
+            ]
+        else:
+            payload['to'] = [{'email': entry.to_email, 'name': entry.to_name}]
+
+        try:
+            response = self.transport.send(payload)
+        except Exception as e:
+            logger.error(f"Email sending failed: {e}")
+            self._record_failure(entry, str(e), permanent=False)
+            return False
+
+        if response.status_code == 201:
+            data = response.json()
+            message_ids = [data['messageId']] if data.get('messageId') else data.get('messageIds', [])
+            self._record_success(entry, message_ids)
+            return True
+
+        self._record_failure(
+            entry,
+            f"HTTP {response.status_code}: {response.text}",
+            permanent=response.status_code in self.PERMANENT_FAILURE_CODES
+        )
+        return False
+
+    def drain(self, limit: int = 100) -> Dict[str, int]:
+        """Deliver every due outbox entry (pending, or stuck past its send lease)"""
+        due_ids = list(
+            EmailOutbox.objects.filter(
+                status__in=['PENDING', 'SENDING'],
+                next_attempt_at__lte=timezone.now()
+            ).order_by('next_attempt_at').values_list('pk', flat=True)[:limit]
+        )
+        results = {'sent': 0, 'failed': 0}
+        for outbox_id in due_ids:
+            if self.deliver(outbox_id):
+                results['sent'] += 1
+            else:
+                results['failed'] += 1
+        return results
+
+    def _claim(self, outbox_id) -> Optional[EmailOutbox]:
+        """Lock a due entry and lease it to this worker for the duration of the send"""
+        now = timezone.now()
+        with transaction.atomic():
+            entry = (
+                EmailOutbox.objects.select_for_update(skip_locked=True)
+                .filter(pk=outbox_id, status__in=['PENDING', 'SENDING'], next_attempt_at__lte=now)
+                .first()
+            )
+            if entry is None:
+                return None
+            entry.status = 'SENDING'
+            entry.attempts += 1
+            entry.next_attempt_at = now + timedelta(seconds=self.send_lease)
+            entry.save(update_fields=['status', 'attempts', 'next_attempt_at'])
+        return entry
+
+    def _record_success(self, entry: EmailOutbox, message_ids: List[str]) -> None:
+        """
+        Mark the entry SENT. Brevo returns one message id per message version,
+        in recipient order: each EmailLog gets its own id and the outbox keeps
+        the first, so the stored value always fits the column.
+        """
+        entry.status = 'SENT'
+        entry.message_id = (message_ids[0] if message_ids else '')[:255]
+        entry.sent_at = timezone.now()
+        entry.last_error = ''
+        entry.save(update_fields=['status', 'message_id', 'sent_at', 'last_error'])
+
+        per_log = {
+            r['log_id']: message_id[:255]
+            for r, message_id in zip(entry.recipients, message_ids) if r.get('log_id')
+        }
+        self._update_logs(
+            entry,
+            status='SENT',
+            message_id=Case(*[When(pk=log_id, then=Value(mid)) for log_id, mid in per_log.items()],
+                            default=Value(entry.message_id)) if per_log else entry.message_id
+        )
+
+    def _record_failure(self, entry: EmailOutbox, error: str, permanent: bool) -> None:
+        entry.last_error = error
+        if permanent or entry.attempts >= self.max_attempts:
+            entry.status = 'FAILED'
+            logger.error(f"Giving up on email {entry.idempotency_key} after {entry.attempts} attempts: {error}")
+        else:
+            delay = min(self.retry_base * (2 ** (entry.attempts - 1)), self.retry_cap)
+            entry.status = 'PENDING'
+            entry.next_attempt_at = timezone.now() + timedelta(seconds=delay + random.uniform(0, self.retry_base))
+            logger.warning(f"Email {entry.idempotency_key} attempt {entry.attempts} failed, retrying in {delay}s: {error}")
+        entry.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+
+        if entry.status == 'FAILED':
+            self._update_logs(entry, status='FAILED', error_message=error)
+
+    def _update_logs(self, entry: EmailOutbox, **fields) -> None:
+        """Mirror the delivery outcome onto every EmailLog row the entry covers"""
+        log_ids = [r['log_id'] for r in entry.recipients if r.get('log_id')]
+        if entry.email_log_id:
+            log_ids.append(entry.email_log_id)
+        if log_ids:
+            EmailLog.objects.filter(pk__in=log_ids).update(**fields)
+
+
+class BrevoEmailService:
+    def send_custom_email(self, template_name: str, to_email: str,
+                         to_name: str, subject: str, context: Dict, project=None,
+                         idempotency_key: Optional[str] = None, user=None) -> bool:
+        """
+        Render a custom HTML template and queue it for delivery.
+
+        Nothing is sent from the request thread: the rendered message lands in
+        the email outbox and is dispatched once the surrounding transaction
+        commits (see EmailDeliveryService).
+        """
+        delivery = EmailDeliveryService()
+
+        # Create email log entry; delivery moves it to SENT or FAILED
         email_log = EmailLog.objects.create(
-            project=project,
-            recipient_email=to_email,
-            recipient_name=to_name,
-            template_type=template_name,
-            template_id=0,  # Not using Brevo template IDs
+            user=user,
+            to_email=to_email,
+            subject=subject[:255],
+            template_name=template_name,
             status='PENDING'
         )
         
         # If no API key is configured, mark as failed but don't crash
-        if not self.api_key:
+        if not delivery.transport.is_configured():
             email_log.status = 'FAILED'
             email_log.error_message = 'Brevo API key not configured'
             email_log.save()
-            import logging
-            logger = logging.getLogger('notifications')
             logger.warning(f"Email notification: {template_name} to {to_email} (API not configured)")
             return False
         
@@ -50,51 +281,97 @@ class BrevoEmailService:
             email_log.status = 'FAILED'
             email_log.error_message = f'Template rendering failed: {str(e)}'
             email_log.save()
-            import logging
-            logger = logging.getLogger('notifications')
             logger.error(f"Template rendering failed: {e}")
             return False
         
-        payload = {
-            'sender': {
-                'email': getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@docuhub.com'),
-                'name': getattr(settings, 'BREVO_SENDER_NAME', 'DocuHub System')
-            },
-            'to': [{'email': to_email, 'name': to_name}],
-            'subject': subject,
-            'htmlContent': html_content,
-            'textContent': text_content
-        }
-        
-        try:
-            response = requests.post(
-                self.api_url, 
-                headers=self.headers, 
-                data=json.dumps(payload),
-                timeout=10
+        return delivery.enqueue(
+            to_email=to_email,
+            to_name=to_name,
+            subject=subject,
+            html_content=html_content,
+            text_content=text_content,
+            template_name=template_name,
+            email_log=email_log,
+            idempotency_key=idempotency_key,
+        )
+    
+    # Brevo accepts at most 1000 message versions per request
+    BATCH_SIZE = 1000
+    RECIPIENT_PLACEHOLDER = '{{ params.user_name }}'
+
+    def send_batch_email(self, template_name: str, recipients: List[tuple], subject: str,
+                         context: Dict, project=None, idempotency_key: Optional[str] = None) -> bool:
+        """
+        Render a template once and queue it for many recipients.
+
+        ``recipients`` is a list of ``(email, name)`` pairs, or ``(email, name,
+        user)`` to link each log row to its user. The body is rendered
+        with a placeholder for ``user_name`` which Brevo fills per message
+        version, so the cost of a fan-out no longer grows with the number of
+        recipients: one render, one ``bulk_create`` of EmailLog rows and one
+        outbox entry (one HTTP call) per BATCH_SIZE recipients.
+        """
+        if not recipients:
+            return False
+
+        delivery = EmailDeliveryService()
+        if idempotency_key and EmailOutbox.objects.filter(idempotency_key=f"{idempotency_key}:0").exists():
+            logger.info(f"Batch email {idempotency_key} already queued, skipping duplicate")
+            return True
+
+        recipients = [(email, name, user[0] if user else None) for email, name, *user in recipients]
+        email_logs = EmailLog.objects.bulk_create([
+            EmailLog(
+                user=user,
+                to_email=email,
+                subject=subject[:255],
+                template_name=template_name,
+                status='PENDING'
             )
-            
-            if response.status_code == 201:
-                response_data = response.json()
-                email_log.status = 'SENT'
-                email_log.brevo_message_id = response_data.get('messageId', '')
-                email_log.save()
-                return True
-            else:
-                email_log.status = 'FAILED'
-                email_log.error_message = f"HTTP {response.status_code}: {response.text}"
-                email_log.save()
-                return False
-                
+            for email, name, user in recipients
+        ])
+        log_ids = [log.pk for log in email_logs]
+
+        if not delivery.transport.is_configured():
+            EmailLog.objects.filter(pk__in=log_ids).update(status='FAILED', error_message='Brevo API key not configured')
+            logger.warning(f"Email notification: {template_name} to {len(recipients)} recipients (API not configured)")
+            return False
+
+        try:
+            shared_context = dict(context, user_name=self.RECIPIENT_PLACEHOLDER)
+            html_content = render_to_string(f'emails/{template_name}.html', shared_context)
+            text_content = render_to_string(f'emails/{template_name}.txt', shared_context)
         except Exception as e:
-            email_log.status = 'FAILED'
-            email_log.error_message = str(e)
-            email_log.save()
-            import logging
-            logger = logging.getLogger('notifications')
-            logger.error(f"Email sending failed: {e}")
+            EmailLog.objects.filter(pk__in=log_ids).update(status='FAILED', error_message=f'Template rendering failed: {str(e)}')
+            logger.error(f"Template rendering failed: {e}")
             return False
-    
+
+        versions = [
+            {'email': email, 'name': name, 'params': {'user_name': escape(name)}, 'log_id': str(log_id)}
+            for (email, name, _), log_id in zip(recipients, log_ids)
+        ]
+        batch_key = idempotency_key or uuid.uuid4().hex
+        for index, start in enumerate(range(0, len(versions), self.BATCH_SIZE)):
+            chunk = versions[start:start + self.BATCH_SIZE]
+            delivery.enqueue(
+                to_email=chunk[0]['email'],
+                to_name=f"{len(chunk)} recipients",
+                subject=subject,
+                html_content=html_content,
+                text_content=text_content,
+                template_name=template_name,
+                idempotency_key=f"{batch_key}:{index}",
+                recipients=chunk,
+            )
+        return True
+
+    @staticmethod
+    def _event_key(template_name: str, project, stamp, to_email: str) -> Optional[str]:
+        """Stable outbox key for a project event, so a retried request does not email twice"""
+        if stamp is None:
+            return None
+        return f"{template_name}:{project.pk}:{stamp.isoformat()}:{to_email}"
+
     def _get_template_type(self, template_id: int) -> str:
         """Get template type based on template ID"""
         email_templates = getattr(settings, 'EMAIL_TEMPLATES', {})
@@ -130,7 +407,9 @@ class BrevoEmailService:
             user.get_full_name() or user.username,
             subject,
             context,
-            project
+            project,
+            idempotency_key=self._event_key('project_submitted', project, project.date_submitted, user.email),
+            user=user
         )
     
     def notify_project_approved(self, project, user, admin):
@@ -155,7 +434,9 @@ class BrevoEmailService:
             user.get_full_name() or user.username,
             subject,
             context,
-            project
+            project,
+            idempotency_key=self._event_key('project_approved', project, project.date_reviewed, user.email),
+            user=user
         )
     
     def notify_project_rejected(self, project, user, admin):
@@ -181,11 +462,13 @@ class BrevoEmailService:
             user.get_full_name() or user.username,
             subject,
             context,
-            project
+            project,
+            idempotency_key=self._event_key('project_rejected', project, project.date_reviewed, user.email),
+            user=user
         )
     
     def notify_admin_new_submission(self, project, admin_users):
-        """Send new submission alert to admins"""
+        """Send new submission alert to admins as one batched request"""
         context = {
             'project_name': project.project_name,
             'project_version': project.version_display,
@@ -196,24 +479,21 @@ class BrevoEmailService:
         }
         
         subject = f"New Project Submission: {project.project_name} {project.version_display}"
-        success_count = 0
-        
-        for admin in admin_users:
-            admin_context = context.copy()
-            admin_context['user_name'] = admin.get_full_name() or admin.username
-            admin_context['admin'] = admin
-            
-            if self.send_custom_email(
-                'admin_new_submission',
-                admin.email,
-                admin.get_full_name() or admin.username,
-                subject,
-                admin_context,
-                project
-            ):
-                success_count += 1
+        recipients = [
+            (admin.email, admin.get_full_name() or admin.username, admin)
+            for admin in admin_users if admin.email
+        ]
         
-        return success_count > 0
+        # Keyed per submission, so the signal and the submission service
+        # firing for the same event produce a single batch.
+        return self.send_batch_email(
+            'admin_new_submission',
+            recipients,
+            subject,
+            context,
+            project,
+            idempotency_key=self._event_key('admin_new_submission', project, project.date_submitted, 'reviewers')
+        )
     
     def notify_revision_required(self, project, user, admin):
         """Send revision required notification to user"""
@@ -237,7 +517,9 @@ class BrevoEmailService:
             user.get_full_name() or user.username,
             subject,
             context,
-            project
+            project,
+            idempotency_key=self._event_key('revision_required', project, project.date_reviewed, user.email),
+            user=user
         )
     
     def notify_project_obsolete(self, project, user):
@@ -258,7 +540,8 @@ class BrevoEmailService:
             user.get_full_name() or user.username,
             subject,
             context,
-            project
+            project,
+            user=user
         )
     
     def send_account_setup_email(self, user, setup_url):
@@ -279,7 +562,8 @@ class BrevoEmailService:
             user.email,
             user.get_full_name() or user.username,
             subject,
-            context
+            context,
+            user=user
         )
     
     def send_password_reset_email(self, user, temp_password, login_url, is_temp_password=False):
@@ -299,7 +583,8 @@ class BrevoEmailService:
             user.email,
             user.get_full_name() or user.username,
             subject,
-            context
+            context,
+            user=user
         )
 
     
\ No newline at end of file
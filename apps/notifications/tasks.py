@@ -0,0 +1,15 @@
+from celery import shared_task
+
+from .services import EmailDeliveryService
+
+
+@shared_task(ignore_result=True)
+def deliver_email(outbox_id):
+    """Send a single outbox entry; retries are scheduled through the outbox, not Celery"""
+    EmailDeliveryService().deliver(outbox_id)
+
+
+@shared_task(ignore_result=True)
+def drain_email_outbox(limit=100):
+    """Periodic sweep for entries whose dispatch was lost or whose retry is due"""
+    return EmailDeliveryService().drain(limit=limit)
@@ -0,0 +1,183 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, override_settings
+from apps.accounts.models import EmailLog, EmailOutbox
+from apps.notifications.fakes import FakeBrevoTransport
+from apps.notifications.services import BrevoEmailService, EmailDeliveryService
+
+
+@override_settings(
+    EMAIL_TRANSPORT='apps.notifications.fakes.FakeBrevoTransport',
+    EMAIL_DELIVERY_MODE='eager',
+    EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+)
+class EmailDeliveryServiceTests(TestCase):
+    def setUp(self):
+        FakeBrevoTransport.reset()
+        self.service = EmailDeliveryService()
+
+    def enqueue(self, key='key-1'):
+        return self.service.enqueue(
+            to_email='user@example.com', to_name='User', subject='Hello',
+            html_content='<p>Hi</p>', text_content='Hi', idempotency_key=key,
+        )
+
+    def test_sends_only_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.enqueue()
+            self.assertEqual(FakeBrevoTransport.outbox, [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(FakeBrevoTransport.outbox), 1)
+        entry = EmailOutbox.objects.get()
+        self.assertEqual(entry.status, 'SENT')
+        self.assertTrue(entry.message_id)
+
+    def test_rolled_back_transaction_sends_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.enqueue()
+                    raise RuntimeError('request failed')
+            except RuntimeError:
+                pass
+        self.assertEqual(FakeBrevoTransport.outbox, [])
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_duplicate_key_is_sent_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enqueue()
+            self.enqueue()
+        self.assertEqual(len(FakeBrevoTransport.outbox), 1)
+        entry = EmailOutbox.objects.get()
+        self.assertFalse(self.service.deliver(entry.pk))
+        self.assertEqual(len(FakeBrevoTransport.outbox), 1)
+
+    def test_failures_back_off_then_give_up(self):
+        FakeBrevoTransport.fail_next(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enqueue()
+        entry = EmailOutbox.objects.get()
+        self.assertEqual(entry.status, 'PENDING')
+        self.assertEqual(entry.attempts, 1)
+        # Not due yet, so a drain leaves it alone
+        self.assertEqual(self.service.drain(), {'sent': 0, 'failed': 0})
+
+        for _ in range(2):
+            EmailOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=entry.created_at)
+            self.service.drain()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'FAILED')
+        self.assertEqual(entry.attempts, 3)
+        self.assertEqual(FakeBrevoTransport.outbox, [])
+
+    def test_permanent_client_error_is_not_retried(self):
+        FakeBrevoTransport.fail_next(1, status_code=400)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enqueue()
+        entry = EmailOutbox.objects.get()
+        self.assertEqual(entry.status, 'FAILED')
+        self.assertEqual(entry.attempts, 1)
+
+    def test_batched_entry_is_one_request_with_message_versions(self):
+        recipients = [
+            {'email': f'admin{i}@example.com', 'name': f'Admin {i}', 'params': {'user_name': f'Admin {i}'}}
+            for i in range(3)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.enqueue(
+                to_email=recipients[0]['email'], to_name='3 recipients', subject='New submission',
+                html_content='<p>Hello {{ params.user_name }}</p>', idempotency_key='batch:0',
+                recipients=recipients,
+            )
+        self.assertEqual(len(FakeBrevoTransport.outbox), 1)
+        payload = FakeBrevoTransport.outbox[0]
+        self.assertNotIn('to', payload)
+        self.assertEqual(
+            [version['to'][0]['email'] for version in payload['messageVersions']],
+            ['admin0@example.com', 'admin1@example.com', 'admin2@example.com'],
+        )
+        self.assertEqual(payload['messageVersions'][1]['params'], {'user_name': 'Admin 1'})
+
+
+@override_settings(
+    EMAIL_TRANSPORT='apps.notifications.fakes.FakeBrevoTransport',
+    EMAIL_DELIVERY_MODE='outbox',
+)
+class BrevoEmailServiceTests(TestCase):
+    def setUp(self):
+        FakeBrevoTransport.reset()
+        self.user = User.objects.create_user(
+            username='submitter', email='submitter@example.com', password='password123',
+            first_name='Sam', last_name='Submitter'
+        )
+
+    def test_notification_is_logged_and_queued(self):
+        self.assertTrue(BrevoEmailService().send_password_reset_email(
+            self.user, 'temp-pass', 'https://docuhub.example.com/login/', is_temp_password=True
+        ))
+
+        log = EmailLog.objects.get()
+        self.assertEqual(
+            (log.user, log.to_email, log.template_name, log.status),
+            (self.user, 'submitter@example.com', 'password_reset', 'PENDING')
+        )
+        entry = EmailOutbox.objects.get()
+        self.assertEqual(entry.email_log, log)
+        self.assertEqual((entry.to_email, entry.to_name), ('submitter@example.com', 'Sam Submitter'))
+        self.assertIn('temp-pass', entry.html_content)
+
+    def test_template_errors_are_logged_as_failed(self):
+        self.assertFalse(BrevoEmailService().send_custom_email(
+            'no_such_template', 'submitter@example.com', 'Sam', 'Hello', {}, user=self.user
+        ))
+        log = EmailLog.objects.get()
+        self.assertEqual(log.status, 'FAILED')
+        self.assertIn('Template rendering failed', log.error_message)
+        self.assertFalse(EmailOutbox.objects.exists())
+
+
+@override_settings(
+    EMAIL_TRANSPORT='apps.notifications.fakes.FakeBrevoTransport',
+    EMAIL_DELIVERY_MODE='eager',
+)
+class BatchEmailTests(TestCase):
+    def setUp(self):
+        FakeBrevoTransport.reset()
+        self.admins = [
+            User.objects.create_user(username=f'admin{i}', email=f'admin{i}@example.com', password='password123')
+            for i in range(3)
+        ]
+
+    def test_batch_is_logged_queued_and_delivered(self):
+        recipients = [(admin.email, admin.username, admin) for admin in self.admins]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(BrevoEmailService().send_batch_email(
+                'project_obsolete', recipients, 'Project Obsolete: Tower',
+                {'project_name': 'Tower', 'project_url': 'https://docuhub.example.com/projects/1/'},
+                idempotency_key='obsolete:tower'
+            ))
+
+        self.assertEqual(len(FakeBrevoTransport.outbox), 1)
+        payload = FakeBrevoTransport.outbox[0]
+        self.assertEqual([version['params'] for version in payload['messageVersions']],
+                         [{'user_name': 'admin0'}, {'user_name': 'admin1'}, {'user_name': 'admin2'}])
+        self.assertIn('{{ params.user_name }}', payload['htmlContent'])
+
+        entry = EmailOutbox.objects.get()
+        self.assertEqual(entry.status, 'SENT')
+        self.assertEqual(entry.message_id, '<fake-1.0@brevo>')
+        logs = EmailLog.objects.order_by('to_email')
+        self.assertEqual([log.user for log in logs], self.admins)
+        self.assertEqual([(log.status, log.message_id, log.template_name) for log in logs], [
+            ('SENT', '<fake-1.0@brevo>', 'project_obsolete'),
+            ('SENT', '<fake-1.1@brevo>', 'project_obsolete'),
+            ('SENT', '<fake-1.2@brevo>', 'project_obsolete'),
+        ])
+
+        # A retried request with the same key queues nothing new
+        with self.captureOnCommitCallbacks(execute=True):
+            BrevoEmailService().send_batch_email(
+                'project_obsolete', recipients, 'Project Obsolete: Tower', {}, idempotency_key='obsolete:tower'
+            )
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+        self.assertEqual(len(FakeBrevoTransport.outbox), 1)
@@ -4,6 +4,7 @@ from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
 from apps.accounts.models import NotificationPreferences, EmailLog
+from apps.core.search import search_ids
 from .forms import NotificationPreferencesForm
 
 @login_required
@@ -46,10 +47,11 @@ def email_logs(request):
     # Search by email or project
     search = request.GET.get('search')
     if search:
+        # Projects come from the search index instead of a join on project_name
         logs = logs.filter(
             Q(recipient_email__icontains=search) |
-            Q(project__project_name__icontains=search) |
-            Q(recipient_name__icontains=search)
+            Q(recipient_name__icontains=search) |
+            Q(project_id__in=search_ids('project', search))
         )
     
     # Get unique template types for filter dropdown
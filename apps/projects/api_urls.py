@@ -10,4 +10,9 @@ urlpatterns = [
     path('', include(router.urls)),
     path('projects/<uuid:pk>/submit/', api_views.submit_project_api, name='submit-project'),
     path('projects/<uuid:pk>/review/', api_views.review_project_api, name='review-project'),
+    path('uploads/', api_views.start_upload_api, name='upload-start'),
+    path('uploads/<uuid:pk>/', api_views.upload_session_api, name='upload-session'),
+    path('uploads/<uuid:pk>/complete/', api_views.complete_upload_api, name='upload-complete'),
+    path('files/<str:sha256>/<str:filename>', api_views.signed_download, name='document-signed-download'),
+    path('previews/<str:sha256>/<str:size>.jpg', api_views.preview_download, name='document-preview'),
 ]
\ No newline at end of file
@@ -1,38 +1,149 @@
-from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework import generics, viewsets, status
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import never_cache
-from .models import Project, Document
-from .serializers import ProjectSerializer, DocumentSerializer
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.http import require_http_methods
+from django.db.models import Count, Max, Prefetch
+from .conditional import (
+    ConditionalGetMixin, latest, project_list_state, project_state_annotations
+)
+from .models import Project, Document, ApprovalHistory, ProjectHistory, UploadSession
+from .serializers import ProjectSerializer, ProjectListSerializer, DocumentSerializer
 from .permissions import (
-    CanEditProject, ProjectManagerPermission, ProjectOwnerPermission,
+    CanEditProject, CanViewProject, ProjectManagerPermission, ProjectOwnerPermission,
     ProjectUserRateThrottle, ProjectAdminRateThrottle, IsProjectManager
 )
+from .downloads import DOWNLOAD_URL_TTL, download_filename, serve_blob, signed_url, verify_signature
+from .previews import serve_preview, verify_preview
 from .services import ProjectSubmissionService
+from .uploads import UploadError, UploadOffsetConflict, abort_upload, complete_upload, receive_chunk, start_upload
 from apps.accounts.utils import get_client_ip
+from apps.core.pagination import StreamingExportMixin
 
+# Responses may be stored but must be revalidated: clients send If-None-Match
 @method_decorator(csrf_exempt, name='dispatch')
-@method_decorator(never_cache, name='dispatch')
-class ProjectViewSet(viewsets.ModelViewSet):
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+class ProjectViewSet(ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [IsAuthenticated, ProjectOwnerPermission]
+    export_permission_classes = [IsAuthenticated, ProjectManagerPermission]
+    export_filename = 'projects'
     throttle_classes = [ProjectUserRateThrottle]
     
-    def get_queryset(self):
+    # Actions serialised with ProjectListSerializer
+    COMPACT_ACTIONS = ('list', 'export')
+    
+    # Nested collections and the prefetch each one needs
+    NESTED_PREFETCHES = {
+        'documents': Prefetch(
+            'documents', queryset=Document.objects.select_related('project', 'created_by', 'updated_by')
+        ),
+        'approval_history': Prefetch(
+            'approval_history',
+            queryset=ApprovalHistory.objects.select_related('project', 'document', 'performed_by')
+        ),
+        'history_logs': Prefetch(
+            'history_logs', queryset=ProjectHistory.objects.select_related('project', 'submitted_by')
+        ),
+    }
+    
+    def get_scoped_queryset(self):
         # Use proper permission checking instead of is_staff
         if IsProjectManager.has_permission(self.request.user):
-            return Project.objects.all().select_related('created_by').prefetch_related('documents')
-        return Project.objects.filter(created_by=self.request.user).select_related('created_by').prefetch_related('documents')
+            return Project.objects.all()
+        return Project.objects.filter(created_by=self.request.user)
+    
+    def get_queryset(self):
+        queryset = self.get_scoped_queryset().select_related('created_by', 'project_group').annotate(
+            num_documents=Count('documents')
+        )
+        prefetches = [self.NESTED_PREFETCHES[name] for name in self.get_nested_fields()]
+        return queryset.prefetch_related(*prefetches)
+    
+    def _query_param_list(self, name):
+        value = self.request.query_params.get(name, '') if self.request else ''
+        return [item.strip() for item in value.split(',') if item.strip()]
+    
+    def get_nested_fields(self):
+        """Nested collections the response will contain"""
+        fields = self._query_param_list('fields')
+        if self.action in self.COMPACT_ACTIONS:
+            wanted = set(self._query_param_list('expand')) | set(fields)
+        else:
+            wanted = set(fields) if fields else set(self.NESTED_PREFETCHES)
+        return [name for name in self.NESTED_PREFETCHES if name in wanted]
+    
+    def get_serializer_class(self):
+        if self.action in self.COMPACT_ACTIONS:
+            return ProjectListSerializer
+        return ProjectSerializer
+    
+    def get_serializer(self, *args, **kwargs):
+        if self.request and self.request.method == 'GET':
+            kwargs.setdefault('fields', self._query_param_list('fields') or None)
+            kwargs.setdefault('expand', self._query_param_list('expand'))
+        return super().get_serializer(*args, **kwargs)
     
     def perform_create(self, serializer):
         # Set version to 1 for new projects
         serializer.save(created_by=self.request.user, version_number=1)
     
+    def get_list_state(self, queryset):
+        return project_list_state(queryset)
+    
+    def annotate_state(self, queryset):
+        # created_by is read by the object permission check
+        return queryset.select_related('created_by').annotate(**project_state_annotations())
+    
+    def object_validators(self, obj):
+        parts = (
+            obj.pk, obj.updated_at, obj.state_group_updated, obj.state_documents_updated,
+            obj.state_documents, obj.state_approvals_updated, obj.state_approvals, obj.state_history_logs
+        )
+        last_modified = latest(
+            obj.updated_at, obj.state_group_updated, obj.state_documents_updated, obj.state_approvals_updated
+        )
+        return parts, last_modified
+    
+    @action(detail=True, methods=['get'], url_path='download-urls')
+    def download_urls(self, request, *args, **kwargs):
+        """
+        Signed, short-lived URLs for every file in the project, so a viewer
+        can fetch the whole set after this one permission check.
+        """
+        project = generics.get_object_or_404(
+            self.get_scoped_queryset().select_related('created_by'), pk=kwargs['pk']
+        )
+        self.check_object_permissions(request, project)
+        if not CanViewProject.has_permission(request.user, project):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        
+        documents = (
+            project.documents.exclude(file_sha256='').order_by('document_number')
+            .only('id', 'document_number', 'file_path', 'file_name', 'file_sha256')
+        )
+        now = timezone.now().timestamp()
+        return Response({
+            'expires_in': DOWNLOAD_URL_TTL,
+            'documents': [
+                {
+                    'id': str(document.id),
+                    'document_number': document.document_number,
+                    'sha256': document.file_sha256,
+                    'url': request.build_absolute_uri(
+                        signed_url(document.file_sha256, download_filename(document), now=now)
+                    ),
+                }
+                for document in documents
+            ],
+        })
+    
     def get_throttles(self):
         """Use admin throttle for privileged users"""
         if IsProjectManager.has_permission(self.request.user):
@@ -40,10 +151,12 @@ class ProjectViewSet(viewsets.ModelViewSet):
         return super().get_throttles()
 
 @method_decorator(csrf_exempt, name='dispatch')
-@method_decorator(never_cache, name='dispatch')
-class DocumentViewSet(viewsets.ModelViewSet):
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+class DocumentViewSet(ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     serializer_class = DocumentSerializer
     permission_classes = [IsAuthenticated, ProjectOwnerPermission]
+    export_permission_classes = [IsAuthenticated, ProjectManagerPermission]
+    export_filename = 'documents'
     throttle_classes = [ProjectUserRateThrottle]
     
     def get_queryset(self):
@@ -57,6 +170,32 @@ class DocumentViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
     
+    def get_list_state(self, queryset):
+        return queryset.select_related(None).order_by().aggregate(
+            count=Count('pk'),
+            updated=Max('updated_at'),
+            project_updated=Max('project__updated_at'),
+        )
+    
+    def annotate_state(self, queryset):
+        return queryset.select_related('project__created_by')
+    
+    def object_validators(self, obj):
+        parts = (obj.pk, obj.updated_at, obj.project.updated_at)
+        return parts, latest(obj.updated_at, obj.project.updated_at)
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, *args, **kwargs):
+        """The document's file; the web server does the transfer, ranges included"""
+        document = self.get_object()
+        if not CanViewProject.has_permission(request.user, document.project):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        if not document.file_sha256:
+            return Response({'error': 'Document has no file'}, status=status.HTTP_404_NOT_FOUND)
+        return serve_blob(
+            document.file_sha256, download_filename(document), request.META.get('HTTP_RANGE', '')
+        )
+    
     def get_throttles(self):
         """Use admin throttle for privileged users"""
         if IsProjectManager.has_permission(self.request.user):
@@ -136,4 +275,126 @@ def review_project_api(request, pk):
     if success:
         return Response({'message': f'Project {action}d successfully'}, status=status.HTTP_200_OK)
     else:
-        return Response({'error': f'Failed to {action} project'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'error': f'Failed to {action} project'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _upload_payload(session):
+    return {
+        'id': str(session.id),
+        'document': str(session.document_id),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.offset,
+        'status': session.status,
+        'expires_at': session.expires_at.isoformat(),
+    }
+
+
+def _upload_error(error):
+    payload = {'error': str(error)}
+    if isinstance(error, UploadOffsetConflict):
+        payload['offset'] = error.offset
+    return Response(payload, status=error.status_code)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([ProjectUserRateThrottle])
+@csrf_exempt
+@never_cache
+def start_upload_api(request):
+    """Open a resumable upload session for a document's file"""
+    # DRF's lookup turns a malformed id into a 404 as well
+    document = generics.get_object_or_404(
+        Document.objects.select_related('project__created_by'), pk=request.data.get('document')
+    )
+    if not ProjectOwnerPermission().has_object_permission(request, None, document):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        size = int(request.data.get('size', 0))
+    except (TypeError, ValueError):
+        return Response({'error': 'size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        session = start_upload(
+            document, request.user, request.data.get('filename', ''), size, request.data.get('sha256', '')
+        )
+    except UploadError as e:
+        return _upload_error(e)
+    return Response(_upload_payload(session), status=status.HTTP_201_CREATED)
+
+@api_view(['GET', 'PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([ProjectUserRateThrottle])
+@csrf_exempt
+@never_cache
+def upload_session_api(request, pk):
+    """
+    GET reports the offset to resume from, DELETE aborts, and PATCH appends
+    one chunk: the raw request body, starting at the ``Upload-Offset``
+    header, optionally verified against the hex ``Upload-Checksum`` header
+    (SHA-256). The body is streamed, never parsed.
+    """
+    session = get_object_or_404(UploadSession, pk=pk, created_by=request.user)
+    
+    try:
+        if request.method == 'PATCH':
+            try:
+                offset = int(request.META.get('HTTP_UPLOAD_OFFSET', ''))
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                return Response({'error': 'Upload-Offset and Content-Length are required'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            session.offset = receive_chunk(
+                session, offset, request.stream, length, request.META.get('HTTP_UPLOAD_CHECKSUM', '')
+            )
+        elif request.method == 'DELETE':
+            abort_upload(session)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+    except UploadError as e:
+        return _upload_error(e)
+    
+    response = Response(_upload_payload(session))
+    response['Upload-Offset'] = str(session.offset)
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([ProjectUserRateThrottle])
+@csrf_exempt
+@never_cache
+def complete_upload_api(request, pk):
+    """Store a fully received upload as the document's file"""
+    session = get_object_or_404(UploadSession, pk=pk, created_by=request.user)
+    try:
+        document = complete_upload(session)
+    except UploadError as e:
+        return _upload_error(e)
+    return Response({
+        'document': str(document.pk),
+        'file': document.file_path.name,
+        'sha256': document.file_sha256,
+    }, status=status.HTTP_200_OK)
+
+
+@require_http_methods(['GET', 'HEAD'])
+def signed_download(request, sha256, filename):
+    """
+    Serve a file through a URL from ``download_urls``. The signature is
+    the only check: no authentication, session or database lookup.
+    """
+    if not verify_signature(sha256, filename, request.GET.get('expires'), request.GET.get('signature')):
+        return JsonResponse({'error': 'Link is invalid or has expired'}, status=403)
+    return serve_blob(sha256, filename, request.META.get('HTTP_RANGE', ''))
+
+
+@require_http_methods(['GET', 'HEAD'])
+def preview_download(request, sha256, size):
+    """Serve a thumbnail or preview through a URL from ``preview_url``, rendering it on first request"""
+    expires = request.GET.get('expires')
+    if not verify_preview(sha256, size, expires, request.GET.get('signature')):
+        return JsonResponse({'error': 'Link is invalid or has expired'}, status=403)
+    response = serve_preview(sha256, size, int(expires))
+    if response is None:
+        return JsonResponse({'error': 'No preview for this file'}, status=404)
+    return response
@@ -3,4 +3,11 @@ from django.apps import AppConfig
 class ProjectsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.projects'
-    
\ No newline at end of file
+
+    def ready(self):
+        from apps.projects import search
+        search.register()
+        from apps.projects import blobs
+        blobs.register()
+        from apps.projects import previews
+        previews.register()
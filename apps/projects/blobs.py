@@ -0,0 +1,143 @@
+"""
+Reference counting and garbage collection for document blobs.
+
+``Blob.ref_count`` is the number of Document rows whose ``file_sha256``
+points at the blob. Saves and deletes of single documents adjust it from
+signal receivers (cascades included); bulk paths that bypass signals,
+such as cloning a version's documents, call ``add_references`` with the
+whole batch, one UPDATE per distinct delta.
+
+A blob whose count drops to zero is stamped ``unreferenced_since``.
+``collect_garbage`` deletes blobs that have stayed unreferenced for the
+grace period, after re-checking the Document table, so a drifted counter
+can delay collection but never loses a referenced file; ``recount``
+repairs the counters from the Document table.
+"""
+import logging
+import os
+from collections import Counter, defaultdict
+from datetime import timedelta
+from typing import Mapping, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import Blob, Document
+from .storage import blob_name, document_storage, sha256_from_name
+
+logger = logging.getLogger('projects')
+
+BLOB_GC_GRACE_PERIOD = getattr(settings, 'BLOB_GC_GRACE_PERIOD', 24 * 3600)
+GC_BATCH_SIZE = 500
+
+
+def add_references(counts: Mapping[str, int]) -> None:
+    """Add ``counts[sha256]`` (negative to release) to each blob's reference count"""
+    by_delta = defaultdict(list)
+    for sha256, delta in counts.items():
+        if sha256 and delta:
+            by_delta[delta].append(sha256)
+    now = timezone.now()
+    for delta, hashes in by_delta.items():
+        Blob.objects.filter(pk__in=hashes).update(
+            ref_count=F('ref_count') + delta,
+            # Compared against the count before this update
+            unreferenced_since=Case(
+                When(ref_count__lte=-delta, then=Value(now)), default=Value(None)
+            ),
+        )
+
+
+def _document_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = instance.old_value('file_sha256')
+    if old != instance.file_sha256:
+        add_references(Counter({instance.file_sha256: 1, old: -1}))
+
+
+def _document_deleted(sender, instance, **kwargs):
+    add_references({instance.file_sha256: -1})
+
+
+def register():
+    post_save.connect(_document_saved, sender=Document, dispatch_uid='blob-references-save')
+    post_delete.connect(_document_deleted, sender=Document, dispatch_uid='blob-references-delete')
+
+
+def import_legacy_file(name: str) -> Optional[str]:
+    """
+    Move a file stored under its upload name into the blob store and point
+    every document using it at the blob; returns the blob name, or None if
+    the file is missing.
+    """
+    storage = document_storage()
+    if sha256_from_name(name):
+        return name
+    if not storage.backing.exists(name):
+        logger.warning(f"Legacy document file {name} is missing")
+        return None
+    with storage.backing.open(name, 'rb') as content:
+        stored = storage.save(name, content)
+    sha256 = sha256_from_name(stored)
+    with transaction.atomic():
+        documents = Document.objects.filter(file_path=name)
+        documents.filter(file_name='').update(file_name=os.path.basename(name))
+        moved = documents.update(file_path=stored, file_sha256=sha256)
+        add_references({sha256: moved})
+    storage.backing.delete(name)
+    return stored
+
+
+def recount() -> int:
+    """Reset every blob's reference count from the Document table; returns the number corrected"""
+    counts = dict(
+        Document.objects.exclude(file_sha256='').order_by()
+        .values('file_sha256').annotate(rows=Count('pk')).values_list('file_sha256', 'rows')
+    )
+    now = timezone.now()
+    corrected = 0
+    for blob in Blob.objects.only('sha256', 'ref_count', 'unreferenced_since').iterator():
+        expected = counts.get(blob.sha256, 0)
+        if blob.ref_count != expected:
+            unreferenced_since = (blob.unreferenced_since or now) if expected == 0 else None
+            Blob.objects.filter(pk=blob.sha256).update(ref_count=expected, unreferenced_since=unreferenced_since)
+            corrected += 1
+    return corrected
+
+
+def collect_garbage(grace_period: Optional[int] = None, dry_run: bool = False) -> dict:
+    """Delete blobs unreferenced for longer than ``grace_period`` seconds"""
+    grace_period = BLOB_GC_GRACE_PERIOD if grace_period is None else grace_period
+    cutoff = timezone.now() - timedelta(seconds=grace_period)
+    storage = document_storage().backing
+    result = {'deleted': 0, 'bytes': 0, 'still_referenced': 0}
+
+    candidates = list(
+        Blob.objects.filter(ref_count__lte=0, unreferenced_since__lt=cutoff)
+        .order_by('unreferenced_since').values_list('sha256', flat=True)[:GC_BATCH_SIZE]
+    )
+    live = set(
+        Document.objects.filter(file_sha256__in=candidates).values_list('file_sha256', flat=True)
+    )
+    for sha256 in candidates:
+        if sha256 in live:
+            result['still_referenced'] += 1
+            continue
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(
+                pk=sha256, ref_count__lte=0, unreferenced_since__lt=cutoff
+            ).first()
+            if blob is None:
+                continue
+            if not dry_run:
+                storage.delete(blob_name(sha256))
+                blob.delete()
+            result['deleted'] += 1
+            result['bytes'] += blob.size
+    if result['still_referenced']:
+        logger.warning(f"{result['still_referenced']} blobs had drifted reference counts; run recount")
+    return result
@@ -0,0 +1,133 @@
+"""
+Conditional GET (ETag / Last-Modified) for the project API.
+
+Validators are computed from timestamps and row counts in the database,
+never from the serialised body: one query for a detail or a list request,
+using correlated subqueries on the indexed foreign keys of the nested
+relations. When the client's ``If-None-Match`` / ``If-Modified-Since``
+still match, the view answers 304 without loading or serialising anything.
+"""
+import hashlib
+
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.generics import get_object_or_404
+
+from .models import ApprovalHistory, Document, ProjectHistory
+
+
+def _related_aggregate(model, aggregate):
+    return Subquery(
+        model.objects.filter(project=OuterRef('pk'))
+        .order_by()
+        .values('project')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+
+
+def _related_count(model):
+    return Coalesce(_related_aggregate(model, Count('pk')), Value(0), output_field=IntegerField())
+
+
+def project_state_annotations() -> dict:
+    """Per-project change markers covering everything ProjectSerializer nests"""
+    return {
+        'state_group_updated': F('project_group__updated_at'),
+        'state_documents_updated': _related_aggregate(Document, Max('updated_at')),
+        'state_documents': _related_count(Document),
+        'state_approvals_updated': _related_aggregate(ApprovalHistory, Max('performed_at')),
+        'state_approvals': _related_count(ApprovalHistory),
+        'state_history_logs': _related_count(ProjectHistory),
+    }
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def latest(*timestamps):
+    """The newest of ``timestamps``, ignoring missing ones"""
+    present = [timestamp for timestamp in timestamps if timestamp is not None]
+    return max(present) if present else None
+
+
+def project_list_state(queryset) -> dict:
+    """Aggregate change markers for a project list queryset, in one query"""
+    annotated = (
+        queryset.prefetch_related(None).select_related(None).order_by()
+        .annotate(**project_state_annotations())
+    )
+    return annotated.aggregate(
+        count=Count('pk'),
+        updated=Max('updated_at'),
+        group_updated=Max('state_group_updated'),
+        documents_updated=Max('state_documents_updated'),
+        documents=Sum('state_documents'),
+        approvals_updated=Max('state_approvals_updated'),
+        approvals=Sum('state_approvals'),
+        history_logs=Sum('state_history_logs'),
+    )
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for ModelViewSet list and retrieve.
+
+    Subclasses provide ``get_list_state(queryset)``, returning a dict of
+    change markers for a filtered queryset, ``annotate_state(queryset)``,
+    adding whatever ``object_validators(obj)`` needs to a detail lookup,
+    and ``object_validators(obj)`` itself, returning ``(parts, last_modified)``.
+    """
+
+    def _not_modified(self, request, etag, last_modified):
+        self._validators = (etag, last_modified)
+        return get_conditional_response(
+            request, etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag, last_modified = getattr(self, '_validators', (None, None))
+        if etag and response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def get_scoped_queryset(self):
+        """The queryset validators are computed from, without serialisation extras"""
+        return self.get_queryset()
+
+    def get_state_object(self):
+        """The requested object, permission-checked, loaded without prefetches"""
+        queryset = self.annotate_state(
+            self.filter_queryset(self.get_scoped_queryset()).prefetch_related(None)
+        )
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def list(self, request, *args, **kwargs):
+        state = self.get_list_state(self.filter_queryset(self.get_scoped_queryset()))
+        etag = make_etag(
+            request.user.pk, request.get_full_path(), *(state[key] for key in sorted(state))
+        )
+        last_modified = latest(*(value for key, value in state.items() if key.endswith('updated')))
+        not_modified = self._not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        parts, last_modified = self.object_validators(self.get_state_object())
+        etag = make_etag(request.user.pk, *parts)
+        not_modified = self._not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        return super().retrieve(request, *args, **kwargs)
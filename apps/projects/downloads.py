@@ -0,0 +1,159 @@
+"""
+Document downloads handed off to the web server.
+
+Django only decides whether a file may be fetched; nginx moves the bytes.
+A permitted request gets an empty response whose ``X-Accel-Redirect``
+header points into an ``internal`` nginx location aliasing MEDIA_ROOT
+(see docs/serversetting/nginx), so the worker is free as soon as the
+headers are written and nginx serves the file with sendfile and Range
+support, which is what lets clients resume interrupted downloads.
+
+Signed URLs let a viewer fetch many sheets after a single permission
+check. The URL names the blob, the download filename and an expiry time,
+and carries an HMAC-SHA256 of the three keyed from SECRET_KEY, so
+verifying it needs no session and no query. Blob names are content
+hashes, so a URL only ever returns the exact bytes it was issued for.
+
+With no DOCUMENT_DOWNLOAD_ACCEL_PREFIX (the default under DEBUG) Django
+streams the file itself and honours a single byte range.
+"""
+import mimetypes
+import re
+import time
+from typing import Optional
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.http import content_disposition_header
+
+from .storage import blob_name, document_storage
+
+DOWNLOAD_ACCEL_PREFIX = getattr(
+    settings, 'DOCUMENT_DOWNLOAD_ACCEL_PREFIX', '' if settings.DEBUG else '/protected-media/'
+)
+DOWNLOAD_URL_TTL = getattr(settings, 'DOCUMENT_DOWNLOAD_URL_TTL', 15 * 60)
+READ_BLOCK = 64 * 1024
+
+_SIGNING_SALT = 'apps.projects.downloads'
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def download_filename(document) -> str:
+    return document.file_name or f'{document.document_number}{_extension(document.file_path.name)}'
+
+
+def _extension(name: str) -> str:
+    match = re.search(r'\.[A-Za-z0-9]{1,8}$', name or '')
+    return match.group(0) if match else ''
+
+
+def sign(*parts) -> str:
+    return salted_hmac(_SIGNING_SALT, ':'.join(str(part) for part in parts), algorithm='sha256').hexdigest()
+
+
+def signed_query(parts, expires: int) -> str:
+    """Query string carrying ``expires`` and the signature of ``parts`` plus ``expires``"""
+    return urlencode({'expires': expires, 'signature': sign(*parts, expires)})
+
+
+def verify(parts, expires, signature: str, now: Optional[float] = None) -> bool:
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < (now or time.time()):
+        return False
+    return constant_time_compare(sign(*parts, expires), signature or '')
+
+
+def signed_url(sha256: str, filename: str, ttl: Optional[int] = None, now: Optional[float] = None) -> str:
+    """A path that serves blob ``sha256`` as ``filename`` to anyone until it expires"""
+    expires = int(now or time.time()) + (DOWNLOAD_URL_TTL if ttl is None else ttl)
+    path = reverse('document-signed-download', kwargs={'sha256': sha256, 'filename': filename})
+    return f"{path}?{signed_query((sha256, filename), expires)}"
+
+
+def verify_signature(sha256: str, filename: str, expires, signature: str, now: Optional[float] = None) -> bool:
+    return bool(_SHA256_RE.match(sha256 or '')) and verify((sha256, filename), expires, signature, now)
+
+
+def _byte_range(header: str, size: int):
+    """``(start, end)``, inclusive, for a single-range header; None to send the whole file"""
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range not satisfiable for {size} bytes")
+    return start, end
+
+
+def _read_range(handle, length: int):
+    with handle:
+        while length > 0:
+            block = handle.read(min(READ_BLOCK, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _stream(storage, name: str, filename: str, range_header: str, attachment: bool):
+    size = storage.size(name)
+    try:
+        byte_range = _byte_range(range_header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    handle = storage.open(name, 'rb')
+    if byte_range is None:
+        response = FileResponse(handle, as_attachment=attachment, filename=filename)
+    else:
+        start, end = byte_range
+        handle.seek(start)
+        response = StreamingHttpResponse(
+            _read_range(handle, end - start + 1), status=206,
+            content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Disposition'] = content_disposition_header(attachment, filename)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_file(storage, name: str, filename: str, range_header: str = '', attachment: bool = True):
+    """
+    Response delivering ``name`` from ``storage`` as ``filename``. With the
+    accel prefix set, ``name`` must be a path under MEDIA_ROOT.
+    """
+    if DOWNLOAD_ACCEL_PREFIX:
+        response = HttpResponse(
+            content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        )
+        # nginx serves the file and answers Range requests itself
+        response['X-Accel-Redirect'] = DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + quote(name)
+        response['Content-Disposition'] = content_disposition_header(attachment, filename)
+        return response
+    return _stream(storage, name, filename, range_header, attachment)
+
+
+def serve_blob(sha256: str, filename: str, range_header: str = ''):
+    """Response delivering blob ``sha256`` as an attachment called ``filename``"""
+    response = serve_file(document_storage(), blob_name(sha256), filename, range_header)
+    # The content can never change under this name
+    response['ETag'] = f'"{sha256}"'
+    return response
@@ -0,0 +1,93 @@
+"""
+Facet counts for the project list.
+
+A project has no status column; its status is rolled up from its documents
+(``review_status``), so it can be filtered and grouped like a field. One
+grouped aggregate over the visible projects, ``GROUP BY review_status,
+project_priority``, answers the list total and the count behind every
+status and priority chip. Each facet's counts apply every selected filter
+except its own, so a chip shows how many projects selecting it would
+leave. Another facet is another grouping column, not another query.
+
+Results are cached through ``stats.cached_stats`` per (user scope, filter
+set): status transitions expire them along with the dashboard numbers,
+and the short TTL covers everything else.
+"""
+import hashlib
+from typing import Dict, Optional
+
+from django.db.models import Case, CharField, Count, Exists, OuterRef, Value, When
+
+from .models import Document
+from .stats import cached_stats
+
+# A project takes the first of these statuses any of its documents is in:
+# outstanding review work first, APPROVED only once every document is.
+# A project without documents is a DRAFT.
+STATUS_PRECEDENCE = ('REVISION_REQUIRED', 'REJECTED', 'PENDING_REVIEW', 'SUBMITTED', 'DRAFT', 'APPROVED')
+
+# Facet name -> Project field or annotation (see annotate_review_status) it groups on
+FACET_FIELDS = {
+    'status': 'review_status',
+    'priority': 'project_priority',
+}
+
+
+def review_status():
+    """The project's status rolled up from its documents, per STATUS_PRECEDENCE"""
+    return Case(
+        *[
+            When(Exists(Document.objects.filter(project=OuterRef('pk'), status=status)), then=Value(status))
+            for status in STATUS_PRECEDENCE
+        ],
+        default=Value('DRAFT'),
+        output_field=CharField(),
+    )
+
+
+def annotate_review_status(queryset):
+    return queryset.annotate(review_status=review_status())
+
+
+def tally_facets(cells, selected: Dict[str, Optional[str]]) -> dict:
+    """Fold ``(status, priority, rows)`` cells of the grouped aggregate into facet counts"""
+    names = list(FACET_FIELDS)
+    counts = {name: {} for name in names}
+    total = 0
+    for *values, rows in cells:
+        cell = dict(zip(names, values))
+        for name in names:
+            # A facet's own selection does not narrow its counts
+            if all(not selected.get(other) or cell[other] == selected[other]
+                   for other in names if other != name):
+                counts[name][cell[name]] = counts[name].get(cell[name], 0) + rows
+        if all(not selected.get(name) or cell[name] == selected[name] for name in names):
+            total += rows
+    return {
+        'total': total,
+        'status_total': sum(counts['status'].values()),
+        **counts,
+    }
+
+
+def _count_facets(queryset, selected: Dict[str, Optional[str]]) -> dict:
+    cells = (
+        queryset.order_by()
+        .values_list(*FACET_FIELDS.values())
+        .annotate(rows=Count('pk', distinct=True))
+    )
+    return tally_facets(cells, selected)
+
+
+def project_facets(queryset, selected: Dict[str, Optional[str]], scope: str, filters=()) -> dict:
+    """
+    ``{'total', 'status_total', 'status': {value: n}, 'priority': {value: n}}``.
+
+    ``queryset`` holds the visible projects with every non-facet filter
+    (such as search) applied; ``selected`` maps facet names to the chosen
+    value. ``scope`` identifies who is looking and ``filters`` the
+    non-facet filters, together forming the cache key.
+    """
+    variant = repr((sorted((name, value or '') for name, value in selected.items()), tuple(filters)))
+    digest = hashlib.md5(variant.encode()).hexdigest()
+    return cached_stats(f'facets:{scope}:{digest}', lambda: _count_facets(queryset, selected))
@@ -1,6 +1,7 @@
 import bleach
 from django import forms
 from django.contrib.auth.models import User
+from apps.accounts.roles import has_role, MANAGER_ROLES
 from .models import Project, Document
 
 class ProjectForm(forms.ModelForm):
@@ -253,6 +254,6 @@ class HistoryFilterForm(forms.Form):
         
         if user:
             # Limit project choices based on user permissions
-            if not getattr(user, 'profile', None) or user.profile.role.name not in ['Admin', 'Approver']:
+            if not has_role(user, *MANAGER_ROLES):
                 self.fields['project'].queryset = Project.objects.filter(submitted_by=user)
                 self.fields['user'].queryset = User.objects.filter(id=user.id)
\ No newline at end of file
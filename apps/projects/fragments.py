@@ -0,0 +1,84 @@
+"""
+Fragment cache for the project detail partials.
+
+A rendered fragment is keyed by its name, the project and its
+``updated_at``, the viewer's roles and any flags the template varies on,
+plus two generation numbers: one per project (bumped by document writes)
+and one per project group (bumped by approval history and version writes,
+which show up on every version's page). Bumping a generation orphans the
+old entries, which then age out through the TTL.
+
+Hits and misses are counted per fragment name in process memory; see
+fragment_cache_stats().
+"""
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, 'PROJECT_FRAGMENT_CACHE_TIMEOUT', 600)
+
+_counters = Counter()
+_counters_lock = threading.Lock()
+
+
+def _generation_key(scope: str, pk) -> str:
+    return f'projects:fragments:{scope}:{pk}'
+
+
+def _bump(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def invalidate_project_fragments(project_id=None, project_group_id=None) -> None:
+    """Expire the cached fragments of a project and/or of every version in a group"""
+    if project_id is not None:
+        _bump(_generation_key('project', project_id))
+    if project_group_id is not None:
+        _bump(_generation_key('group', project_group_id))
+
+
+def fragment_key(name: str, project, roles=(), vary=()) -> str:
+    """Cache key for fragment ``name`` of ``project`` as seen with ``roles`` and ``vary`` flags"""
+    project_key = _generation_key('project', project.pk)
+    group_key = _generation_key('group', project.project_group_id)
+    generations = cache.get_many([project_key, group_key])
+    updated_at = getattr(project, 'updated_at', None)
+    variant = repr((sorted(roles), tuple(vary)))
+    digest = hashlib.md5(
+        f"{updated_at.isoformat() if updated_at else ''}|{variant}".encode()
+    ).hexdigest()
+    return (
+        f'projects:fragment:{name}:{project.pk}:'
+        f'{generations.get(project_key, 0)}.{generations.get(group_key, 0)}:{digest}'
+    )
+
+
+def get_fragment(name: str, key: str):
+    html = cache.get(key)
+    with _counters_lock:
+        _counters[(name, 'hit' if html is not None else 'miss')] += 1
+    return html
+
+
+def set_fragment(key: str, html: str) -> None:
+    cache.set(key, html, FRAGMENT_CACHE_TIMEOUT)
+
+
+def fragment_cache_stats() -> dict:
+    """``{name: {'hit': n, 'miss': n}}`` for this process"""
+    with _counters_lock:
+        stats = {}
+        for (name, outcome), count in _counters.items():
+            stats.setdefault(name, {'hit': 0, 'miss': 0})[outcome] = count
+        return stats
+
+
+def reset_fragment_cache_stats() -> None:
+    with _counters_lock:
+        _counters.clear()
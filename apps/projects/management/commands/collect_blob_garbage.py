@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from apps.projects.blobs import collect_garbage, recount
+
+
+class Command(BaseCommand):
+    help = 'Delete document blobs that no document has referenced for the grace period.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-seconds', type=int, default=None,
+                            help='Override BLOB_GC_GRACE_PERIOD')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be deleted without deleting it')
+        parser.add_argument('--recount', action='store_true',
+                            help='Rebuild reference counts from the documents table first')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            corrected = recount()
+            self.stdout.write(f"Corrected {corrected} reference counts.")
+        result = collect_garbage(grace_period=options['grace_seconds'], dry_run=options['dry_run'])
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['deleted']} blobs ({result['bytes']} bytes); "
+            f"{result['still_referenced']} still referenced."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.projects.blobs import import_legacy_file
+from apps.projects.models import Document
+
+
+class Command(BaseCommand):
+    help = 'Move document files stored under their upload names into the content-addressed blob store.'
+
+    def handle(self, *args, **options):
+        names = (
+            Document.objects.exclude(file_path='').exclude(file_path__isnull=True)
+            .exclude(file_path__startswith='blobs/')
+            .order_by().values_list('file_path', flat=True).distinct()
+        )
+        imported = missing = 0
+        for name in list(names):
+            if import_legacy_file(name):
+                imported += 1
+            else:
+                missing += 1
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} files; {missing} missing."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.projects.uploads import purge_expired_uploads
+
+
+class Command(BaseCommand):
+    help = 'Abort expired resumable upload sessions and delete their staging files.'
+
+    def handle(self, *args, **options):
+        count = purge_expired_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Purged {count} expired upload sessions."))
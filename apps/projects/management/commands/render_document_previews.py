@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from apps.projects.models import Document
+from apps.projects.previews import is_rendered, is_unsupported, render_many
+
+
+class Command(BaseCommand):
+    help = 'Render missing thumbnails and previews of document files on a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: DOCUMENT_PREVIEW_WORKERS or the CPU count)')
+        parser.add_argument('--force', action='store_true',
+                            help='Render again even where previews exist')
+
+    def handle(self, *args, **options):
+        hashes = (
+            Document.objects.exclude(file_sha256='').order_by()
+            .values_list('file_sha256', flat=True).distinct().iterator()
+        )
+        if not options['force']:
+            hashes = (sha256 for sha256 in hashes if not is_rendered(sha256) and not is_unsupported(sha256))
+        outcomes = render_many(hashes, workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())) or 'Nothing to render.'
+        ))
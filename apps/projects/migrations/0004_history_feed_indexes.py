@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0003_auto_20251123_2014"),
+    ]
+
+    operations = [
+        # Composite (sort key, id) indexes back the keyset-paginated history feed
+        migrations.AddIndex(
+            model_name="approvalhistory",
+            index=models.Index(fields=["performed_at", "id"], name="approval_hist_feed_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="projecthistory",
+            index=models.Index(fields=["date_submitted", "id"], name="project_hist_feed_idx"),
+        ),
+    ]
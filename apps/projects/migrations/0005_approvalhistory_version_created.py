@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0004_history_feed_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="approvalhistory",
+            name="action",
+            field=models.CharField(
+                choices=[
+                    ("SUBMITTED", "Submitted"),
+                    ("APPROVED", "Approved"),
+                    ("REJECTED", "Rejected"),
+                    ("REVISION_REQUESTED", "Revision Requested"),
+                    ("RESCINDED", "Rescinded"),
+                    ("OBSOLETED", "Made Obsolete"),
+                    ("VERSION_CREATED", "Version Created"),
+                ],
+                max_length=50,
+            ),
+        ),
+    ]
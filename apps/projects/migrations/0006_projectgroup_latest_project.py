@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_latest_project(apps, schema_editor):
+    """Point each group at its is_latest version, falling back to the highest version number"""
+    ProjectGroup = apps.get_model("projects", "ProjectGroup")
+    Project = apps.get_model("projects", "Project")
+
+    latest = {}
+    for project_id, group_id in (
+        Project.objects.order_by("project_group_id", "is_latest", "version_number")
+        .values_list("id", "project_group_id")
+    ):
+        # Ordered so the last row per group wins: is_latest first, then highest version
+        latest[group_id] = project_id
+
+    for group_id, project_id in latest.items():
+        ProjectGroup.objects.filter(pk=group_id).update(latest_project_id=project_id)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0005_approvalhistory_version_created"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="projectgroup",
+            name="latest_project",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Denormalised pointer to the version flagged is_latest",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="latest_of_group",
+                to="projects.project",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(fields=["project_group", "is_latest"], name="project_group_latest_idx"),
+        ),
+        migrations.RunPython(backfill_latest_project, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("projects", "0006_projectgroup_latest_project"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="file_sha256",
+            field=models.CharField(blank=True, editable=False, help_text="SHA-256 of file_path", max_length=64),
+        ),
+        migrations.CreateModel(
+            name="UploadSession",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("filename", models.CharField(max_length=255)),
+                ("size", models.BigIntegerField(help_text="Total file size in bytes")),
+                (
+                    "offset",
+                    models.BigIntegerField(default=0, help_text="Bytes received so far; the next chunk starts here"),
+                ),
+                (
+                    "sha256",
+                    models.CharField(blank=True, help_text="Expected SHA-256 of the whole file, if given", max_length=64),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("RECEIVING", "Receiving"), ("COMPLETE", "Complete"), ("ABORTED", "Aborted")],
+                        default="RECEIVING",
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("expires_at", models.DateTimeField()),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="upload_sessions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "document",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="upload_sessions",
+                        to="projects.document",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "upload_sessions",
+                "ordering": ["-created_at"],
+                "indexes": [models.Index(fields=["status", "expires_at"], name="upload_sess_status_bb43bc_idx")],
+            },
+        ),
+    ]
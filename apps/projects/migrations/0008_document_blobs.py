@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:05
+
+import apps.projects.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0007_document_uploads"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                ("sha256", models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ("size", models.BigIntegerField()),
+                (
+                    "ref_count",
+                    models.IntegerField(default=0, help_text="Documents whose file_sha256 is this blob"),
+                ),
+                ("unreferenced_since", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "document_blobs",
+                "indexes": [
+                    models.Index(fields=["ref_count", "unreferenced_since"], name="document_bl_ref_cou_9de4a9_idx")
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="file_name",
+            field=models.CharField(blank=True, help_text="Original name of the uploaded file", max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="document",
+            name="file_path",
+            field=models.FileField(
+                blank=True, null=True, storage=apps.projects.storage.document_storage, upload_to="documents/"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="document",
+            name="file_sha256",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, help_text="SHA-256 of file_path", max_length=64
+            ),
+        ),
+    ]
@@ -1,10 +1,15 @@
+import os
 import uuid
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
 from django.urls import reverse
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from apps.core.tracking import ChangeTrackingMixin
+from .fragments import invalidate_project_fragments
+from .stats import invalidate_dashboard_stats
+from .storage import document_storage, sha256_from_name
 from .validators import (
     validate_project_name, validate_project_description, validate_version_number,
     validate_drawing_number, validate_drawing_title, validate_url_format,
@@ -13,12 +18,16 @@ from .validators import (
 )
 
 
-class ProjectGroup(models.Model):
+class ProjectGroup(ChangeTrackingMixin, models.Model):
     """Logical family for all versions of the same project"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     code = models.CharField(max_length=50, blank=True, help_text="Human-readable project code")
     name = models.CharField(max_length=255, validators=[validate_project_name])
     client_name = models.CharField(max_length=255, blank=True)
+    latest_project = models.ForeignKey(
+        'Project', on_delete=models.SET_NULL, null=True, blank=True, related_name='latest_of_group',
+        help_text="Denormalised pointer to the version flagged is_latest"
+    )
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_project_groups')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -36,10 +45,10 @@ class ProjectGroup(models.Model):
     
     def get_latest_project(self):
         """Get the latest version of this project group"""
-        return self.projects.filter(is_latest=True).first()
+        return self.latest_project
 
 
-class Project(models.Model):
+class Project(ChangeTrackingMixin, models.Model):
     """One version of a project. No status field - status lives on Documents."""
     
     PRIORITY_CHOICES = [
@@ -76,6 +85,7 @@ class Project(models.Model):
             models.Index(fields=['project_group']),
             models.Index(fields=['created_by']),
             models.Index(fields=['is_latest']),
+            models.Index(fields=['project_group', 'is_latest'], name='project_group_latest_idx'),
         ]
 
     def __str__(self):
@@ -88,11 +98,25 @@ class Project(models.Model):
     def version_display(self):
         return f"V{self.version_number:03d}"
     
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        # The first version of a group is created latest and sets the pointer;
+        # later versions are created with is_latest=False and take it on release
+        if adding and self.is_latest:
+            self.set_as_latest()
+        invalidate_dashboard_stats()
+        invalidate_project_fragments(project_group_id=self.project_group_id)
+
     def set_as_latest(self):
         """Set this project as the latest version and unmark others"""
-        Project.objects.filter(project_group=self.project_group).update(is_latest=False)
+        with transaction.atomic():
+            Project.objects.filter(
+                project_group_id=self.project_group_id, is_latest=True
+            ).exclude(pk=self.pk).update(is_latest=False)
+            Project.objects.filter(pk=self.pk, is_latest=False).update(is_latest=True)
+            ProjectGroup.objects.filter(pk=self.project_group_id).update(latest_project=self)
         self.is_latest = True
-        self.save(update_fields=['is_latest'])
     
     def update_document_count(self):
         """Update the document count for this project"""
@@ -119,7 +143,7 @@ class Project(models.Model):
                 raise ValidationError('Only one project can be marked as latest per project group.')
 
 
-class Document(models.Model):
+class Document(ChangeTrackingMixin, models.Model):
     """Document/Drawing entity - This is where the workflow status lives"""
     
     STATUS_CHOICES = [
@@ -142,7 +166,12 @@ class Document(models.Model):
     description = models.TextField(blank=True)
     discipline = models.CharField(max_length=100, blank=True)
     revision = models.CharField(max_length=10, blank=True)
-    file_path = models.FileField(upload_to='documents/', blank=True, null=True)
+    # Content-addressed: the stored name is derived from the file's SHA-256
+    file_path = models.FileField(upload_to='documents/', storage=document_storage, blank=True, null=True)
+    file_name = models.CharField(max_length=255, blank=True, help_text="Original name of the uploaded file")
+    file_sha256 = models.CharField(
+        max_length=64, blank=True, editable=False, db_index=True, help_text="SHA-256 of file_path"
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='DRAFT')
     
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_documents')
@@ -161,6 +190,9 @@ class Document(models.Model):
             models.Index(fields=['discipline']),
         ]
 
+    # Fields whose change requires re-checking (project, document_number) uniqueness
+    UNIQUENESS_FIELDS = ('project_id', 'document_number')
+
     def clean(self):
         """Validate the document instance"""
         super().clean()
@@ -173,8 +205,9 @@ class Document(models.Model):
         if not self.title and not self.description:
             raise ValidationError('Document must have either a title or description.')
         
-        # Validate unique document number within the same project
-        if self.project_id:
+        # Validate unique document number within the same project; skipped
+        # when neither the project nor the number changed since loading.
+        if self.project_id and self._needs_uniqueness_check():
             existing = Document.objects.filter(
                 project=self.project,
                 document_number=self.document_number
@@ -183,13 +216,155 @@ class Document(models.Model):
             if existing.exists():
                 raise ValidationError(f'Document number {self.document_number} already exists in this project.')
 
+    def _needs_uniqueness_check(self):
+        if self._state.adding or getattr(self, '_loaded_values', None) is None:
+            return True
+        return bool(self.changed_fields & set(self.UNIQUENESS_FIELDS))
+
+    @classmethod
+    def validate_batch(cls, documents, check_database=True):
+        """
+        Validate many unsaved documents with at most one query.
+
+        Field validators and clean() rules run per document without touching
+        the database; (project, document_number) uniqueness is checked for the
+        whole set at once, against itself and, unless ``check_database`` is
+        False, against existing rows. Use before bulk_create; the unique
+        constraint on the table remains the final guard.
+        """
+        errors = []
+        seen = set()
+        for document in documents:
+            if document.document_number:
+                document.document_number = document.document_number.upper()
+            try:
+                document.clean_fields(exclude=['project', 'created_by', 'updated_by'])
+            except ValidationError as e:
+                errors.extend(f"{document.document_number}: {message}" for message in e.messages)
+            if not document.title and not document.description:
+                errors.append(f"{document.document_number}: Document must have either a title or description.")
+            key = (document.project_id, document.document_number)
+            if key in seen:
+                errors.append(f"Document number {document.document_number} appears more than once.")
+            seen.add(key)
+
+        if check_database and seen:
+            clashes = cls.objects.filter(
+                project_id__in={project_id for project_id, _ in seen},
+                document_number__in={number for _, number in seen}
+            ).exclude(
+                pk__in=[document.pk for document in documents if not document._state.adding]
+            ).values_list('project_id', 'document_number')
+            for project_id, number in clashes:
+                if (project_id, number) in seen:
+                    errors.append(f'Document number {number} already exists in this project.')
+
+        if errors:
+            raise ValidationError(errors)
+
     def __str__(self):
         return f"{self.document_number} - {self.title}"
 
-    def save(self, *args, **kwargs):
-        # Run clean validation
-        self.full_clean()
+    def _commit_file(self):
+        """
+        Store a newly assigned file now rather than in FileField.pre_save,
+        so its content hash is known before the row is written. Returns
+        True when the file fields changed.
+        """
+        if not self.file_path:
+            changed = bool(self.file_sha256)
+            self.file_sha256 = ''
+            return changed
+        if not self.file_path._committed:
+            self.file_name = os.path.basename(self.file_path.name)
+            self.file_path.save(self.file_path.name, self.file_path.file, save=False)
+        sha256 = sha256_from_name(self.file_path.name) or self.file_sha256
+        changed = sha256 != self.file_sha256
+        self.file_sha256 = sha256
+        return changed
+
+    def save(self, *args, validate=True, **kwargs):
+        """
+        Validate and save.
+
+        Only fields changed since the instance was loaded (or those listed in
+        ``update_fields``) are re-validated, and the uniqueness query only runs
+        when the project or document number changed. Pass ``validate=False``
+        for callers that already validated, e.g. via validate_batch().
+        """
+        update_fields = kwargs.get('update_fields')
+        if self._commit_file() and update_fields is not None:
+            kwargs['update_fields'] = update_fields = {*update_fields, 'file_name', 'file_sha256'}
+        dirty = self.changed_fields
+        if update_fields is not None:
+            dirty |= {self._meta.get_field(name).attname for name in update_fields}
+        if validate:
+            exclude = [
+                field.name for field in self._meta.concrete_fields
+                if field.attname not in dirty
+            ]
+            self.full_clean(exclude=exclude, validate_unique=False)
         super().save(*args, **kwargs)
+        if 'status' in dirty:
+            invalidate_dashboard_stats()
+        invalidate_project_fragments(project_id=self.project_id)
+
+    def delete(self, *args, **kwargs):
+        project_id = self.project_id
+        result = super().delete(*args, **kwargs)
+        invalidate_project_fragments(project_id=project_id)
+        return result
+
+
+class Blob(models.Model):
+    """One stored file in the content-addressed document store; see storage.py and blobs.py"""
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0, help_text="Documents whose file_sha256 is this blob")
+    unreferenced_since = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'document_blobs'
+        indexes = [
+            models.Index(fields=['ref_count', 'unreferenced_since']),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256} ({self.ref_count} refs)"
+
+
+class UploadSession(models.Model):
+    """A resumable, chunked upload of one document's file; see uploads.py"""
+
+    STATUS_CHOICES = [
+        ('RECEIVING', 'Receiving'),
+        ('COMPLETE', 'Complete'),
+        ('ABORTED', 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='upload_sessions')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(help_text="Total file size in bytes")
+    offset = models.BigIntegerField(default=0, help_text="Bytes received so far; the next chunk starts here")
+    sha256 = models.CharField(max_length=64, blank=True, help_text="Expected SHA-256 of the whole file, if given")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RECEIVING')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'upload_sessions'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
 
 
 class ApprovalHistory(models.Model):
@@ -202,6 +377,7 @@ class ApprovalHistory(models.Model):
         ('REVISION_REQUESTED', 'Revision Requested'),
         ('RESCINDED', 'Rescinded'),
         ('OBSOLETED', 'Made Obsolete'),
+        ('VERSION_CREATED', 'Version Created'),
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -225,11 +401,17 @@ class ApprovalHistory(models.Model):
             models.Index(fields=['performed_by']),
             models.Index(fields=['performed_at']),
             models.Index(fields=['action']),
+            models.Index(fields=['performed_at', 'id'], name='approval_hist_feed_idx'),
         ]
 
     def __str__(self):
         return f"{self.project.project_name} - {self.action} by {self.performed_by.username}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The activity log is shown on every version of the group
+        invalidate_project_fragments(project_group_id=self.project.project_group_id)
+
 
 class ProjectHistory(models.Model):
     """Audit of project/document metadata & submissions"""
@@ -259,6 +441,7 @@ class ProjectHistory(models.Model):
             models.Index(fields=['project']),
             models.Index(fields=['submitted_by']),
             models.Index(fields=['approval_status']),
+            models.Index(fields=['date_submitted', 'id'], name='project_hist_feed_idx'),
         ]
 
     def __str__(self):
@@ -1,20 +1,43 @@
 from django.contrib.auth.models import User
 from rest_framework.permissions import BasePermission
 from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
+from apps.accounts.roles import has_role, MANAGER_ROLES
+from apps.core import ratelimit
 from .models import Project, Document
 
 
-class ProjectUserRateThrottle(UserRateThrottle):
+class SharedLimiterThrottleMixin:
+    """
+    Count throttle hits with the shared sliding-window limiter instead of
+    DRF's per-key request history list (a cache read and a full rewrite of
+    the list on every request).
+    """
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.result = ratelimit.hit(self.key, self.num_requests, self.duration)
+        return self.result.allowed
+
+    def wait(self):
+        return self.result.retry_after
+
+
+class ProjectUserRateThrottle(SharedLimiterThrottleMixin, UserRateThrottle):
     """Rate throttling for authenticated users on project operations"""
     scope = 'project_user'
 
 
-class ProjectAnonRateThrottle(AnonRateThrottle):
+class ProjectAnonRateThrottle(SharedLimiterThrottleMixin, AnonRateThrottle):
     """Rate throttling for anonymous users"""
     scope = 'project_anon'
 
 
-class ProjectAdminRateThrottle(UserRateThrottle):
+class ProjectAdminRateThrottle(SharedLimiterThrottleMixin, UserRateThrottle):
     """Rate throttling for admin operations"""
     scope = 'project_admin'
 
@@ -28,13 +51,7 @@ class ProjectManagerPermission(BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
         
-        # Check if user has approver or admin role
-        user_role = getattr(request.user.profile, 'role', None) if hasattr(request.user, 'profile') else None
-        return (
-            request.user.is_staff or
-            request.user.is_superuser or
-            (user_role and user_role.name in ['Admin', 'Approver'])
-        )
+        return IsProjectManager.has_permission(request.user)
 
 
 class ProjectOwnerPermission(BasePermission):
@@ -46,24 +63,11 @@ class ProjectOwnerPermission(BasePermission):
             return False
             
         # Check if user is the project owner or has admin permissions
-        user_role = getattr(request.user.profile, 'role', None) if hasattr(request.user, 'profile') else None
-        is_admin_or_approver = user_role and user_role.name in ['Admin', 'Approver']
-        
         if hasattr(obj, 'created_by'):
-            return (
-                obj.created_by == request.user or
-                request.user.is_staff or
-                request.user.is_superuser or
-                is_admin_or_approver
-            )
+            return obj.created_by == request.user or IsProjectManager.has_permission(request.user)
         elif hasattr(obj, 'project'):
             # For documents, check the parent project
-            return (
-                obj.project.created_by == request.user or
-                request.user.is_staff or
-                request.user.is_superuser or
-                is_admin_or_approver
-            )
+            return obj.project.created_by == request.user or IsProjectManager.has_permission(request.user)
         
         return False
 
@@ -83,18 +87,14 @@ class CanEditProject:
         if IsProjectAdministrator.has_permission(user):
             return True
             
-        # Define which statuses are editable for non-admins
-        # Conditional_Approval should not be directly editable - users must create new version
-        editable_statuses = ['Draft']
-        
-        is_owner = (project.created_by == user)
-        is_editable_status = (project.status in editable_statuses)
-        
-        # Check if this is the latest version
-        is_latest_version = project.is_latest_version()
-        
-        # Only the project owner can edit their own projects (latest version only)
-        return is_owner and is_editable_status and is_latest_version
+        # Only the project owner can edit their own projects (latest version only),
+        # and only while nothing has been submitted: every document is still a draft.
+        # Reviewed versions are not edited directly - users must create a new version
+        return (
+            project.created_by_id == user.id
+            and project.is_latest
+            and not project.documents.exclude(status='DRAFT').exists()
+        )
 
 
 class CanCreateNewVersion:
@@ -107,18 +107,16 @@ class CanCreateNewVersion:
         if not user or not project:
             return False
             
-        # Define which statuses allow creating new versions
-        versionable_statuses = ['Request_for_Revision', 'Approved_Endorsed', 'Rescinded_Revoked', 'Conditional_Approval']
-        
-        is_owner = (project.created_by == user)
-        is_versionable_status = (project.status in versionable_statuses)
-        
-        # Check if this is the latest version
-        is_latest_version = project.is_latest_version()
+        # Document statuses that allow creating a new version
+        versionable_statuses = ['APPROVED', 'REVISION_REQUIRED']
         
         # Only the project owner can create new versions of their own projects
         # Removed admin override to enforce "submitter can only edit own projects" rule
-        return is_latest_version and is_versionable_status and is_owner
+        return (
+            project.created_by_id == user.id
+            and project.is_latest
+            and project.documents.filter(status__in=versionable_statuses).exists()
+        )
 
 
 class IsProjectManager:
@@ -128,12 +126,7 @@ class IsProjectManager:
         if not user or not user.is_authenticated:
             return False
         
-        user_role = getattr(user.profile, 'role', None) if hasattr(user, 'profile') else None
-        return (
-            user.is_superuser or
-            user.is_staff or
-            (user_role and user_role.name in ['Admin', 'Approver'])
-        )
+        return user.is_superuser or user.is_staff or has_role(user, *MANAGER_ROLES)
 
 
 class IsProjectAdministrator:
@@ -143,12 +136,7 @@ class IsProjectAdministrator:
         if not user or not user.is_authenticated:
             return False
         
-        user_role = getattr(user.profile, 'role', None) if hasattr(user, 'profile') else None
-        return (
-            user.is_superuser or
-            user.is_staff or
-            (user_role and user_role.name == 'Admin')
-        )
+        return user.is_superuser or user.is_staff or has_role(user, 'Admin')
 
 
 class CanViewProject:
@@ -170,21 +158,18 @@ class CanViewProject:
         is_approver = IsProjectManager.has_permission(user)
         
         if is_approver:
-            # Approvers can see all projects except Draft status
-            return project.status != 'Draft'
+            # Approvers can see all projects except drafts (nothing submitted yet)
+            return project.documents.exclude(status='DRAFT').exists()
         
         # For regular users (submitters)
-        is_owner = project.created_by == user
+        is_owner = project.created_by_id == user.id
         
         if is_owner:
             # Submitters can view their own projects (any status)
             return True
         
         # Submitters can view ALL approved projects (not just their own)
-        if project.status == 'Approved_Endorsed':
-            return True
-            
-        return False
+        return project.documents.filter(status='APPROVED').exists()
 
 
 def setup_project_roles():
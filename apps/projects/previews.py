@@ -0,0 +1,212 @@
+"""
+Thumbnails and low-resolution previews of document files.
+
+Renders are keyed by the file's SHA-256, like the blobs themselves, so
+every document and version sharing a file shares its previews and a
+render never goes stale. They are JPEGs on local disk under
+MEDIA_ROOT/previews, sharded the same way, and are served like downloads:
+through X-Accel-Redirect, behind signed URLs whose expiry is aligned to
+PREVIEW_URL_TTL windows so the same URL (and the browser's cached copy)
+is reused for a whole window.
+
+A file is rendered once its document is committed: on a Celery worker
+(DOCUMENT_PREVIEW_MODE 'celery') or in the same process ('eager'). A
+preview that is still missing when first requested is rendered then,
+which is all 'lazy' mode relies on. ``render_document_previews`` backfills
+existing files on a pool of worker processes (rendering.py).
+
+Only formats Pillow reads (PNG, JPEG, TIFF, BMP, GIF, ...) are rendered;
+other files, PDFs and CAD drawings among them, get an empty marker so
+they are not retried, and the page shows a placeholder.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.urls import reverse
+
+from . import rendering
+from .downloads import serve_file, signed_query, verify
+from .models import Document
+from .storage import blob_name, document_storage
+
+logger = logging.getLogger('projects')
+
+PREVIEW_SIZES = getattr(settings, 'DOCUMENT_PREVIEW_SIZES', {'thumb': (160, 160), 'preview': (1200, 1200)})
+PREVIEW_QUALITY = getattr(settings, 'DOCUMENT_PREVIEW_QUALITY', 80)
+PREVIEW_WORKERS = getattr(settings, 'DOCUMENT_PREVIEW_WORKERS', None)
+# Must outlast PROJECT_FRAGMENT_CACHE_TIMEOUT: cached rows carry these URLs
+PREVIEW_URL_TTL = getattr(settings, 'DOCUMENT_PREVIEW_URL_TTL', 3600)
+PREVIEW_PREFIX = 'previews'
+
+
+def preview_name(sha256: str, size: str) -> str:
+    return f'{PREVIEW_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}-{size}.jpg'
+
+
+def _marker_name(sha256: str) -> str:
+    return f'{PREVIEW_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}.unsupported'
+
+
+def _local_path(name: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+
+def is_rendered(sha256: str) -> bool:
+    return all(os.path.exists(_local_path(preview_name(sha256, size))) for size in PREVIEW_SIZES)
+
+
+def is_unsupported(sha256: str) -> bool:
+    return os.path.exists(_local_path(_marker_name(sha256)))
+
+
+@contextmanager
+def _source_path(sha256: str):
+    """A local path to the blob's bytes, copied to a temporary file if the storage has no paths"""
+    storage = document_storage()
+    name = blob_name(sha256)
+    if not storage.exists(name):
+        yield None
+        return
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        path = None
+    if path:
+        yield path
+        return
+    with tempfile.NamedTemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR) as copy:
+        with storage.open(name, 'rb') as source:
+            shutil.copyfileobj(source, copy)
+        copy.flush()
+        yield copy.name
+
+
+def _job(sha256: str, source: str):
+    targets = [(_local_path(preview_name(sha256, size)), tuple(box)) for size, box in PREVIEW_SIZES.items()]
+    return sha256, source, targets, PREVIEW_QUALITY, _local_path(_marker_name(sha256))
+
+
+def _record(sha256: str, outcome: str, error: str) -> None:
+    if outcome == rendering.FAILED:
+        logger.error(f"Preview rendering failed for blob {sha256}: {error}")
+
+
+def render(sha256: str) -> str:
+    """Render every preview size of one blob in this process; returns the outcome"""
+    with _source_path(sha256) as source:
+        if source is None:
+            return 'missing'
+        sha256, outcome, error = rendering.render_job(_job(sha256, source))
+    _record(sha256, outcome, error)
+    return outcome
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def render_many(hashes: Iterable[str], workers: Optional[int] = None) -> Counter:
+    """
+    Render blobs across a pool of worker processes; returns outcome counts.
+
+    Workers are spawned rather than forked so they inherit no database
+    connections or threads; they only run Pillow. Sources are prepared in
+    batches of a few per worker, which bounds the temporary copies a
+    storage without local paths needs.
+    """
+    workers = workers or PREVIEW_WORKERS or os.cpu_count() or 1
+    outcomes = Counter()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for batch in _batched(hashes, workers * 4):
+            with ExitStack() as stack:
+                jobs = []
+                for sha256 in batch:
+                    source = stack.enter_context(_source_path(sha256))
+                    if source is None:
+                        outcomes['missing'] += 1
+                    else:
+                        jobs.append(_job(sha256, source))
+                for sha256, outcome, error in pool.map(rendering.render_job, jobs):
+                    _record(sha256, outcome, error)
+                    outcomes[outcome] += 1
+    return outcomes
+
+
+def ensure_preview(sha256: str, size: str) -> Optional[str]:
+    """The stored name of a preview, rendering it first if needed; None if the file cannot be previewed"""
+    name = preview_name(sha256, size)
+    if os.path.exists(_local_path(name)):
+        return name
+    if is_unsupported(sha256) or render(sha256) != rendering.RENDERED:
+        return None
+    return name
+
+
+def preview_url(sha256: str, size: str, now: Optional[float] = None) -> str:
+    """
+    Signed URL of a preview. The expiry is the end of the window after
+    the current one, so it stays the same for a whole window and is
+    always at least PREVIEW_URL_TTL away.
+    """
+    now = now or time.time()
+    expires = (int(now) // PREVIEW_URL_TTL + 2) * PREVIEW_URL_TTL
+    path = reverse('document-preview', kwargs={'sha256': sha256, 'size': size})
+    return f"{path}?{signed_query(('preview', sha256, size), expires)}"
+
+
+def verify_preview(sha256: str, size: str, expires, signature: str, now: Optional[float] = None) -> bool:
+    return size in PREVIEW_SIZES and verify(('preview', sha256, size), expires, signature, now)
+
+
+def serve_preview(sha256: str, size: str, expires: int):
+    """Response delivering a preview, rendering it on first request; None if there is none"""
+    name = ensure_preview(sha256, size)
+    if name is None:
+        return None
+    response = serve_file(FileSystemStorage(), name, f'{sha256[:12]}-{size}.jpg', attachment=False)
+    response['Cache-Control'] = f'private, max-age={max(int(expires - time.time()), 0)}'
+    response['ETag'] = f'"{sha256}-{size}"'
+    return response
+
+
+def dispatch(sha256: str) -> None:
+    """Render a newly stored file according to DOCUMENT_PREVIEW_MODE"""
+    mode = getattr(settings, 'DOCUMENT_PREVIEW_MODE', 'celery')
+    if mode == 'eager':
+        render(sha256)
+    elif mode == 'celery':
+        try:
+            from .tasks import render_document_previews
+            render_document_previews.delay(sha256)
+        except Exception as e:
+            # Rendered on first request instead
+            logger.warning(f"Could not hand preview of blob {sha256} to the worker queue: {e}")
+
+
+def _document_saved(sender, instance, raw=False, **kwargs):
+    sha256 = instance.file_sha256
+    if raw or not sha256 or instance.old_value('file_sha256') == sha256:
+        return
+    if is_rendered(sha256) or is_unsupported(sha256):
+        return
+    transaction.on_commit(lambda: dispatch(sha256))
+
+
+def register():
+    post_save.connect(_document_saved, sender=Document, dispatch_uid='document-previews')
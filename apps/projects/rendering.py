@@ -0,0 +1,66 @@
+"""
+Pillow side of preview rendering (see previews.py).
+
+Nothing here imports Django: the backfill runs these functions in spawned
+worker processes, which then start with just Pillow loaded and never
+touch the database.
+"""
+import os
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+RENDERED = 'rendered'
+UNSUPPORTED = 'unsupported'
+FAILED = 'failed'
+
+
+def _flatten(image):
+    """RGB (or L for monochrome scans) on a white background, as JPEG needs"""
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('L' if image.mode in ('1', 'L') else 'RGB')
+
+
+def _write(image, path: str, quality: int) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f'{path}.{os.getpid()}.part'
+    image.save(partial, 'JPEG', quality=quality, optimize=True, progressive=True)
+    # Readers see the whole file or nothing
+    os.replace(partial, path)
+
+
+def render(source: str, targets, quality: int, marker: str) -> str:
+    """
+    Fit the first page of ``source`` into each ``(path, (width, height))``
+    of ``targets`` and write it there as JPEG. Files Pillow cannot read get
+    an empty ``marker`` file instead, so they are not tried again.
+    """
+    targets = sorted(targets, key=lambda target: target[1][0] * target[1][1], reverse=True)
+    try:
+        with Image.open(source) as image:
+            # JPEG decodes straight to a reduced scale, much cheaper than a full decode
+            image.draft(None, targets[0][1])
+            image = _flatten(ImageOps.exif_transpose(image))
+    except (UnidentifiedImageError, Image.DecompressionBombError, SyntaxError, OSError):
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        open(marker, 'wb').close()
+        return UNSUPPORTED
+
+    # Largest first, each one shrunk from the previous
+    for path, size in targets:
+        image.thumbnail(size, Image.LANCZOS, reducing_gap=3.0)
+        _write(image, path, quality)
+    return RENDERED
+
+
+def render_job(job):
+    """Pool entry point: ``(sha256, source, targets, quality, marker)`` -> ``(sha256, outcome, error)``"""
+    sha256, source, targets, quality, marker = job
+    try:
+        return sha256, render(source, targets, quality, marker), ''
+    except Exception as e:
+        # Logged by the parent; worker processes have no logging configured
+        return sha256, FAILED, repr(e)
@@ -0,0 +1,42 @@
+"""Search sources for projects and documents; registered from ProjectsConfig.ready()"""
+from apps.core import search
+
+from .models import Document, Project, ProjectGroup
+
+
+def _join(*parts) -> str:
+    return ' '.join(part for part in parts if part)
+
+
+def build_project(project) -> dict:
+    group = project.project_group
+    return {
+        'title': project.project_name,
+        'keywords': _join(project.reference_no, group.code),
+        'body': _join(project.project_description, project.client_name, project.notes, group.name),
+    }
+
+
+def build_document(document) -> dict:
+    return {
+        'title': document.title,
+        'keywords': _join(document.document_number, document.revision),
+        'body': _join(document.description, document.discipline),
+    }
+
+
+def register():
+    search.register(
+        'project', Project, build_project,
+        fields={'project_name', 'reference_no', 'project_description', 'client_name', 'notes', 'project_group'},
+        queryset=lambda: Project.objects.select_related('project_group'),
+    )
+    search.register_dependent(
+        ProjectGroup, 'project',
+        lambda group: search.get_source('project').get_queryset().filter(project_group=group),
+        fields={'code', 'name'},
+    )
+    search.register(
+        'document', Document, build_document,
+        fields={'title', 'document_number', 'revision', 'description', 'discipline'},
+    )
@@ -1,6 +1,28 @@
+from django.urls import reverse
 from rest_framework import serializers
 from .models import Project, Document, ProjectGroup, ApprovalHistory, ProjectHistory
 
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer taking ``fields`` and ``expand`` keyword arguments.
+
+    ``fields`` keeps only the named fields. ``expand`` adds fields from
+    ``expandable_fields`` (name -> factory returning a field instance) that
+    are left out by default; naming one in ``fields`` expands it too.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = set(expand) | (set(fields or ()) & set(self.expandable_fields))
+        for name in wanted & set(self.expandable_fields):
+            if name not in self.fields:
+                self.fields[name] = self.expandable_fields[name]()
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 class ProjectGroupSerializer(serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     latest_project = serializers.SerializerMethodField()
@@ -15,7 +37,8 @@ class ProjectGroupSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'created_by', 'created_by_name', 'latest_project']
     
     def get_latest_project(self, obj):
-        latest = obj.get_latest_project()
+        # Reads the denormalised FK; use select_related('latest_project') on the queryset
+        latest = obj.latest_project
         if latest:
             return {
                 'id': latest.id,
@@ -29,12 +52,14 @@ class DocumentSerializer(serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     updated_by_name = serializers.CharField(source='updated_by.get_full_name', read_only=True)
     project_name = serializers.CharField(source='project.project_name', read_only=True)
+    # Files are not under a public URL; they are fetched through the permission-checked download action
+    download_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Document
         fields = [
             'id', 'project', 'project_name', 'document_number', 'title', 'description', 
-            'discipline', 'revision', 'file_path', 'status',
+            'discipline', 'revision', 'file_path', 'download_url', 'status',
             'created_at', 'updated_at', 'created_by', 'created_by_name',
             'updated_by', 'updated_by_name'
         ]
@@ -42,6 +67,14 @@ class DocumentSerializer(serializers.ModelSerializer):
             'id', 'created_at', 'updated_at', 'created_by', 'created_by_name', 
             'updated_by', 'updated_by_name', 'project_name'
         ]
+        extra_kwargs = {'file_path': {'write_only': True}}
+    
+    def get_download_url(self, obj):
+        if not obj.file_sha256:
+            return None
+        url = reverse('document-download', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
 class ApprovalHistorySerializer(serializers.ModelSerializer):
     performed_by_name = serializers.CharField(source='performed_by.get_full_name', read_only=True)
@@ -77,7 +110,7 @@ class ProjectHistorySerializer(serializers.ModelSerializer):
             'project_name', 'receipt_id'
         ]
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(DynamicFieldsModelSerializer):
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     version_display = serializers.CharField(read_only=True)
     documents = DocumentSerializer(many=True, read_only=True)
@@ -104,4 +137,32 @@ class ProjectSerializer(serializers.ModelSerializer):
         ]
     
     def get_document_count(self, obj):
-        return obj.documents.count()
\ No newline at end of file
+        # Prefer the queryset annotation; fall back to a COUNT for bare instances
+        if hasattr(obj, 'num_documents'):
+            return obj.num_documents
+        return obj.documents.count()
+
+
+class ProjectListSerializer(ProjectSerializer):
+    """
+    Compact project representation for list responses.
+
+    Nested collections are only included when requested through
+    ``?expand=`` (or ``?fields=``); the view adds matching prefetches.
+    """
+    expandable_fields = {
+        'documents': lambda: DocumentSerializer(many=True, read_only=True),
+        'approval_history': lambda: ApprovalHistorySerializer(many=True, read_only=True),
+        'history_logs': lambda: ProjectHistorySerializer(many=True, read_only=True),
+    }
+    documents = None
+    approval_history = None
+    history_logs = None
+    
+    class Meta(ProjectSerializer.Meta):
+        fields = [
+            'id', 'project_group', 'project_group_name', 'project_group_code',
+            'project_name', 'client_name', 'version_number', 'version_display', 'is_latest',
+            'created_by', 'created_by_name', 'created_at', 'updated_at',
+            'project_priority', 'deadline_date', 'document_count'
+        ]
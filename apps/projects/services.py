@@ -1,14 +1,27 @@
 """
 Business logic services for project management
 """
+import base64
+import heapq
+import itertools
+import json
 import logging
 import uuid
+from collections import Counter
+from datetime import datetime
 from typing import Optional, Dict, Any
 from django.db import transaction, models
+from django.db.models import Count, Max, Q, Window
+from django.db.models.functions import Lower, RowNumber
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 
-from .models import Project, Document, ApprovalHistory, ProjectHistory
+from .models import Project, ProjectGroup, Document, ApprovalHistory, ProjectHistory
+from .blobs import add_references
+from .fragments import invalidate_project_fragments
+from .stats import cached_stats, invalidate_dashboard_stats
+from .workflow import ProjectWorkflow, REVIEWABLE
 from apps.notifications.services import BrevoEmailService
 
 logger = logging.getLogger('projects')
@@ -17,14 +30,24 @@ logger = logging.getLogger('projects')
 class ProjectVersionService:
     """Service for handling project version management"""
     
+    # Rows per INSERT when cloning documents into a new version
+    CLONE_BATCH_SIZE = 500
+    
     @staticmethod
     def get_next_version_number(project_group_id: str) -> int:
-        """Get the next version number for a project group"""
-        latest_project = Project.objects.filter(
+        """
+        Get the next version number for a project group.
+        
+        Locks the group row first, so concurrent "new version" requests queue
+        here instead of colliding on (project_group, version_number). Call it
+        inside a transaction.
+        """
+        list(ProjectGroup.objects.select_for_update().filter(pk=project_group_id).values_list('pk', flat=True))
+        current = Project.objects.filter(
             project_group_id=project_group_id
-        ).order_by('-version').first()
+        ).aggregate(max_version=Max('version_number'))['max_version']
         
-        return (latest_project.version + 1) if latest_project else 1
+        return (current or 0) + 1
     
     @staticmethod
     def create_new_version(original_project: Project, user: User, 
@@ -36,53 +59,80 @@ class ProjectVersionService:
                 original_project.project_group_id
             )
             
-            # Create new project version
+            # Create new project version. The current latest version stays
+            # latest until the new one is released.
             new_project = Project.objects.create(
                 project_group_id=original_project.project_group_id,
+                version_number=next_version,
+                is_latest=False,
                 project_name=original_project.project_name,
+                client_name=original_project.client_name,
                 project_description=original_project.project_description,
-                version=next_version,
-                submitted_by=user,
-                status='Draft',
-                revision_notes=revision_notes,
+                reference_no=original_project.reference_no,
+                notes=revision_notes or original_project.notes,
                 project_priority=original_project.project_priority,
-                deadline_date=original_project.deadline_date
+                deadline_date=original_project.deadline_date,
+                project_folder_link=original_project.project_folder_link,
+                created_by=user
             )
             
-            # Copy every drawing so drafts are preserved in the new version.
-            original_drawings = Drawing.objects.filter(project=original_project)
-            for drawing in original_drawings:
-                Drawing.objects.create(
-                    project=new_project,
-                    drawing_no=drawing.drawing_no,
-                    drawing_title=drawing.drawing_title,
-                    drawing_description=drawing.drawing_description,
-                    scale_ratio=drawing.scale_ratio,
-                    sheet_size=drawing.sheet_size,
-                    revision_number=drawing.revision_number + 1,
-                    added_by=user,
-                    status='Draft',
-                    sort_order=drawing.sort_order
-                )
+            # Copy every document as a draft in one multi-row INSERT.
+            ProjectVersionService._clone_documents(original_project, new_project, user)
             
             # Create approval history entry
             ApprovalHistory.objects.create(
                 project=new_project,
-                version=new_project.version,
-                action='Version_Created',
+                action='VERSION_CREATED',
                 performed_by=user,
-                comments=f"New version created from V{original_project.version:03d}. {revision_notes}",
-                new_status='Draft'
+                comment=f"New version created from {original_project.version_display}. {revision_notes}".strip(),
+                to_status='DRAFT'
             )
 
-            # Leave history + status changes to the actual approval workflow so
-            # the previously approved version stays visible until superseded.
             logger.info(
                 f"New project version created: {new_project.project_name} "
-                f"V{new_project.version:03d} by {user.username}"
+                f"{new_project.version_display} by {user.username}"
             )
             
             return new_project
+    
+    @staticmethod
+    def _clone_documents(original_project: Project, new_project: Project, user: User) -> int:
+        """
+        Copy all documents of ``original_project`` into ``new_project``.
+        
+        Saving each clone would run full_clean() and a uniqueness query per
+        row. Instead the set is validated once with Document.validate_batch()
+        and written with bulk_create, which skips save(); the signal handlers
+        that count blob references are skipped with it, so the batch is
+        counted in one go.
+        """
+        source = list(original_project.documents.values(
+            'document_number', 'title', 'description', 'discipline', 'revision',
+            'file_path', 'file_name', 'file_sha256'
+        ))
+        clones = [
+            Document(
+                project=new_project,
+                document_number=row['document_number'],
+                title=row['title'],
+                description=row['description'],
+                discipline=row['discipline'],
+                revision=row['revision'],
+                file_path=row['file_path'],
+                file_name=row['file_name'],
+                file_sha256=row['file_sha256'],
+                status='DRAFT',
+                created_by=user
+            )
+            for row in source
+        ]
+        # The new project has no documents yet, so only the set itself can clash.
+        Document.validate_batch(clones, check_database=False)
+        Document.objects.bulk_create(clones, batch_size=ProjectVersionService.CLONE_BATCH_SIZE)
+        # The clones share the originals' blobs; no file is copied
+        add_references(Counter(row['file_sha256'] for row in source if row['file_sha256']))
+        invalidate_dashboard_stats()
+        return len(clones)
 
 
 class ProjectSubmissionService:
@@ -90,10 +140,7 @@ class ProjectSubmissionService:
     
     def __init__(self):
         self.email_service = BrevoEmailService()
-        self._retirable_statuses = [
-            'Approved_Endorsed',
-            'Conditional_Approval'
-        ]
+        self.workflow = ProjectWorkflow(self.email_service)
     
     def submit_for_approval(self, project: Project, user: User, 
                           request_meta: Optional[Dict] = None) -> bool:
@@ -149,46 +196,8 @@ class ProjectSubmissionService:
                        comments: str = "", request_meta: Optional[Dict] = None) -> bool:
         """Approve a project"""
         try:
-            with transaction.atomic():
-                project.status = 'Approved_Endorsed'
-                project.date_reviewed = timezone.now()
-                project.reviewed_by = admin
-                project.review_comments = comments
-                project.save()
-                
-                # Create approval history entry
-                ApprovalHistory.objects.create(
-                    project=project,
-                    version=project.version,
-                    action='Approved_Endorsed',
-                    performed_by=admin,
-                    comments=comments,
-                    previous_status='Pending_Approval',
-                    new_status='Approved_Endorsed',
-                    ip_address=request_meta.get('ip_address') if request_meta else None,
-                    user_agent=request_meta.get('user_agent') if request_meta else None
-                )
-
-                # Update ProjectHistory entry
-                ProjectHistory.objects.filter(project=project, version=project.version).update(
-                    approval_status='Approved_Endorsed'
-                )
-                
-                # Retire the previously approved version in the same group, if any.
-                self._retire_previous_version(project, admin, request_meta)
-                
-                # Send notification email
-                self.email_service.notify_project_approved(
-                    project, project.submitted_by, admin
-                )
-                
-                logger.info(
-                    f"Project approved: {project.project_name} "
-                    f"V{project.version:03d} by {admin.username}"
-                )
-                
-                return True
-                
+            # The approve transition retires the previous version and moves the latest pointer
+            return self._review(project, 'approve', admin, comments, request_meta)
         except Exception as e:
             logger.error(f"Failed to approve project {project.id}: {e}")
             return False
@@ -197,128 +206,28 @@ class ProjectSubmissionService:
                       comments: str = "", request_meta: Optional[Dict] = None) -> bool:
         """Reject a project"""
         try:
-            with transaction.atomic():
-                project.status = 'Rejected'
-                project.date_reviewed = timezone.now()
-                project.reviewed_by = admin
-                project.review_comments = comments
-                project.save()
-                
-                # Create approval history entry
-                ApprovalHistory.objects.create(
-                    project=project,
-                    version=project.version,
-                    action='Rejected',
-                    performed_by=admin,
-                    comments=comments,
-                    previous_status='Pending_Approval',
-                    new_status='Rejected',
-                    ip_address=request_meta.get('ip_address') if request_meta else None,
-                    user_agent=request_meta.get('user_agent') if request_meta else None
-                )
-
-                # Update ProjectHistory entry
-                ProjectHistory.objects.filter(project=project, version=project.version).update(
-                    approval_status='Rejected'
-                )
-                
-                # Send notification email
-                self.email_service.notify_project_rejected(
-                    project, project.submitted_by, admin
-                )
-                
-                logger.info(
-                    f"Project rejected: {project.project_name} "
-                    f"V{project.version:03d} by {admin.username}"
-                )
-                
-                return True
-                
+            return self._review(project, 'reject', admin, comments, request_meta)
         except Exception as e:
             logger.error(f"Failed to reject project {project.id}: {e}")
             return False
 
-    def _retire_previous_version(self, project: Project, admin: User, request_meta: Optional[Dict]) -> None:
-        """Mark the prior approved version in the group as obsolete when a new one is approved."""
-        previous_project = (
-            Project.objects
-            .filter(project_group_id=project.project_group_id)
-            .exclude(pk=project.pk)
-            .filter(status__in=self._retirable_statuses)
-            .order_by('-version')
-            .first()
-        )
-
-        if not previous_project:
-            return
-
-        old_status = previous_project.status
-
-        previous_project.status = 'Obsolete'
-        previous_project.save()
-
-        ApprovalHistory.objects.create(
-            project=previous_project,
-            version=previous_project.version,
-            action='Obsoleted',
-            performed_by=admin,
-            comments=f"Superseded by version V{project.version:03d}.",
-            previous_status=old_status,
-            new_status='Obsolete',
-            ip_address=request_meta.get('ip_address') if request_meta else None,
-            user_agent=request_meta.get('user_agent') if request_meta else None
-        )
-
-        ProjectHistory.objects.filter(
-            project=previous_project,
-            version=previous_project.version
-        ).update(approval_status='Obsolete')
-    
     def request_revision(self, project: Project, admin: User, 
                         comments: str = "", request_meta: Optional[Dict] = None) -> bool:
         """Request revision for a project"""
         try:
-            with transaction.atomic():
-                project.status = 'Request_for_Revision'
-                project.date_reviewed = timezone.now()
-                project.reviewed_by = admin
-                project.review_comments = comments
-                project.save()
-                
-                # Create approval history entry
-                ApprovalHistory.objects.create(
-                    project=project,
-                    version=project.version,
-                    action='Status_Changed',
-                    performed_by=admin,
-                    comments=comments,
-                    previous_status='Pending_Approval',
-                    new_status='Request_for_Revision',
-                    ip_address=request_meta.get('ip_address') if request_meta else None,
-                    user_agent=request_meta.get('user_agent') if request_meta else None
-                )
-
-                # Update ProjectHistory entry
-                ProjectHistory.objects.filter(project=project, version=project.version).update(
-                    approval_status='Request_for_Revision'
-                )
-                
-                # Send notification email
-                self.email_service.notify_revision_required(
-                    project, project.submitted_by, admin
-                )
-                
-                logger.info(
-                    f"Revision requested for project: {project.project_name} "
-                    f"V{project.version:03d} by {admin.username}"
-                )
-                
-                return True
-                
+            return self._review(project, 'request_revision', admin, comments, request_meta)
         except Exception as e:
             logger.error(f"Failed to request revision for project {project.id}: {e}")
             return False
-    
+
+    def _review(self, project: Project, transition: str, admin: User,
+                comments: str, request_meta: Optional[Dict]) -> bool:
+        """Apply a review transition to one project; False if its status does not allow it"""
+        result = self.workflow.apply(transition, project, admin, comments, request_meta=request_meta)
+        for _, reason in result.skipped:
+            logger.warning(f"Project {project.id}: {reason}")
+        return bool(result.applied)
+
     def _send_submission_notifications(self, project: Project, user: User):
         """Send email notifications for project submission"""
         # Send confirmation to user
@@ -352,6 +261,8 @@ class ProjectSubmissionService:
         
         # Update all drawings for this project
         project.drawings.update(status=drawing_status)
+        invalidate_dashboard_stats()
+        invalidate_project_fragments(project_id=project.pk)
 
 
 class ProjectBulkOperationsService:
@@ -359,135 +270,67 @@ class ProjectBulkOperationsService:
     
     def __init__(self):
         self.email_service = BrevoEmailService()
+        self.workflow = ProjectWorkflow(self.email_service)
     
-    @transaction.atomic
     def bulk_approve_projects(self, project_ids: list, admin: User, 
                             comments: str = "", request_meta: Optional[Dict] = None) -> Dict[str, Any]:
         """Bulk approve multiple projects"""
-        results = {'success': [], 'errors': []}
-        
-        projects = Project.objects.filter(
-            id__in=project_ids,
-            status='Pending_Approval'
-        )
-        
-        for project in projects:
-            try:
-                project.status = 'Approved_Endorsed'
-                project.date_reviewed = timezone.now()
-                project.reviewed_by = admin
-                project.review_comments = comments
-                project.save()
-                
-                # Create approval history entry
-                ApprovalHistory.objects.create(
-                    project=project,
-                    version=project.version,
-                    action='Approved_Endorsed',
-                    performed_by=admin,
-                    comments=f"Bulk approval: {comments}" if comments else "Bulk approval",
-                    previous_status='Pending_Approval',
-                    new_status='Approved_Endorsed',
-                    ip_address=request_meta.get('ip_address') if request_meta else None,
-                    user_agent=request_meta.get('user_agent') if request_meta else None
-                )
-                
-                # Send notification email
-                self.email_service.notify_project_approved(project, project.submitted_by, admin)
-                
-                results['success'].append(project.project_name)
-                
-            except Exception as e:
-                results['errors'].append(f"{project.project_name}: {str(e)}")
-                logger.error(f"Failed to bulk approve project {project.id}: {e}")
-        
-        return results
+        return self._bulk_review(project_ids, admin, comments, request_meta, 'approve', 'Bulk approval')
     
-    @transaction.atomic
     def bulk_reject_projects(self, project_ids: list, admin: User, 
                            comments: str = "", request_meta: Optional[Dict] = None) -> Dict[str, Any]:
         """Bulk reject multiple projects"""
-        results = {'success': [], 'errors': []}
-        
-        projects = Project.objects.filter(
-            id__in=project_ids,
-            status='Pending_Approval'
-        )
-        
-        for project in projects:
-            try:
-                project.status = 'Rejected'
-                project.date_reviewed = timezone.now()
-                project.reviewed_by = admin
-                project.review_comments = comments
-                project.save()
-                
-                # Create approval history entry
-                ApprovalHistory.objects.create(
-                    project=project,
-                    version=project.version,
-                    action='Rejected',
-                    performed_by=admin,
-                    comments=f"Bulk rejection: {comments}" if comments else "Bulk rejection",
-                    previous_status='Pending_Approval',
-                    new_status='Rejected',
-                    ip_address=request_meta.get('ip_address') if request_meta else None,
-                    user_agent=request_meta.get('user_agent') if request_meta else None
-                )
-                
-                # Send notification email
-                self.email_service.notify_project_rejected(project, project.submitted_by, admin)
-                
-                results['success'].append(project.project_name)
-                
-            except Exception as e:
-                results['errors'].append(f"{project.project_name}: {str(e)}")
-                logger.error(f"Failed to bulk reject project {project.id}: {e}")
-        
-        return results
+        return self._bulk_review(project_ids, admin, comments, request_meta, 'reject', 'Bulk rejection')
     
-    @transaction.atomic
     def bulk_request_revision(self, project_ids: list, admin: User, 
                             comments: str = "", request_meta: Optional[Dict] = None) -> Dict[str, Any]:
         """Bulk request revision for multiple projects"""
-        results = {'success': [], 'errors': []}
-        
-        projects = Project.objects.filter(
-            id__in=project_ids,
-            status='Pending_Approval'
+        return self._bulk_review(
+            project_ids, admin, comments, request_meta, 'request_revision', 'Bulk revision request'
         )
+    
+    def _bulk_review(self, project_ids: list, admin: User, comments: str,
+                     request_meta: Optional[Dict], transition: str, label: str) -> Dict[str, Any]:
+        """
+        Apply a review transition to every project in ``project_ids``.
+
+        One SELECT loads the selection, then the workflow moves its documents
+        with set-based writes. Projects with no document awaiting review are
+        reported as errors; if any is reviewed concurrently the whole batch is
+        rolled back.
+        """
+        results = {'success': [], 'errors': []}
+        comment_text = f"{label}: {comments}" if comments else label
+        valid_ids = [pid for pid in map(str, project_ids) if self._is_uuid(pid)]
         
-        for project in projects:
-            try:
-                project.status = 'Request_for_Revision'
-                project.date_reviewed = timezone.now()
-                project.reviewed_by = admin
-                project.review_comments = comments
-                project.save()
-                
-                # Create approval history entry
-                ApprovalHistory.objects.create(
-                    project=project,
-                    version=project.version,
-                    action='Status_Changed',
-                    performed_by=admin,
-                    comments=f"Bulk revision request: {comments}" if comments else "Bulk revision request",
-                    previous_status='Pending_Approval',
-                    new_status='Request_for_Revision',
-                    ip_address=request_meta.get('ip_address') if request_meta else None,
-                    user_agent=request_meta.get('user_agent') if request_meta else None
-                )
-                
-                # Send notification email
-                self.email_service.notify_revision_required(project, project.submitted_by, admin)
-                
-                results['success'].append(project.project_name)
-                
-            except Exception as e:
-                results['errors'].append(f"{project.project_name}: {str(e)}")
-                logger.error(f"Failed to bulk request revision for project {project.id}: {e}")
+        try:
+            projects = list(
+                Project.objects.select_related('created_by').filter(id__in=valid_ids)
+            )
+            outcome = self.workflow.apply(
+                transition, projects, admin, comments,
+                history_comment=comment_text, request_meta=request_meta
+            )
+        except Exception as e:
+            logger.error(f"Bulk review ({transition}) failed: {e}")
+            results['errors'].append(f"Bulk action failed: {str(e)}")
+            return results
         
+        results['success'] = [project.project_name for project in outcome.applied]
+        results['errors'] = [f"{project.project_name}: {reason}" for project, reason in outcome.skipped]
+        found = {str(project.id) for project in projects}
+        results['errors'].extend(
+            f"{project_id}: not found" for project_id in map(str, project_ids) if project_id not in found
+        )
         return results
+    
+    @staticmethod
+    def _is_uuid(value: str) -> bool:
+        try:
+            uuid.UUID(value)
+        except (TypeError, ValueError):
+            return False
+        return True
 
 
 class ProjectRestoreService:
@@ -541,40 +384,86 @@ class ProjectStatsService:
     
     @staticmethod
     def get_user_project_stats(user: User) -> Dict[str, Any]:
-        """Get project statistics for a specific user"""
-        user_projects = Project.objects.filter(submitted_by=user)
+        """Per-status project counts for a user's projects, by the status of their documents"""
+        def by_status(*statuses):
+            return Count('id', filter=Q(documents__status__in=statuses), distinct=True)
+
+        def build():
+            return Project.objects.filter(created_by=user).aggregate(
+                total_projects=Count('id', distinct=True),
+                draft_projects=by_status('DRAFT'),
+                pending_projects=by_status(*REVIEWABLE),
+                approved_projects=by_status('APPROVED'),
+                rejected_projects=by_status('REJECTED'),
+                revision_projects=by_status('REVISION_REQUIRED'),
+            )
         
-        return {
-            'total_projects': user_projects.count(),
-            'draft_projects': user_projects.filter(status='Draft').count(),
-            'pending_projects': user_projects.filter(status='Pending_Approval').count(),
-            'approved_projects': user_projects.filter(status='Approved_Endorsed').count(),
-            'rejected_projects': user_projects.filter(status='Rejected').count(),
-            'revision_projects': user_projects.filter(status='Request_for_Revision').count(),
-            'recent_projects': user_projects.order_by('-updated_at')[:5]
-        }
+        stats = dict(cached_stats(f'owner:{user.pk}', build))
+        stats['recent_projects'] = ProjectStatsService.get_recent_projects(user)
+        return stats
     
     @staticmethod
     def get_admin_dashboard_stats() -> Dict[str, Any]:
-        """Get administrative dashboard statistics"""
-        all_projects = Project.objects.all()
+        """Review queue size and today's decisions, for project managers"""
         today = timezone.now().date()
         
-        return {
-            'pending_approvals': all_projects.filter(status='Pending_Approval').count(),
-            'total_projects': all_projects.count(),
-            'approved_today': all_projects.filter(
-                status='Approved_Endorsed', 
-                date_reviewed__date=today
-            ).count(),
-            'rejected_today': all_projects.filter(
-                status='Rejected',
-                date_reviewed__date=today
-            ).count(),
-            'recent_submissions': all_projects.filter(
-                status='Pending_Approval'
-            ).order_by('-date_submitted')[:10]
-        }
+        def build():
+            stats = Project.objects.aggregate(
+                pending_approvals=Count('id', filter=Q(documents__status__in=REVIEWABLE), distinct=True),
+                total_projects=Count('id', distinct=True),
+            )
+            stats.update(ApprovalHistory.objects.filter(performed_at__date=today).aggregate(
+                approved_today=Count('project', filter=Q(action='APPROVED'), distinct=True),
+                rejected_today=Count('project', filter=Q(action='REJECTED'), distinct=True),
+            ))
+            return stats
+        
+        stats = dict(cached_stats(f'admin:{today.isoformat()}', build))
+        stats['recent_submissions'] = Project.objects.filter(
+            documents__status__in=REVIEWABLE
+        ).distinct().select_related('created_by').order_by('-updated_at')[:10]
+        return stats
+    
+    @staticmethod
+    def get_dashboard_stats(user: User) -> Dict[str, int]:
+        """Project and document counts for the landing dashboard, in one aggregate query"""
+        def build():
+            return Project.objects.filter(created_by=user).aggregate(
+                total_projects=Count('project_group', distinct=True),
+                total_documents=Count('documents'),
+                draft_documents=Count('documents', filter=Q(documents__status='DRAFT')),
+                pending_documents=Count('documents', filter=Q(documents__status='PENDING_REVIEW')),
+                approved_documents=Count('documents', filter=Q(documents__status='APPROVED')),
+            )
+        
+        return cached_stats(f'dashboard:{user.pk}', build)
+    
+    @staticmethod
+    def get_site_dashboard_stats() -> Dict[str, int]:
+        """Site-wide counts shown to admins and approvers on the dashboard"""
+        def build():
+            stats = Project.objects.aggregate(
+                total_projects=Count('id', distinct=True),
+                pending_approvals=Count('documents', filter=Q(documents__status='PENDING_REVIEW')),
+            )
+            stats['total_users'] = User.objects.count()
+            return stats
+        
+        return cached_stats('dashboard:site', build)
+    
+    @staticmethod
+    def get_recent_projects(user: User, limit: int = 5) -> list:
+        """The user's most recently updated projects, one row (the newest version) per group"""
+        return list(
+            Project.objects.filter(created_by=user)
+            .annotate(version_rank=Window(
+                expression=RowNumber(),
+                partition_by=[models.F('project_group_id')],
+                order_by=models.F('version_number').desc()
+            ))
+            .filter(version_rank=1)
+            .order_by('-updated_at')[:limit]
+        )
     
     @staticmethod
     def get_project_group_stats(project_group_id: str) -> Dict[str, Any]:
@@ -591,7 +480,11 @@ class ProjectStatsService:
     @staticmethod
     def get_project_history_log(project: Project) -> list[Dict[str, Any]]:
         """Get the detailed history log for a specific project."""
-        history_logs = ProjectHistory.objects.filter(project=project).order_by('-date_submitted')
+        history_logs = (
+            ProjectHistory.objects.filter(project=project)
+            .select_related('project', 'submitted_by')
+            .order_by('-date_submitted')
+        )
         
         log_data = []
         for log in history_logs:
@@ -607,3 +500,290 @@ class ProjectStatsService:
                 'approval_status': log.approval_status,
             })
         return log_data
+
+
+class ProjectDetailContextBuilder:
+    """
+    Assemble the project detail page with a fixed number of queries.
+
+    Versions, documents, the first page of the group's activity log and the
+    ProjectHistory log are one query each, whatever the project's size. The
+    rest of the activity log is loaded page by page through activity_page().
+    """
+
+    ACTIVITY_PAGE_SIZE = 6
+
+    def __init__(self, project: Project):
+        self.project = project
+
+    def version_queryset(self):
+        # Every version of a project shares its group
+        return Project.objects.filter(project_group_id=self.project.project_group_id)
+
+    def build(self) -> Dict[str, Any]:
+        """
+        Return the page context. Each entry is loaded on first use, so
+        fragments served from the fragment cache never run their query.
+        """
+        versions = SimpleLazyObject(lambda: list(
+            self.version_queryset().select_related('created_by').order_by('-version_number')
+        ))
+        activity = SimpleLazyObject(
+            lambda: self.activity_page(version_ids=[version.pk for version in versions])
+        )
+        return {
+            'drawings': SimpleLazyObject(lambda: list(self.project.documents.select_related('created_by'))),
+            'project_versions': versions,
+            'full_activity_log': SimpleLazyObject(lambda: activity['items']),
+            'activity_next_page': SimpleLazyObject(lambda: activity['next_page']),
+            'project_history_logs': SimpleLazyObject(
+                lambda: ProjectStatsService.get_project_history_log(self.project)
+            ),
+        }
+
+    def activity_page(self, page: int = 1, version_ids: Optional[list] = None) -> Dict[str, Any]:
+        """
+        One page of approval history across all versions, newest first.
+
+        One row beyond the page is fetched to tell whether another page
+        exists, instead of counting the whole log.
+        """
+        if version_ids is None:
+            version_ids = self.version_queryset().values('pk')
+        page = max(page, 1)
+        start = (page - 1) * self.ACTIVITY_PAGE_SIZE
+        rows = list(
+            ApprovalHistory.objects.filter(project_id__in=version_ids)
+            .select_related('performed_by', 'project')
+            .order_by('-performed_at', '-pk')[start:start + self.ACTIVITY_PAGE_SIZE + 1]
+        )
+        has_next = len(rows) > self.ACTIVITY_PAGE_SIZE
+        return {
+            'items': rows[:self.ACTIVITY_PAGE_SIZE],
+            'next_page': page + 1 if has_next else None,
+        }
+
+
+class HistoryFeedPage:
+    """One keyset-paginated page of the merged history feed"""
+
+    def __init__(self, object_list: list, next_cursor: Optional[str] = None,
+                 previous_cursor: Optional[str] = None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+
+class ProjectHistoryFeedService:
+    """
+    Merged ProjectHistory + ApprovalHistory feed with keyset pagination.
+
+    Each source is read as an index-ordered cursor limited to one page, and the
+    two cursors are merged lazily with heapq.merge. Pages are addressed by an
+    opaque cursor holding the sort key of the boundary row, so page N costs the
+    same as page 1 regardless of how large the audit tables grow.
+    """
+
+    SUBMISSION = 'submission'
+    CHANGE = 'change'
+
+    # Rank of each source inside a tie on the sort key. Under a descending sort
+    # changes come first, which keeps the 'type' ordering of the old view: it
+    # sorted on the type label, so 'change' came before 'submission'.
+    SOURCE_RANK = {SUBMISSION: 0, CHANGE: 1}
+
+    # sort_by -> (per-source key expressions, descending, rank sorts first)
+    SORTS = {
+        '-date': ({SUBMISSION: 'date_submitted', CHANGE: 'performed_at'}, True, False),
+        'date': ({SUBMISSION: 'date_submitted', CHANGE: 'performed_at'}, False, False),
+        'project': ({SUBMISSION: 'project__project_name', CHANGE: 'project__project_name'}, False, False),
+        '-project': ({SUBMISSION: 'project__project_name', CHANGE: 'project__project_name'}, True, False),
+        'user': ({SUBMISSION: 'submitted_by__username', CHANGE: 'performed_by__username'}, False, False),
+        '-user': ({SUBMISSION: 'submitted_by__username', CHANGE: 'performed_by__username'}, True, False),
+        'type': ({SUBMISSION: 'date_submitted', CHANGE: 'performed_at'}, True, True),
+    }
+    DATE_SORTS = {'-date', 'date', 'type'}
+    DEFAULT_SORT = '-date'
+
+    def __init__(self, user: User, filters: Optional[Dict[str, Any]] = None, per_page: int = 25):
+        from .permissions import IsProjectManager
+
+        filters = filters or {}
+        self.per_page = per_page
+        self.sort_by = filters.get('sort_by') or self.DEFAULT_SORT
+        if self.sort_by not in self.SORTS:
+            self.sort_by = self.DEFAULT_SORT
+
+        if IsProjectManager.has_permission(user):
+            project_history = ProjectHistory.objects.all()
+            approval_history = ApprovalHistory.objects.all()
+        else:
+            project_history = ProjectHistory.objects.filter(submitted_by=user)
+            approval_history = ApprovalHistory.objects.filter(performed_by=user)
+
+        if filters.get('project'):
+            project_history = project_history.filter(project=filters['project'])
+            approval_history = approval_history.filter(project=filters['project'])
+
+        if filters.get('user'):
+            project_history = project_history.filter(submitted_by=filters['user'])
+            approval_history = approval_history.filter(performed_by=filters['user'])
+
+        if filters.get('status'):
+            project_history = project_history.filter(approval_status=filters['status'])
+            approval_history = approval_history.filter(
+                models.Q(from_status=filters['status']) | models.Q(to_status=filters['status'])
+            )
+
+        if filters.get('date_from'):
+            project_history = project_history.filter(date_submitted__date__gte=filters['date_from'])
+            approval_history = approval_history.filter(performed_at__date__gte=filters['date_from'])
+
+        if filters.get('date_to'):
+            project_history = project_history.filter(date_submitted__date__lte=filters['date_to'])
+            approval_history = approval_history.filter(performed_at__date__lte=filters['date_to'])
+
+        self.sources = {
+            self.SUBMISSION: project_history.select_related('project', 'submitted_by'),
+            self.CHANGE: approval_history.select_related('project', 'performed_by'),
+        }
+        if filters.get('entry_type') == self.SUBMISSION:
+            del self.sources[self.CHANGE]
+        elif filters.get('entry_type') == self.CHANGE:
+            del self.sources[self.SUBMISSION]
+
+    def get_page(self, cursor: Optional[str] = None) -> HistoryFeedPage:
+        """Return the page that starts after (or ends before) ``cursor``"""
+        position = self._decode_cursor(cursor)
+        backwards = bool(position and position['dir'] == 'prev')
+        boundary = position['key'] if position else None
+
+        rows = list(self._merged(boundary, backwards))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return HistoryFeedPage([])
+
+        first_key = self._row_key(rows[0])
+        last_key = self._row_key(rows[-1])
+        if backwards:
+            next_cursor = self._encode_cursor(last_key, 'next')
+            previous_cursor = self._encode_cursor(first_key, 'prev') if has_more else None
+        else:
+            next_cursor = self._encode_cursor(last_key, 'next') if has_more else None
+            previous_cursor = self._encode_cursor(first_key, 'prev') if position else None
+
+        return HistoryFeedPage(rows, next_cursor, previous_cursor)
+
+    def _merged(self, boundary: Optional[tuple], backwards: bool):
+        """Lazily merge one page worth of rows from every source"""
+        descending = self.SORTS[self.sort_by][1] != backwards
+        cursors = [
+            self._source_rows(kind, queryset, boundary, descending)
+            for kind, queryset in self.sources.items()
+        ]
+        merged = heapq.merge(*cursors, key=self._row_key, reverse=descending)
+        return itertools.islice(merged, self.per_page + 1)
+
+    def _source_rows(self, kind: str, queryset, boundary: Optional[tuple], descending: bool):
+        key_field = self.SORTS[self.sort_by][0][kind]
+        key_expr = models.F(key_field) if self.sort_by in self.DATE_SORTS else Lower(key_field)
+        queryset = queryset.annotate(feed_key=key_expr)
+
+        if boundary is not None:
+            condition = self._after(kind, boundary, descending)
+            if condition is None:
+                return iter(())
+            queryset = queryset.filter(condition)
+
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}feed_key', f'{prefix}id')
+        for row in queryset[:self.per_page + 1]:
+            row.feed_kind = kind
+            yield row
+
+    def _after(self, kind: str, boundary: tuple, descending: bool) -> Optional[models.Q]:
+        """
+        Build the keyset predicate "row sorts strictly after ``boundary``".
+
+        The source rank is a constant for a given queryset, so it is resolved in
+        Python; ``None`` means no row of this source can follow the boundary and
+        an empty ``Q()`` means every row does.
+        """
+        rank_first = self.SORTS[self.sort_by][2]
+        rank = self.SOURCE_RANK[kind]
+        if rank_first:
+            b_rank, b_key, b_id = boundary
+        else:
+            b_key, b_rank, b_id = boundary
+        op = 'lt' if descending else 'gt'
+
+        def beyond(left, right):
+            return left < right if descending else left > right
+
+        id_tail = models.Q(**{f'id__{op}': b_id})
+        if rank_first:
+            if rank != b_rank:
+                return models.Q() if beyond(rank, b_rank) else None
+            return models.Q(**{f'feed_key__{op}': b_key}) | (models.Q(feed_key=b_key) & id_tail)
+
+        if rank == b_rank:
+            tail = id_tail
+        elif beyond(rank, b_rank):
+            return models.Q(**{f'feed_key__{op}e': b_key})
+        else:
+            return models.Q(**{f'feed_key__{op}': b_key})
+        return models.Q(**{f'feed_key__{op}': b_key}) | (models.Q(feed_key=b_key) & tail)
+
+    def _row_key(self, row) -> tuple:
+        rank = self.SOURCE_RANK[row.feed_kind]
+        if self.SORTS[self.sort_by][2]:
+            return (rank, row.feed_key, row.id)
+        return (row.feed_key, rank, row.id)
+
+    def _encode_cursor(self, key: tuple, direction: str) -> str:
+        values = [value.isoformat() if isinstance(value, datetime) else str(value) for value in key]
+        payload = json.dumps({'s': self.sort_by, 'd': direction, 'k': values})
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def _decode_cursor(self, cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Decode a cursor; anything malformed or from another sort restarts at page one"""
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if payload['s'] != self.sort_by or payload['d'] not in ('next', 'prev'):
+                return None
+            values = payload['k']
+            rank_index = 0 if self.SORTS[self.sort_by][2] else 1
+            key_index = 1 - rank_index
+            key = list(values)
+            key[rank_index] = int(values[rank_index])
+            if self.sort_by in self.DATE_SORTS:
+                key[key_index] = datetime.fromisoformat(values[key_index])
+            key[2] = uuid.UUID(values[2])
+            return {'dir': payload['d'], 'key': tuple(key)}
+        except (ValueError, KeyError, TypeError, IndexError):
+            return None
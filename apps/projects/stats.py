@@ -0,0 +1,40 @@
+"""
+Short-lived cache for dashboard statistics.
+
+Entries are keyed by scope (a user, or the site-wide admin view) and by a
+shared generation number. Any status transition bumps the generation, which
+orphans every cached entry at once without having to know whose numbers
+changed; the short TTL bounds staleness for anything else.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+STATS_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_STATS_CACHE_TIMEOUT', 60)
+
+_GENERATION_KEY = 'projects:stats:generation'
+
+
+def _generation() -> int:
+    generation = cache.get(_GENERATION_KEY)
+    if generation is None:
+        cache.add(_GENERATION_KEY, 1, None)
+        generation = cache.get(_GENERATION_KEY, 1)
+    return generation
+
+
+def invalidate_dashboard_stats() -> None:
+    """Expire all cached statistics; call after any status change"""
+    try:
+        cache.incr(_GENERATION_KEY)
+    except ValueError:
+        cache.add(_GENERATION_KEY, 1, None)
+
+
+def cached_stats(scope: str, build):
+    """Return the cached statistics for ``scope``, computing them with ``build()`` on a miss"""
+    key = f'projects:stats:{_generation()}:{scope}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = build()
+        cache.set(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
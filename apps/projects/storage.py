@@ -0,0 +1,139 @@
+"""
+Content-addressed storage for document files.
+
+A file is stored once, under the SHA-256 of its bytes, at
+``blobs/ab/cd/<sha256>``: two levels of 256 directories keep each
+directory small even with millions of blobs. Saving content that already
+exists writes nothing, and any number of Document rows (every version of
+a project, typically) can point at the same blob. Which blobs are still
+referenced is tracked by ``Blob.ref_count`` (see blobs.py); ``delete()``
+never removes a blob, garbage collection does.
+
+The bytes live in a backing storage, the default storage unless given.
+"""
+import hashlib
+import re
+import tempfile
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+BLOB_PREFIX = 'blobs'
+READ_BLOCK = 64 * 1024
+
+_BLOB_NAME_RE = re.compile(r'^blobs/([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})$')
+
+
+def blob_name(sha256: str) -> str:
+    return f'{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+def sha256_from_name(name: Optional[str]) -> Optional[str]:
+    """The hash a blob name stands for, or None for any other name"""
+    match = _BLOB_NAME_RE.match(name or '')
+    if match and match.group(3).startswith(match.group(1) + match.group(2)):
+        return match.group(3)
+    return None
+
+
+class ContentAddressedStorage(Storage):
+    def __init__(self, backing=None):
+        self._backing = backing
+
+    @property
+    def backing(self):
+        return self._backing or default_storage
+
+    def _hash(self, content):
+        """SHA-256 and size of ``content``, plus a file to store it from"""
+        digest = hashlib.sha256()
+        size = 0
+        if hasattr(content, 'temporary_file_path'):
+            # Already on local disk: hash it in place, let the backing storage move it
+            with open(content.temporary_file_path(), 'rb') as source:
+                for block in iter(lambda: source.read(READ_BLOCK), b''):
+                    digest.update(block)
+                    size += len(block)
+            return digest.hexdigest(), size, content
+        spool = tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR)
+        for chunk in content.chunks(READ_BLOCK):
+            digest.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+        spool.seek(0)
+        return digest.hexdigest(), size, File(spool)
+
+    def _save(self, name, content):
+        from .models import Blob
+
+        sha256, size, source = self._hash(content)
+        name = blob_name(sha256)
+        try:
+            with transaction.atomic():
+                # The row lock serialises writers of the same content, and
+                # restarting the grace period keeps GC off a blob that is
+                # about to be referenced again
+                blob, created = Blob.objects.select_for_update().get_or_create(
+                    sha256=sha256, defaults={'size': size, 'unreferenced_since': timezone.now()}
+                )
+                if not created:
+                    Blob.objects.filter(pk=sha256).update(unreferenced_since=Case(
+                        When(ref_count__lte=0, then=Value(timezone.now())), default=F('unreferenced_since')
+                    ))
+                if not self.backing.exists(name):
+                    stored = self.backing.save(name, source)
+                    if stored != name:
+                        self.backing.delete(stored)
+                        raise IOError(f"Backing storage renamed blob {name} to {stored}")
+        finally:
+            source.close()
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content in _save(); nothing to deduplicate here
+        return name
+
+    def delete(self, name):
+        if sha256_from_name(name):
+            return
+        self.backing.delete(name)
+
+    def _open(self, name, mode='rb'):
+        return self.backing.open(name, mode)
+
+    def exists(self, name):
+        return self.backing.exists(name)
+
+    def size(self, name):
+        return self.backing.size(name)
+
+    def url(self, name):
+        return self.backing.url(name)
+
+    def path(self, name):
+        return self.backing.path(name)
+
+    def listdir(self, path):
+        return self.backing.listdir(path)
+
+    def get_modified_time(self, name):
+        return self.backing.get_modified_time(name)
+
+    def get_created_time(self, name):
+        return self.backing.get_created_time(name)
+
+    def get_accessed_time(self, name):
+        return self.backing.get_accessed_time(name)
+
+
+_document_storage = ContentAddressedStorage()
+
+
+def document_storage():
+    """Storage for Document.file_path; a callable so migrations reference it by name"""
+    return _document_storage
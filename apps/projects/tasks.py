@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .previews import render
+
+
+@shared_task(ignore_result=True)
+def render_document_previews(sha256):
+    """Render the thumbnail and preview of one stored file"""
+    return render(sha256)
@@ -0,0 +1,54 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from apps.accounts.roles import get_user_roles
+from apps.projects.fragments import fragment_key, get_fragment, set_fragment
+
+register = template.Library()
+
+# Rendered in place of the viewer's CSRF token so cached HTML can be shared
+CSRF_PLACEHOLDER = '__docuhub_csrf_token__'
+
+
+class ProjectFragmentNode(template.Node):
+    def __init__(self, nodelist, name, project, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.project = project
+        self.vary = vary
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        project = self.project.resolve(context)
+        request = context.get('request')
+        key = fragment_key(
+            name, project,
+            roles=get_user_roles(getattr(request, 'user', None)),
+            vary=[value.resolve(context) for value in self.vary]
+        )
+        html = get_fragment(name, key)
+        if html is None:
+            with context.push(csrf_token=CSRF_PLACEHOLDER):
+                html = self.nodelist.render(context)
+            set_fragment(key, html)
+        csrf_token = context.get('csrf_token')
+        return mark_safe(html.replace(CSRF_PLACEHOLDER, str(csrf_token) if csrf_token else ''))
+
+
+@register.tag
+def projectfragment(parser, token):
+    """
+    Cache the enclosed template block per project, viewer role and flags.
+    Usage: {% projectfragment 'drawing_list' project can_edit can_review %}...{% endprojectfragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and a project")
+    nodelist = parser.parse(('endprojectfragment',))
+    parser.delete_first_token()
+    return ProjectFragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]]
+    )
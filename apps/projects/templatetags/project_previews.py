@@ -0,0 +1,14 @@
+from django import template
+
+from apps.projects.previews import is_unsupported, preview_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def document_preview_url(document, size='thumb'):
+    """Signed URL of a document's preview, or '' when there is nothing to show"""
+    sha256 = getattr(document, 'file_sha256', '')
+    if not sha256 or is_unsupported(sha256):
+        return ''
+    return preview_url(sha256, size)
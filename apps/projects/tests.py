@@ -1,9 +1,41 @@
-from django.test import TestCase, Client
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.utils import timezone
-from apps.projects.models import Project, Document, ProjectGroup, ProjectHistory, ApprovalHistory
-from apps.projects.services import ProjectVersionService, ProjectSubmissionService
+from apps.projects import blobs, downloads, previews, uploads
+from apps.projects.models import (
+    Project, Document, ProjectGroup, ProjectHistory, ApprovalHistory, UploadSession, Blob
+)
+from apps.projects.permissions import (
+    IsProjectManager, IsProjectAdministrator, ProjectAdminRateThrottle, ProjectUserRateThrottle
+)
+from apps.accounts.models import Role, UserProfile
+from apps.accounts.roles import has_role
+from apps.projects.services import (
+    ProjectVersionService, ProjectSubmissionService, ProjectHistoryFeedService, ProjectStatsService,
+    ProjectDetailContextBuilder, ProjectBulkOperationsService
+)
+from apps.projects.workflow import ProjectWorkflow, TRANSITIONS, TransitionConflict
+from apps.projects.fragments import fragment_cache_stats, reset_fragment_cache_stats
+from apps.projects.facets import project_facets, tally_facets
+from apps.projects.stats import invalidate_dashboard_stats
+from rest_framework.test import APIClient
+from PIL import Image
 import uuid
 
 User = get_user_model()
@@ -286,3 +318,1293 @@ class ProjectSubmissionServiceTests(TestCase):
         self.assertFalse(
             ApprovalHistory.objects.filter(project=lone_project, action='Obsoleted').exists()
         )
+
+
+class ProjectDetailContextBuilderTests(TestCase):
+    def setUp(self):
+        self.submitter = User.objects.create_user(
+            username='detail-author',
+            email='detail-author@example.com',
+            password='password123'
+        )
+        self.group = ProjectGroup.objects.create(name='Detail Group', created_by=self.submitter)
+        self.versions = [
+            Project.objects.create(
+                project_group=self.group,
+                project_name='Detail Tower',
+                project_description='Tower block',
+                version_number=version,
+                is_latest=(version == 1),
+                created_by=self.submitter,
+                project_priority='Normal'
+            )
+            for version in (1, 2, 3)
+        ]
+        for project in self.versions:
+            Document.objects.create(
+                project=project, document_number='D001', title='Ground floor', created_by=self.submitter
+            )
+            for index in range(4):
+                ApprovalHistory.objects.create(
+                    project=project,
+                    action='SUBMITTED',
+                    performed_by=self.submitter,
+                    to_status='SUBMITTED',
+                    comment=f"Entry {index}"
+                )
+        self.project = self.versions[-1]
+
+    def test_context_is_built_within_query_budget(self):
+        builder = ProjectDetailContextBuilder(self.project)
+        # versions, documents, first activity page, history log
+        with self.assertNumQueries(4):
+            context = builder.build()
+            self.assertEqual(
+                [version.version_number for version in context['project_versions']], [3, 2, 1]
+            )
+            for version in context['project_versions']:
+                version.created_by.username
+            self.assertEqual([document.created_by for document in context['drawings']], [self.submitter])
+            self.assertEqual(len(context['project_history_logs']), 0)
+            for history in context['full_activity_log']:
+                history.project.version_display, history.performed_by.username
+
+        self.assertEqual(len(context['full_activity_log']), builder.ACTIVITY_PAGE_SIZE)
+        self.assertEqual(context['activity_next_page'], 2)
+
+    def test_activity_partial_pages_through_the_log(self):
+        self.client.force_login(self.submitter)
+        response = self.client.get(
+            reverse('projects:activity', kwargs={'pk': self.project.pk}), {'page': 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['full_activity_log']), 6)
+        self.assertIsNone(response.context['activity_next_page'])
+
+    def test_detail_page_for_owner_reviewer_and_outsider(self):
+        self.client.force_login(self.submitter)
+        response = self.client.get(reverse('projects:detail', kwargs={'pk': self.project.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_project_owner'])
+        self.assertFalse(response.context['can_review'])
+
+        # Approvers see submitted projects and may review them; drafts stay hidden
+        reviewer = User.objects.create_user(
+            username='detail-reviewer', email='detail-reviewer@example.com', password='password123', is_staff=True
+        )
+        self.client.force_login(reviewer)
+        url = reverse('projects:detail', kwargs={'pk': self.project.pk})
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.project.documents.update(status='PENDING_REVIEW')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['is_project_owner'])
+        self.assertTrue(response.context['can_review'])
+
+        # Other submitters only see approved projects
+        outsider = User.objects.create_user(
+            username='detail-outsider', email='detail-outsider@example.com', password='password123'
+        )
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.project.documents.update(status='APPROVED')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ProjectWorkflowTests(TestCase):
+    def setUp(self):
+        self.submitter = User.objects.create_user(
+            username='flowsubmitter', email='flowsubmitter@example.com', password='password123'
+        )
+        self.reviewer = User.objects.create_user(
+            username='flowreviewer', email='flowreviewer@example.com', password='password123', is_staff=True
+        )
+        self.workflow = ProjectWorkflow(email_service=mock.Mock())
+
+    def _project(self, name, *statuses):
+        group = ProjectGroup.objects.create(name=f'{name} Group', created_by=self.submitter)
+        project = Project.objects.create(
+            project_group=group, version_number=1, project_name=name, created_by=self.submitter
+        )
+        for index, status in enumerate(statuses):
+            Document.objects.create(
+                project=project, document_number=f'W{index:03d}', title=f'Sheet {index}', status=status,
+                created_by=self.submitter
+            )
+        ProjectHistory.objects.create(
+            project=project, version=1, submitted_by=self.submitter,
+            date_submitted=timezone.now(), receipt_id=f'rcpt-flow-{project.pk}'
+        )
+        return project
+
+    def test_review_transitions_start_from_documents_awaiting_review(self):
+        for name in ('approve', 'reject', 'request_revision'):
+            self.assertEqual(TRANSITIONS[name].sources, ('SUBMITTED', 'PENDING_REVIEW'))
+            self.assertNotIn(TRANSITIONS[name].target, TRANSITIONS[name].sources)
+
+    def test_approve_moves_documents_and_writes_one_history_row(self):
+        project = self._project('Flow Tower', 'PENDING_REVIEW', 'PENDING_REVIEW', 'DRAFT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.workflow.apply(
+                'approve', project, self.reviewer, 'Looks good', request_meta={'ip_address': '10.0.0.1'}
+            )
+
+        self.assertEqual(result.applied, [project])
+        self.assertEqual(
+            sorted(project.documents.values_list('status', flat=True)), ['APPROVED', 'APPROVED', 'DRAFT']
+        )
+        history = ApprovalHistory.objects.get(project=project)
+        self.assertEqual(
+            (history.action, history.from_status, history.to_status, history.comment, history.ip_address),
+            ('APPROVED', 'PENDING_REVIEW', 'APPROVED', 'Looks good', '10.0.0.1')
+        )
+        self.assertEqual(ProjectHistory.objects.get(project=project).approval_status, 'APPROVED')
+        self.workflow.email_service.notify_project_approved.assert_called_once_with(
+            project, self.submitter, self.reviewer
+        )
+
+    def test_bulk_approve_is_set_based(self):
+        projects = [self._project(f'Flow Block {i}', 'SUBMITTED', 'PENDING_REVIEW') for i in range(4)]
+        draft = self._project('Flow Draft', 'DRAFT')
+
+        # count, one UPDATE per source status, history INSERT, snapshot UPDATE,
+        # approved versions for the release, savepoint
+        with self.assertNumQueries(8):
+            result = self.workflow.apply('approve', projects + [draft], self.reviewer)
+
+        self.assertEqual(result.applied, projects)
+        self.assertEqual(
+            result.skipped, [(draft, 'cannot approve: no SUBMITTED or PENDING_REVIEW documents')]
+        )
+        self.assertEqual(Document.objects.filter(status='APPROVED').count(), 8)
+        self.assertEqual(ApprovalHistory.objects.filter(action='APPROVED').count(), 8)
+        self.assertFalse(ApprovalHistory.objects.filter(project=draft).exists())
+
+    def test_concurrent_review_rolls_back_the_whole_batch(self):
+        first = self._project('Flow Race A', 'PENDING_REVIEW')
+        second = self._project('Flow Race B', 'PENDING_REVIEW')
+        count = ProjectWorkflow._expected_documents
+
+        def counted_then_reviewed_elsewhere(transition, projects):
+            expected = count(transition, projects)
+            Document.objects.filter(project=second).update(status='REJECTED')
+            return expected
+
+        with mock.patch.object(
+            ProjectWorkflow, '_expected_documents', side_effect=counted_then_reviewed_elsewhere
+        ):
+            with self.assertRaises(TransitionConflict):
+                self.workflow.apply('approve', [first, second], self.reviewer)
+
+        self.assertEqual(first.documents.get().status, 'PENDING_REVIEW')
+        self.assertFalse(ApprovalHistory.objects.exists())
+        self.assertEqual(ProjectHistory.objects.get(project=first).approval_status, 'PENDING')
+        self.workflow.email_service.notify_project_approved.assert_not_called()
+
+
+class ProjectBulkOperationsServiceTests(TestCase):
+    def setUp(self):
+        self.submitter = User.objects.create_user(
+            username='bulksubmitter', email='bulksubmitter@example.com', password='password123'
+        )
+        self.reviewer = User.objects.create_user(
+            username='bulkreviewer', email='bulkreviewer@example.com', password='password123', is_staff=True
+        )
+        self.service = ProjectBulkOperationsService()
+
+    def _project(self, name, status):
+        group = ProjectGroup.objects.create(name=f'{name} Group', created_by=self.submitter)
+        project = Project.objects.create(
+            project_group=group, version_number=1, project_name=name, created_by=self.submitter
+        )
+        Document.objects.create(
+            project=project, document_number='B001', title='Sheet', status=status, created_by=self.submitter
+        )
+        return project
+
+    def test_bulk_approve_reports_skipped_and_unknown_ids(self):
+        pending = [self._project(f'Bulk Pending {i}', 'PENDING_REVIEW') for i in range(5)]
+        approved = self._project('Bulk Approved', 'APPROVED')
+        missing = str(uuid.uuid4())
+        ids = [str(project.pk) for project in pending] + [str(approved.pk), missing, 'not-a-uuid']
+
+        # selection, then the workflow: count, UPDATE, history INSERT, snapshot UPDATE,
+        # approved versions for the release and the savepoint
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(8):
+            results = self.service.bulk_approve_projects(ids, self.reviewer, 'Batch OK')
+
+        self.assertEqual(sorted(results['success']), sorted(project.project_name for project in pending))
+        self.assertEqual(results['errors'], [
+            'Bulk Approved: cannot approve: no SUBMITTED or PENDING_REVIEW documents',
+            f'{missing}: not found',
+            'not-a-uuid: not found',
+        ])
+        self.assertEqual(Document.objects.filter(status='APPROVED').count(), 6)
+        self.assertEqual(
+            set(ApprovalHistory.objects.values_list('comment', flat=True)), {'Bulk approval: Batch OK'}
+        )
+        self.assertEqual(ApprovalHistory.objects.count(), 5)
+        self.assertEqual(len(callbacks), 3)
+
+    def test_bulk_approve_releases_the_new_version(self):
+        released = self._project('Bulk Release', 'APPROVED')
+        group = released.project_group
+        pending = Project.objects.create(
+            project_group=group, version_number=2, is_latest=False, project_name='Bulk Release',
+            created_by=self.submitter
+        )
+        Document.objects.create(
+            project=pending, document_number='B001', title='Sheet', status='PENDING_REVIEW',
+            created_by=self.submitter
+        )
+
+        results = self.service.bulk_approve_projects([str(pending.pk)], self.reviewer, 'Batch OK')
+
+        self.assertEqual(results['success'], ['Bulk Release'])
+        group.refresh_from_db()
+        self.assertEqual(group.latest_project_id, pending.pk)
+        self.assertEqual(
+            dict(Project.objects.filter(project_group=group).values_list('version_number', 'is_latest')),
+            {1: False, 2: True}
+        )
+        obsoleted = ApprovalHistory.objects.get(action='OBSOLETED')
+        self.assertEqual(
+            (obsoleted.project_id, obsoleted.from_status, obsoleted.to_status, obsoleted.comment),
+            (released.pk, 'APPROVED', 'OBSOLETED', 'Superseded by version V002.')
+        )
+
+
+class ProjectHistoryFeedServiceTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='feedadmin', email='feedadmin@example.com', password='password123',
+            is_staff=True, is_superuser=True
+        )
+        self.other = User.objects.create_user(
+            username='Bob', email='bob@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='Feed Group', created_by=self.admin)
+        projects = [
+            Project.objects.create(
+                project_group=group, version_number=number, is_latest=(number == 2),
+                project_name=name, created_by=self.admin
+            )
+            for number, name in ((1, 'alpha Tower'), (2, 'Beta Plaza'))
+        ]
+        base = timezone.now() - timezone.timedelta(days=10)
+        for i in range(13):
+            ProjectHistory.objects.create(
+                project=projects[i % 2], version=1,
+                submitted_by=self.admin if i % 3 else self.other,
+                # Every third submission shares a timestamp to exercise the tie-breakers
+                date_submitted=base + timezone.timedelta(hours=i - i % 3),
+                receipt_id=f'rcpt-feed-{i}'
+            )
+        for i in range(11):
+            entry = ApprovalHistory.objects.create(
+                project=projects[(i + 1) % 2], action='SUBMITTED', to_status='SUBMITTED',
+                performed_by=self.other if i % 2 else self.admin
+            )
+            ApprovalHistory.objects.filter(pk=entry.pk).update(
+                performed_at=base + timezone.timedelta(hours=i - i % 2)
+            )
+
+    def _walk(self, sort_by, per_page=4):
+        feed = ProjectHistoryFeedService(self.admin, {'sort_by': sort_by}, per_page=per_page)
+        pages = [feed.get_page()]
+        while pages[-1].has_next:
+            pages.append(feed.get_page(pages[-1].next_cursor))
+        return feed, pages
+
+    def test_pages_cover_every_row_exactly_once_for_every_sort(self):
+        for sort_by in ProjectHistoryFeedService.SORTS:
+            with self.subTest(sort_by=sort_by):
+                feed, pages = self._walk(sort_by)
+                rows = [row for page in pages for row in page]
+                self.assertEqual(len(rows), 24)
+                self.assertEqual(len({(row.feed_kind, row.pk) for row in rows}), 24)
+                keys = [feed._row_key(row) for row in rows]
+                descending = ProjectHistoryFeedService.SORTS[sort_by][1]
+                self.assertEqual(keys, sorted(keys, reverse=descending))
+                self.assertFalse(pages[0].has_previous)
+
+    def test_previous_cursor_returns_the_same_page(self):
+        feed, pages = self._walk('-date', per_page=5)
+        for index in range(len(pages) - 1, 0, -1):
+            previous = feed.get_page(pages[index].previous_cursor)
+            self.assertEqual(
+                [row.pk for row in previous], [row.pk for row in pages[index - 1]]
+            )
+            self.assertTrue(previous.has_next)
+
+    def test_entry_type_filter_reads_a_single_source(self):
+        feed = ProjectHistoryFeedService(self.admin, {'entry_type': 'change'}, per_page=50)
+        page = feed.get_page()
+        self.assertEqual(len(page), 11)
+        self.assertTrue(all(row.feed_kind == 'change' for row in page))
+        self.assertFalse(page.has_other_pages)
+
+    def test_status_filter_matches_either_side_of_a_change(self):
+        project = Project.objects.first()
+        approved = ApprovalHistory.objects.create(
+            project=project, action='APPROVED', from_status='SUBMITTED', to_status='APPROVED',
+            performed_by=self.admin
+        )
+        reopened = ApprovalHistory.objects.create(
+            project=project, action='REVISION_REQUESTED', from_status='APPROVED',
+            to_status='REVISION_REQUIRED', performed_by=self.admin
+        )
+        feed = ProjectHistoryFeedService(
+            self.admin, {'status': 'APPROVED', 'entry_type': 'change'}, per_page=50
+        )
+        self.assertEqual({row.pk for row in feed.get_page()}, {approved.pk, reopened.pk})
+
+    def test_type_sort_lists_changes_before_submissions(self):
+        _, pages = self._walk('type', per_page=5)
+        kinds = [row.feed_kind for page in pages for row in page]
+        self.assertEqual(kinds, ['change'] * 11 + ['submission'] * 13)
+
+    def test_page_query_count_is_constant(self):
+        feed, _ = self._walk('-date', per_page=4)
+        first = feed.get_page()
+        last_cursor = first.next_cursor
+        with self.assertNumQueries(2):
+            feed.get_page(last_cursor)
+
+    def test_malformed_or_foreign_cursor_restarts_at_first_page(self):
+        feed = ProjectHistoryFeedService(self.admin, {'sort_by': 'user'}, per_page=4)
+        first = feed.get_page()
+        other_sort = ProjectHistoryFeedService(self.admin, {'sort_by': '-date'}, per_page=4)
+        self.assertEqual(
+            [row.pk for row in feed.get_page(other_sort.get_page().next_cursor)],
+            [row.pk for row in first]
+        )
+        self.assertEqual([row.pk for row in feed.get_page('not-a-cursor')], [row.pk for row in first])
+
+
+class ProjectVersionCloneTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='versioner', email='versioner@example.com', password='password123'
+        )
+        self.group = ProjectGroup.objects.create(name='Clone Group', created_by=self.user)
+        self.original = Project.objects.create(
+            project_group=self.group, version_number=1, project_name='Clone Tower',
+            reference_no='REF-1', created_by=self.user
+        )
+        for i in range(30):
+            Document.objects.create(
+                project=self.original, document_number=f'A{i:03d}', title=f'Sheet {i}',
+                revision='B', status='APPROVED', created_by=self.user
+            )
+
+    def test_clone_copies_documents_as_drafts(self):
+        new_project = ProjectVersionService.create_new_version(self.original, self.user, 'Second issue')
+
+        self.assertEqual(new_project.version_number, 2)
+        self.assertEqual(new_project.reference_no, 'REF-1')
+        clones = list(new_project.documents.all())
+        self.assertEqual(len(clones), 30)
+        self.assertTrue(all(doc.status == 'DRAFT' and doc.revision == 'B' for doc in clones))
+        self.assertEqual(self.original.documents.filter(status='APPROVED').count(), 30)
+        self.assertTrue(ApprovalHistory.objects.filter(project=new_project, action='VERSION_CREATED').exists())
+
+    def test_clone_query_count_does_not_grow_with_documents(self):
+        # savepoint, group lock, max(version), project insert, document select,
+        # document insert, history insert, release
+        with self.assertNumQueries(8):
+            ProjectVersionService.create_new_version(self.original, self.user)
+
+    def test_next_version_follows_highest_existing_number(self):
+        Project.objects.create(
+            project_group=self.group, version_number=7, is_latest=False,
+            project_name='Clone Tower', created_by=self.user
+        )
+        new_project = ProjectVersionService.create_new_version(self.original, self.user)
+        self.assertEqual(new_project.version_number, 8)
+
+
+class DocumentValidationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='validator', email='validator@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='Validation Group', created_by=self.user)
+        self.project = Project.objects.create(
+            project_group=group, version_number=1, project_name='Validation Tower', created_by=self.user
+        )
+        Document.objects.create(project=self.project, document_number='A001', title='Plan', created_by=self.user)
+
+    def test_status_only_save_skips_uniqueness_query(self):
+        document = Document.objects.get(document_number='A001')
+        document.status = 'APPROVED'
+        # update only, no uniqueness SELECT
+        with self.assertNumQueries(1):
+            document.save(update_fields=['status', 'updated_at'])
+
+    def test_changed_number_is_still_checked(self):
+        Document.objects.create(project=self.project, document_number='A002', title='Section', created_by=self.user)
+        document = Document.objects.get(document_number='A002')
+        document.document_number = 'a001'
+        with self.assertRaises(ValidationError):
+            document.save()
+
+    def test_validate_batch_reports_clashes_in_one_query(self):
+        documents = [
+            Document(project=self.project, document_number=number, title='Sheet', created_by=self.user)
+            for number in ('a001', 'B001', 'B001', 'C001')
+        ]
+        with self.assertNumQueries(1):
+            with self.assertRaises(ValidationError) as raised:
+                Document.validate_batch(documents)
+        self.assertEqual(raised.exception.messages, [
+            'Document number B001 appears more than once.',
+            'Document number A001 already exists in this project.',
+        ])
+
+
+class ChangeTrackingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='tracker', email='tracker@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='Tracking Group', created_by=self.user)
+        self.project = Project.objects.create(
+            project_group=group, version_number=1, project_name='Tracked Tower', created_by=self.user
+        )
+
+    def test_changes_are_reported_without_queries(self):
+        project = Project.objects.get(pk=self.project.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(project.changed_fields, set())
+            project.project_name = 'Renamed Tower'
+            self.assertTrue(project.has_changed('project_name'))
+            self.assertEqual(project.old_value('project_name'), 'Tracked Tower')
+
+    def test_snapshot_follows_saved_fields(self):
+        project = Project.objects.get(pk=self.project.pk)
+        project.project_name = 'Renamed Tower'
+        project.notes = 'Unsaved note'
+        project.save(update_fields=['project_name', 'updated_at'])
+
+        self.assertEqual(project.changed_fields, {'notes'})
+        self.assertEqual(project.old_value('project_name'), 'Renamed Tower')
+
+    def test_new_instances_report_every_field(self):
+        document = Document(project=self.project, document_number='N001', title='New', created_by=self.user)
+        self.assertTrue(document.has_changed('status'))
+        self.assertIsNone(document.old_value('status'))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RoleResolutionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.approver_role = Role.objects.create(name='Approver')
+        self.user = User.objects.create_user(username='reviewer', email='reviewer@example.com', password='password123')
+        UserProfile.objects.update_or_create(user=self.user, defaults={'role': self.approver_role})
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_roles_resolved_once_per_request_and_shared_across_requests(self):
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(IsProjectManager.has_permission(user))
+            self.assertFalse(IsProjectAdministrator.has_permission(user))
+            self.assertTrue(IsProjectManager.has_permission(user))
+        next_request_user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(IsProjectManager.has_permission(next_request_user))
+
+    def test_profile_role_change_invalidates_cache(self):
+        self.assertTrue(IsProjectManager.has_permission(self.fresh_user()))
+        profile = UserProfile.objects.get(user=self.user)
+        profile.role = Role.objects.create(name='Viewer')
+        profile.save()
+        self.assertFalse(IsProjectManager.has_permission(self.fresh_user()))
+
+    def test_role_rename_invalidates_members(self):
+        self.assertTrue(has_role(self.fresh_user(), 'Approver'))
+        self.approver_role.name = 'Admin'
+        self.approver_role.save()
+        self.assertTrue(IsProjectAdministrator.has_permission(self.fresh_user()))
+
+
+class LatestProjectPointerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pointer', email='pointer@example.com', password='password123')
+        self.group = ProjectGroup.objects.create(name='Pointer Group', created_by=self.user)
+        self.first = Project.objects.create(
+            project_group=self.group, version_number=1, project_name='Pointer Tower', created_by=self.user
+        )
+
+    def test_first_version_becomes_group_latest(self):
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.latest_project, self.first)
+
+    def test_new_version_stays_behind_the_pointer_until_released(self):
+        second = ProjectVersionService.create_new_version(self.first, self.user)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.latest_project, self.first)
+        self.assertFalse(second.is_latest)
+
+        Document.objects.create(
+            project=second, document_number='P001', title='Sheet', status='PENDING_REVIEW', created_by=self.user
+        )
+        self.assertTrue(ProjectSubmissionService().approve_project(second, self.user))
+        self.group.refresh_from_db()
+        self.first.refresh_from_db()
+        self.assertEqual(self.group.latest_project, second)
+        self.assertFalse(self.first.is_latest)
+        self.assertEqual(list(Project.objects.filter(latest_of_group__isnull=False)), [second])
+
+    def test_set_as_latest_moves_pointer_back(self):
+        second = ProjectVersionService.create_new_version(self.first, self.user)
+        second.set_as_latest()
+        self.first.set_as_latest()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.latest_project, self.first)
+        self.assertEqual(Project.objects.filter(project_group=self.group, is_latest=True).get(), self.first)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='dash', email='dash@example.com', password='password123')
+        self.groups = [
+            ProjectGroup.objects.create(name=f'Dash Group {i}', created_by=self.user) for i in range(2)
+        ]
+        self.v1 = Project.objects.create(
+            project_group=self.groups[0], version_number=1, project_name='Dash A', created_by=self.user
+        )
+        self.v2 = Project.objects.create(
+            project_group=self.groups[0], version_number=2, project_name='Dash A', created_by=self.user
+        )
+        self.other = Project.objects.create(
+            project_group=self.groups[1], version_number=1, project_name='Dash B', created_by=self.user
+        )
+        for number, status in (('A001', 'DRAFT'), ('A002', 'PENDING_REVIEW'), ('A003', 'APPROVED')):
+            Document.objects.create(
+                project=self.v2, document_number=number, title='Sheet', status=status, created_by=self.user
+            )
+
+    def test_counts_in_one_query_then_from_cache(self):
+        with self.assertNumQueries(1):
+            stats = ProjectStatsService.get_dashboard_stats(self.user)
+        self.assertEqual(stats, {
+            'total_projects': 2, 'total_documents': 3,
+            'draft_documents': 1, 'pending_documents': 1, 'approved_documents': 1,
+        })
+        with self.assertNumQueries(0):
+            ProjectStatsService.get_dashboard_stats(self.user)
+
+    def test_status_change_invalidates_cached_counts(self):
+        ProjectStatsService.get_dashboard_stats(self.user)
+        document = Document.objects.get(document_number='A001')
+        document.status = 'APPROVED'
+        document.save(update_fields=['status', 'updated_at'])
+        self.assertEqual(ProjectStatsService.get_dashboard_stats(self.user)['approved_documents'], 2)
+
+    def test_recent_projects_returns_newest_version_per_group(self):
+        with self.assertNumQueries(1):
+            recent = ProjectStatsService.get_recent_projects(self.user)
+        self.assertCountEqual([project.pk for project in recent], [self.v2.pk, self.other.pk])
+
+    def test_user_project_stats_count_projects_by_document_status(self):
+        stats = ProjectStatsService.get_user_project_stats(self.user)
+        self.assertEqual({key: value for key, value in stats.items() if key != 'recent_projects'}, {
+            'total_projects': 3, 'draft_projects': 1, 'pending_projects': 1, 'approved_projects': 1,
+            'rejected_projects': 0, 'revision_projects': 0,
+        })
+
+    def test_dashboard_page_renders_for_owner_and_manager(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('projects:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['stats']['pending_projects'], 1)
+        self.assertFalse(response.context['is_admin'])
+
+        approver = Role.objects.create(name='Approver')
+        UserProfile.objects.update_or_create(user=self.user, defaults={'role': approver})
+        ApprovalHistory.objects.create(
+            project=self.v2, action='APPROVED', performed_by=self.user, from_status='PENDING_REVIEW',
+            to_status='APPROVED', user_agent=''
+        )
+        response = self.client.get(reverse('projects:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['admin_stats']['pending_approvals'], 1)
+        self.assertEqual(response.context['admin_stats']['approved_today'], 1)
+        self.assertEqual(list(response.context['admin_stats']['recent_submissions']), [self.v2])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProjectFacetTests(TestCase):
+    CELLS = [
+        ('DRAFT', 'Normal', 3),
+        ('DRAFT', 'High', 1),
+        ('PENDING_REVIEW', 'High', 2),
+        ('APPROVED', 'Normal', 4),
+    ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_each_facet_ignores_only_its_own_selection(self):
+        facets = tally_facets(self.CELLS, {'status': None, 'priority': None})
+        self.assertEqual(facets['total'], 10)
+        self.assertEqual(facets['status'], {'DRAFT': 4, 'PENDING_REVIEW': 2, 'APPROVED': 4})
+
+        facets = tally_facets(self.CELLS, {'status': 'DRAFT', 'priority': 'High'})
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['status'], {'DRAFT': 1, 'PENDING_REVIEW': 2})
+        self.assertEqual(facets['status_total'], 3)
+        self.assertEqual(facets['priority'], {'Normal': 3, 'High': 1})
+
+    def test_cached_per_scope_and_filter_set(self):
+        selected = {'status': 'DRAFT', 'priority': None}
+        with mock.patch('apps.projects.facets._count_facets', return_value={'total': 1}) as count:
+            project_facets(Project.objects.none(), selected, 'user:1', filters=('tower',))
+            project_facets(Project.objects.none(), selected, 'user:1', filters=('tower',))
+            self.assertEqual(count.call_count, 1)
+            project_facets(Project.objects.none(), selected, 'user:1', filters=('marina',))
+            project_facets(Project.objects.none(), selected, 'managers', filters=('tower',))
+            self.assertEqual(count.call_count, 3)
+
+            invalidate_dashboard_stats()
+            project_facets(Project.objects.none(), selected, 'user:1', filters=('tower',))
+            self.assertEqual(count.call_count, 4)
+
+
+class ProjectListViewTests(TestCase):
+    def setUp(self):
+        # Executed so the search index is populated
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner = User.objects.create_user(
+                username='list-owner', email='list-owner@example.com', password='password123',
+                first_name='Olive', last_name='Owner'
+            )
+            self.other = User.objects.create_user(
+                username='list-other', email='list-other@example.com', password='password123',
+                first_name='Otto', last_name='Other'
+            )
+            self.draft = self._project('List Draft', self.owner, 'Normal', 'DRAFT')
+            self.pending = self._project('List Pending', self.owner, 'High', 'PENDING_REVIEW', 'APPROVED')
+            self.approved = self._project('List Approved', self.other, 'High', 'APPROVED')
+            self.hidden = self._project('List Hidden', self.other, 'Normal', 'DRAFT')
+
+    def _project(self, name, user, priority, *statuses):
+        group = ProjectGroup.objects.create(name=f'{name} Group', created_by=user)
+        project = Project.objects.create(
+            project_group=group, version_number=1, project_name=name, project_priority=priority, created_by=user
+        )
+        for index, status in enumerate(statuses):
+            Document.objects.create(
+                project=project, document_number=f'L{index:03d}', title=f'Sheet {index}', status=status,
+                created_by=user
+            )
+        return project
+
+    def test_visibility_and_search_by_owner_name(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('projects:list'))
+        self.assertEqual(response.status_code, 200)
+        # Own projects in any status and anyone's approved ones
+        self.assertCountEqual(response.context['projects'], [self.draft, self.pending, self.approved])
+
+        response = self.client.get(reverse('projects:list'), {'search': 'otto'})
+        self.assertEqual(list(response.context['projects']), [self.approved])
+        response = self.client.get(reverse('projects:list'), {'search': 'pending'})
+        self.assertEqual(list(response.context['projects']), [self.pending])
+
+        # Approvers see everything that has been submitted
+        self.client.force_login(User.objects.create_user(
+            username='list-reviewer', email='list-reviewer@example.com', password='password123', is_staff=True
+        ))
+        response = self.client.get(reverse('projects:list'))
+        self.assertCountEqual(response.context['projects'], [self.pending, self.approved])
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as baseline:
+            self.assertEqual(self.client.get(reverse('projects:list')).status_code, 200)
+
+        for index in range(5):
+            self._project(f'List Extra {index}', self.owner, 'Low', 'DRAFT', 'SUBMITTED')
+        # Owners, groups and documents are loaded once for the whole page
+        with self.assertNumQueries(len(baseline)):
+            response = self.client.get(reverse('projects:list'))
+        self.assertEqual(len(response.context['projects']), 8)
+        self.assertContains(response, 'List Extra 4')
+
+    def test_status_and_priority_facets_filter_the_list(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('projects:list'), {'status': 'PENDING_REVIEW', 'priority': 'High'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['projects']), [self.pending])
+        facets = response.context['facets']
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['status'], {'PENDING_REVIEW': 1, 'APPROVED': 1})
+        self.assertEqual(facets['priority'], {'High': 1})
+        self.assertIn(('PENDING_REVIEW', 'Pending Review', 1), response.context['status_facets'])
+        # The stats cards ignore the selection
+        self.assertEqual(response.context['stats'], {
+            'draft_projects': 1, 'submitted_projects': 0, 'pending_review_projects': 1,
+            'pending_projects': 1, 'approved_projects': 1,
+        })
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProjectFragmentCacheTests(TestCase):
+    TEMPLATE = (
+        "{% load project_fragments %}"
+        "{% projectfragment 'drawing_list' project can_edit %}{{ render_count }}|{{ csrf_token }}"
+        "{% endprojectfragment %}"
+    )
+
+    def setUp(self):
+        cache.clear()
+        reset_fragment_cache_stats()
+        self.user = User.objects.create_user(
+            username='fragments', email='fragments@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='Fragment Group', created_by=self.user)
+        self.project = Project.objects.create(
+            project_group=group, version_number=1, project_name='Fragment Tower', created_by=self.user
+        )
+        self.renders = 0
+
+    def render(self, csrf_token='token-a', can_edit=True):
+        def render_count():
+            self.renders += 1
+            return self.renders
+        return Template(self.TEMPLATE).render(Context({
+            'project': self.project, 'can_edit': can_edit,
+            'render_count': render_count, 'csrf_token': csrf_token,
+        }))
+
+    def test_repeat_render_is_served_from_cache(self):
+        self.assertEqual(self.render(), '1|token-a')
+        # Cached HTML is reused, with the viewer's own CSRF token
+        self.assertEqual(self.render(csrf_token='token-b'), '1|token-b')
+        self.assertEqual(self.render(can_edit=False), '2|token-a')
+        self.assertEqual(fragment_cache_stats(), {'drawing_list': {'hit': 1, 'miss': 2}})
+
+    def test_document_write_invalidates_fragment(self):
+        self.render()
+        Document.objects.create(project=self.project, document_number='F001', title='Plan', created_by=self.user)
+        self.assertEqual(self.render(), '2|token-a')
+
+
+@mock.patch.multiple(ProjectUserRateThrottle, THROTTLE_RATES={'project_user': '1000/hour'})
+class ProjectApiConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='api-owner', email='api-owner@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='API Group', created_by=self.user)
+        self.project = Project.objects.create(
+            project_group=group, version_number=1, project_name='API Tower', created_by=self.user
+        )
+        self.document = Document.objects.create(
+            project=self.project, document_number='API1', title='Plan', created_by=self.user
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.detail_url = f'/api/projects/{self.project.pk}/'
+
+    def test_unchanged_project_returns_304_from_one_state_query(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+        self.assertNotIn('no-store', response['Cache-Control'])
+
+        # Only the state query; nothing is loaded for serialisation
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_nested_document_change_changes_etag(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        list_etag = self.client.get('/api/projects/')['ETag']
+        self.assertEqual(self.client.get('/api/projects/', HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+
+        self.document.delete()
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/api/projects/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+
+@mock.patch.multiple(ProjectUserRateThrottle, THROTTLE_RATES={'project_user': '1000/hour'})
+class ProjectApiSparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='api-lister', email='api-lister@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='List Group', created_by=self.user)
+        for version in (1, 2, 3):
+            project = Project.objects.create(
+                project_group=group, version_number=version, project_name=f'List Tower {version}',
+                created_by=self.user
+            )
+            for number in ('L001', 'L002'):
+                Document.objects.create(project=project, document_number=number, title='Plan', created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Memoise the user's roles so only the list queries are counted
+        self.client.get('/api/projects/')
+
+    def test_list_is_compact_with_annotated_counts(self):
+        # state query + page query, independent of the number of projects
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/projects/')
+        row = response.json()['results'][0]
+        self.assertEqual(row['document_count'], 2)
+        self.assertNotIn('documents', row)
+        self.assertNotIn('approval_history', row)
+
+    def test_expand_adds_nested_collection_with_one_prefetch(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/projects/', {'expand': 'documents', 'fields': 'id,documents'})
+        row = response.json()['results'][0]
+        self.assertEqual(set(row), {'id', 'documents'})
+        self.assertEqual(len(row['documents']), 2)
+
+    def test_detail_keeps_full_representation(self):
+        project = Project.objects.first()
+        data = self.client.get(f'/api/projects/{project.pk}/').json()
+        self.assertIn('approval_history', data)
+        self.assertEqual(len(data['documents']), 2)
+
+
+@mock.patch.multiple(ProjectUserRateThrottle, THROTTLE_RATES={'project_user': '1000/hour'})
+@mock.patch.multiple(ProjectAdminRateThrottle, THROTTLE_RATES={'project_admin': '2000/hour'})
+class ProjectApiCursorExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='api-exporter', email='api-exporter@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='Export Group', created_by=self.user)
+        for version in range(1, 6):
+            Project.objects.create(
+                project_group=group, version_number=version, project_name=f'Export Tower {version}',
+                created_by=self.user
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_pages_cover_every_project_once(self):
+        names = []
+        url = '/api/projects/?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            names.extend(row['project_name'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(names, [f'Export Tower {version}' for version in range(5, 0, -1)])
+
+    def test_export_requires_project_manager(self):
+        self.assertEqual(self.client.get('/api/projects/export/').status_code, 403)
+
+    def test_export_streams_ndjson_and_json(self):
+        UserProfile.objects.update_or_create(
+            user=self.user, defaults={'role': Role.objects.create(name='Approver')}
+        )
+
+        response = self.client.get('/api/projects/export/', {'fields': 'id,project_name'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(set(json.loads(lines[0])), {'id', 'project_name'})
+
+        response = self.client.get('/api/projects/export/', {'encoding': 'json'})
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 5)
+        self.assertNotIn('documents', rows[0])
+
+        self.assertEqual(self.client.get('/api/projects/export/', {'encoding': 'xml'}).status_code, 400)
+
+
+@mock.patch.multiple(ProjectUserRateThrottle, THROTTLE_RATES={'project_user': '1000/hour'})
+class ResumableUploadTests(TestCase):
+    DATA = bytes(range(256)) * 1000
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=os.path.join(self.tmp.name, 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+        staging = mock.patch.object(uploads, 'UPLOAD_STAGING_DIR', os.path.join(self.tmp.name, 'staging'))
+        staging.start()
+        self.addCleanup(staging.stop)
+
+        self.user = User.objects.create_user(
+            username='uploader', email='uploader@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='Upload Group', created_by=self.user)
+        project = Project.objects.create(
+            project_group=group, version_number=1, project_name='Upload Tower', created_by=self.user
+        )
+        self.document = Document.objects.create(
+            project=project, document_number='U001', title='Site plan', created_by=self.user
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, **extra):
+        response = self.client.post('/api/uploads/', {
+            'document': str(self.document.pk), 'filename': 'site-plan.pdf', 'size': len(self.DATA), **extra
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return f"/api/uploads/{response.json()['id']}/"
+
+    def send(self, url, offset, chunk, checksum=None):
+        return self.client.patch(
+            url, chunk, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_UPLOAD_CHECKSUM=checksum or hashlib.sha256(chunk).hexdigest()
+        )
+
+    def test_resumes_after_a_bad_chunk_and_stores_the_file(self):
+        url = self.start(sha256=hashlib.sha256(self.DATA).hexdigest())
+        first, rest = self.DATA[:100000], self.DATA[100000:]
+
+        self.assertEqual(self.send(url, 0, first)['Upload-Offset'], '100000')
+        # Corrupted in transit: rejected, offset unchanged
+        self.assertEqual(self.send(url, 100000, rest, checksum='0' * 64).status_code, 422)
+        conflict = self.send(url, 0, first)
+        self.assertEqual(conflict.status_code, 409)
+        self.assertEqual(conflict.json()['offset'], 100000)
+        self.assertEqual(self.client.get(url).json()['offset'], 100000)
+
+        self.assertEqual(self.send(url, 100000, rest).status_code, 200)
+        response = self.client.post(f'{url}complete/')
+        self.assertEqual(response.status_code, 200)
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.file_sha256, hashlib.sha256(self.DATA).hexdigest())
+        with self.document.file_path.open('rb') as stored:
+            self.assertEqual(stored.read(), self.DATA)
+        self.assertEqual(os.listdir(uploads.UPLOAD_STAGING_DIR), [])
+
+    def test_whole_file_checksum_mismatch_aborts(self):
+        url = self.start(sha256='f' * 64)
+        self.send(url, 0, self.DATA)
+        self.assertEqual(self.client.post(f'{url}complete/').status_code, 422)
+
+        self.assertEqual(UploadSession.objects.get().status, 'ABORTED')
+        self.document.refresh_from_db()
+        self.assertFalse(self.document.file_path)
+
+    def test_incomplete_upload_cannot_complete_and_expires(self):
+        url = self.start()
+        self.send(url, 0, self.DATA[:10])
+        self.assertEqual(self.client.post(f'{url}complete/').status_code, 409)
+
+        UploadSession.objects.update(expires_at=timezone.now() - timezone.timedelta(minutes=1))
+        self.assertEqual(uploads.purge_expired_uploads(), 1)
+        self.assertEqual(os.listdir(uploads.UPLOAD_STAGING_DIR), [])
+
+
+class DocumentBlobStoreTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user(
+            username='archivist', email='archivist@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='Blob Group', created_by=self.user)
+        self.project = Project.objects.create(
+            project_group=group, version_number=1, project_name='Blob Tower', created_by=self.user
+        )
+        self.next_version = Project.objects.create(
+            project_group=group, version_number=2, project_name='Blob Tower', created_by=self.user
+        )
+
+    def add_document(self, number, content, name='plan.pdf', project=None):
+        return Document.objects.create(
+            project=project or self.project, document_number=number, title=f'Sheet {number}',
+            file_path=ContentFile(content, name=name), created_by=self.user
+        )
+
+    def test_identical_content_is_stored_once_at_a_sharded_path(self):
+        first = self.add_document('B001', b'same bytes', name='a.pdf')
+        second = self.add_document('B002', b'same bytes', name='b.pdf')
+
+        sha256 = hashlib.sha256(b'same bytes').hexdigest()
+        self.assertEqual(first.file_path.name, f'blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}')
+        self.assertEqual(second.file_path.name, first.file_path.name)
+        self.assertEqual((first.file_name, second.file_name), ('a.pdf', 'b.pdf'))
+        self.assertEqual(first.file_sha256, sha256)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, 'blobs', sha256[:2], sha256[2:4])), [sha256])
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+
+    def test_new_version_shares_blobs_without_copying(self):
+        self.add_document('B001', b'sheet one')
+        self.add_document('B002', b'sheet two')
+
+        ProjectVersionService._clone_documents(self.project, self.next_version, self.user)
+
+        clones = list(self.next_version.documents.all())
+        self.assertEqual(len(clones), 2)
+        self.assertTrue(all(clone.file_sha256 for clone in clones))
+        self.assertEqual(sorted(Blob.objects.values_list('ref_count', flat=True)), [2, 2])
+        stored = [name for _, _, files in os.walk(self.tmp.name) for name in files]
+        self.assertEqual(len(stored), 2)
+
+    def test_replacing_and_deleting_documents_release_references(self):
+        document = self.add_document('B001', b'first draft')
+        document.file_path = ContentFile(b'second draft', name='plan.pdf')
+        document.save()
+
+        counts = dict(Blob.objects.values_list('sha256', 'ref_count'))
+        self.assertEqual(counts[hashlib.sha256(b'first draft').hexdigest()], 0)
+        self.assertEqual(counts[hashlib.sha256(b'second draft').hexdigest()], 1)
+
+        document.delete()
+        self.assertFalse(Blob.objects.filter(ref_count__gt=0).exists())
+        self.assertFalse(Blob.objects.filter(unreferenced_since__isnull=True).exists())
+
+    def test_garbage_collection_waits_for_the_grace_period(self):
+        kept = self.add_document('B001', b'kept')
+        dropped = self.add_document('B002', b'dropped')
+        path = dropped.file_path.path
+        dropped.delete()
+
+        self.assertEqual(blobs.collect_garbage(grace_period=3600)['deleted'], 0)
+        self.assertTrue(os.path.exists(path))
+
+        Blob.objects.filter(ref_count=0).update(unreferenced_since=timezone.now() - timezone.timedelta(hours=2))
+        result = blobs.collect_garbage(grace_period=3600)
+        self.assertEqual((result['deleted'], result['bytes']), (1, len(b'dropped')))
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(kept.file_path.path))
+        self.assertEqual(list(Blob.objects.values_list('sha256', flat=True)), [kept.file_sha256])
+
+    def test_recount_repairs_drift_and_gc_never_deletes_referenced_blobs(self):
+        document = self.add_document('B001', b'drifted')
+        Blob.objects.update(ref_count=0, unreferenced_since=timezone.now() - timezone.timedelta(days=2))
+
+        self.assertEqual(blobs.collect_garbage(grace_period=0)['still_referenced'], 1)
+        self.assertTrue(os.path.exists(document.file_path.path))
+        self.assertEqual(blobs.recount(), 1)
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertIsNone(Blob.objects.get().unreferenced_since)
+
+    def test_legacy_files_are_imported_into_the_store(self):
+        os.makedirs(os.path.join(self.tmp.name, 'documents'))
+        with open(os.path.join(self.tmp.name, 'documents', 'old.pdf'), 'wb') as legacy:
+            legacy.write(b'legacy bytes')
+        document = Document.objects.create(
+            project=self.project, document_number='B001', title='Old sheet', created_by=self.user
+        )
+        Document.objects.filter(pk=document.pk).update(file_path='documents/old.pdf')
+
+        call_command('import_document_blobs', stdout=io.StringIO())
+
+        document.refresh_from_db()
+        self.assertEqual(document.file_sha256, hashlib.sha256(b'legacy bytes').hexdigest())
+        self.assertEqual(document.file_name, 'old.pdf')
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'documents', 'old.pdf')))
+        with document.file_path.open('rb') as stored:
+            self.assertEqual(stored.read(), b'legacy bytes')
+
+
+@mock.patch.multiple(ProjectUserRateThrottle, THROTTLE_RATES={'project_user': '1000/hour'})
+class DocumentDownloadTests(TestCase):
+    DATA = b'0123456789' * 100
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        # Streamed by Django unless a test opts into X-Accel-Redirect
+        accel = mock.patch.object(downloads, 'DOWNLOAD_ACCEL_PREFIX', '')
+        accel.start()
+        self.addCleanup(accel.stop)
+
+        self.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='Download Group', created_by=self.user)
+        self.project = Project.objects.create(
+            project_group=group, version_number=1, project_name='Download Tower', created_by=self.user
+        )
+        self.document = Document.objects.create(
+            project=self.project, document_number='D001', title='Ground floor',
+            file_path=ContentFile(self.DATA, name='ground floor.pdf'), created_by=self.user
+        )
+        Document.objects.create(project=self.project, document_number='D002', title='No file yet', created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/documents/{self.document.pk}/download/'
+
+    def test_download_is_handed_to_nginx(self):
+        with mock.patch.object(downloads, 'DOWNLOAD_ACCEL_PREFIX', '/protected-media/'):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.document.file_path.name}')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="ground floor.pdf"')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['ETag'], f'"{self.document.file_sha256}"')
+        self.assertEqual(response.content, b'')
+
+    def test_api_points_at_the_download_action_not_media(self):
+        response = self.client.get(f'/api/documents/{self.document.pk}/')
+
+        self.assertNotIn('file_path', response.data)
+        self.assertEqual(response.data['download_url'], f'http://testserver{self.url}')
+        self.assertEqual(self.client.get(response.data['download_url']).status_code, 200)
+        without_file = self.client.get('/api/documents/', {'document_number': 'D002'})
+        self.assertIn(None, [document['download_url'] for document in without_file.data['results']])
+
+    def test_other_users_documents_are_not_found(self):
+        stranger = User.objects.create_user(username='stranger', email='stranger@example.com', password='password123')
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_streamed_download_honours_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.DATA)}')
+        self.assertEqual(b''.join(response.streaming_content), self.DATA[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.DATA[-5:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.DATA)}-').status_code, 416)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.DATA)
+
+    def test_signed_urls_are_verified_without_queries(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/download-urls/')
+        self.assertEqual(response.status_code, 200)
+        documents = response.json()['documents']
+        self.assertEqual([document['document_number'] for document in documents], ['D001'])
+
+        url = documents[0]['url']
+        anonymous = Client()
+        with self.assertNumQueries(0):
+            response = anonymous.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.DATA)
+
+        self.assertEqual(anonymous.get(url.replace('ground', 'other')).status_code, 403)
+        self.assertEqual(anonymous.get(url[:-1] + ('0' if url[-1] != '0' else '1')).status_code, 403)
+
+    def test_signed_urls_expire(self):
+        url = downloads.signed_url(self.document.file_sha256, 'ground floor.pdf', ttl=60, now=time.time() - 120)
+        self.assertEqual(Client().get(url).status_code, 403)
+
+
+class DocumentPreviewTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        accel = mock.patch.object(downloads, 'DOWNLOAD_ACCEL_PREFIX', '')
+        accel.start()
+        self.addCleanup(accel.stop)
+
+        self.user = User.objects.create_user(
+            username='reviewer', email='reviewer@example.com', password='password123'
+        )
+        group = ProjectGroup.objects.create(name='Preview Group', created_by=self.user)
+        self.project = Project.objects.create(
+            project_group=group, version_number=1, project_name='Preview Tower', created_by=self.user
+        )
+
+    def add_document(self, number, content, name):
+        return Document.objects.create(
+            project=self.project, document_number=number, title=f'Sheet {number}',
+            file_path=ContentFile(content, name=name), created_by=self.user
+        )
+
+    def image_bytes(self, size=(2000, 1000), mode='RGBA'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, 'navy').save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_preview_is_rendered_on_first_request_and_reused(self):
+        document = self.add_document('P001', self.image_bytes(), 'plan.png')
+        url = Template('{% load project_previews %}{% document_preview_url document %}').render(
+            Context({'document': document})
+        )
+        self.assertTrue(url.startswith('/api/previews/'))
+
+        response = Client().get(url.replace('&amp;', '&'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertTrue(response['Cache-Control'].startswith('private, max-age='))
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as thumb:
+            self.assertEqual(thumb.size, (160, 80))
+        self.assertTrue(previews.is_rendered(document.file_sha256))
+
+        with mock.patch.object(previews.rendering, 'render_job') as render_job:
+            self.assertEqual(Client().get(previews.preview_url(document.file_sha256, 'preview')).status_code, 200)
+        render_job.assert_not_called()
+
+    def test_preview_urls_are_stable_within_a_window(self):
+        sha256 = 'a' * 64
+        start = 1_800_000_000 - 1_800_000_000 % previews.PREVIEW_URL_TTL
+        self.assertEqual(
+            previews.preview_url(sha256, 'thumb', now=start + 1),
+            previews.preview_url(sha256, 'thumb', now=start + previews.PREVIEW_URL_TTL - 1)
+        )
+        url = previews.preview_url(sha256, 'thumb')
+        self.assertEqual(Client().get(url.replace('thumb', 'preview')).status_code, 403)
+
+    def test_files_pillow_cannot_read_are_marked_unsupported(self):
+        document = self.add_document('P002', b'%PDF-1.4 not an image', 'spec.pdf')
+
+        self.assertEqual(Client().get(previews.preview_url(document.file_sha256, 'thumb')).status_code, 404)
+        self.assertTrue(previews.is_unsupported(document.file_sha256))
+        self.assertEqual(Template('{% load project_previews %}{% document_preview_url document %}').render(
+            Context({'document': document})
+        ), '')
+
+    def test_backfill_renders_on_a_process_pool(self):
+        image = self.add_document('P001', self.image_bytes(mode='1'), 'scan.png')
+        other = self.add_document('P002', self.image_bytes(size=(300, 900), mode='RGB'), 'detail.png')
+        pdf = self.add_document('P003', b'%PDF-1.4 not an image', 'spec.pdf')
+
+        out = io.StringIO()
+        call_command('render_document_previews', workers=2, stdout=out)
+
+        self.assertIn('2 rendered', out.getvalue())
+        self.assertIn('1 unsupported', out.getvalue())
+        self.assertTrue(previews.is_rendered(image.file_sha256))
+        self.assertTrue(previews.is_rendered(other.file_sha256))
+        self.assertTrue(previews.is_unsupported(pdf.file_sha256))
+
+        out = io.StringIO()
+        call_command('render_document_previews', workers=2, stdout=out)
+        self.assertIn('Nothing to render', out.getvalue())
+
+    @override_settings(DOCUMENT_PREVIEW_MODE='eager')
+    def test_new_files_are_rendered_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            document = self.add_document('P001', self.image_bytes(), 'plan.png')
+        self.assertTrue(previews.is_rendered(document.file_sha256))
@@ -0,0 +1,214 @@
+"""
+Resumable chunked uploads for ``Document.file_path``.
+
+A client opens an ``UploadSession`` with the file's name, size and
+(optionally) its SHA-256, then sends the bytes in order as raw request
+bodies, each tagged with the offset it starts at and its own SHA-256.
+Chunks are streamed from the request straight into a staging file in
+READ_BLOCK pieces and hashed on the way, so a worker holds one block per
+upload whatever the chunk or file size; Django's upload handlers and
+request.body are never involved. A chunk whose checksum or length does
+not match is cut off again and the session's offset stays put, so after
+a dropped connection the client asks for the offset and carries on from
+there.
+
+Completing the session hands the staging file to the document's
+content-addressed storage, which hashes it, checks it against the SHA-256
+the client declared and moves it into place (or drops it, if the same
+content is already stored).
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadSession
+from .storage import sha256_from_name
+
+logger = logging.getLogger('projects')
+
+UPLOAD_STAGING_DIR = getattr(
+    settings, 'DOCUMENT_UPLOAD_STAGING_DIR', os.path.join(tempfile.gettempdir(), 'docuhub-uploads')
+)
+UPLOAD_MAX_SIZE = getattr(settings, 'DOCUMENT_UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+UPLOAD_MAX_CHUNK_SIZE = getattr(settings, 'DOCUMENT_UPLOAD_MAX_CHUNK_SIZE', 16 * 1024 ** 2)
+UPLOAD_SESSION_TTL = getattr(settings, 'DOCUMENT_UPLOAD_SESSION_TTL', 24 * 3600)
+READ_BLOCK = 64 * 1024
+
+
+class UploadError(Exception):
+    """The request cannot be applied to the upload session"""
+    status_code = 400
+
+
+class UploadOffsetConflict(UploadError):
+    """The chunk does not start where the session left off"""
+    status_code = 409
+
+    def __init__(self, message, offset):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadChecksumMismatch(UploadError):
+    status_code = 422
+
+
+def staging_path(session: UploadSession) -> str:
+    return os.path.join(UPLOAD_STAGING_DIR, f'{session.pk}.part')
+
+
+def _is_sha256(value: str) -> bool:
+    return len(value) == 64 and all(char in '0123456789abcdef' for char in value)
+
+
+def start_upload(document, user, filename: str, size: int, sha256: str = '') -> UploadSession:
+    """Open a session for uploading ``size`` bytes as ``document``'s file"""
+    sha256 = (sha256 or '').lower()
+    filename = os.path.basename(filename or '')
+    if not filename:
+        raise UploadError("A filename is required")
+    if size <= 0 or size > UPLOAD_MAX_SIZE:
+        raise UploadError(f"Size must be between 1 and {UPLOAD_MAX_SIZE} bytes")
+    if sha256 and not _is_sha256(sha256):
+        raise UploadError("sha256 must be 64 hexadecimal characters")
+
+    os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+    session = UploadSession.objects.create(
+        document=document, created_by=user, filename=filename, size=size, sha256=sha256,
+        expires_at=timezone.now() + timedelta(seconds=UPLOAD_SESSION_TTL)
+    )
+    # Created up front so every chunk can open it in place
+    open(staging_path(session), 'wb').close()
+    return session
+
+
+def _locked(session: UploadSession) -> UploadSession:
+    session = UploadSession.objects.select_for_update().get(pk=session.pk)
+    if session.status != 'RECEIVING':
+        raise UploadError(f"Upload is {session.get_status_display().lower()}")
+    return session
+
+
+def receive_chunk(session: UploadSession, offset: int, stream, length: int, checksum: str = '') -> int:
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset``; return the new offset.
+
+    The session row stays locked while the chunk is written, so two
+    requests for the same offset cannot interleave.
+    """
+    checksum = (checksum or '').lower()
+    if length <= 0 or length > UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError(f"Chunk size must be between 1 and {UPLOAD_MAX_CHUNK_SIZE} bytes")
+
+    with transaction.atomic():
+        session = _locked(session)
+        if offset != session.offset:
+            raise UploadOffsetConflict(f"Expected offset {session.offset}", session.offset)
+        if offset + length > session.size:
+            raise UploadError("Chunk runs past the declared file size")
+
+        digest = hashlib.sha256()
+        received = 0
+        with open(staging_path(session), 'r+b') as staged:
+            # Drop whatever a previously interrupted chunk left behind
+            staged.truncate(offset)
+            staged.seek(offset)
+            while received < length:
+                block = stream.read(min(READ_BLOCK, length - received))
+                if not block:
+                    break
+                digest.update(block)
+                staged.write(block)
+                received += len(block)
+
+            if received != length:
+                staged.truncate(offset)
+                raise UploadError(f"Chunk ended after {received} of {length} bytes")
+            if checksum and digest.hexdigest() != checksum:
+                staged.truncate(offset)
+                raise UploadChecksumMismatch("Chunk checksum does not match")
+
+        session.offset = offset + length
+        session.save(update_fields=['offset', 'updated_at'])
+    return session.offset
+
+
+class _StagedFile(File):
+    """The staging file, offered by path so a filesystem backend can move it instead of copying"""
+
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name)
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def complete_upload(session: UploadSession):
+    """Store the received file as the document's file and return the document"""
+    with transaction.atomic():
+        session = _locked(session)
+        if session.offset != session.size:
+            raise UploadOffsetConflict(
+                f"Received {session.offset} of {session.size} bytes", session.offset
+            )
+
+        document = session.document
+        path = staging_path(session)
+        # The content-addressed storage hashes the file on the way in
+        with _StagedFile(path, session.filename) as staged:
+            document.file_path.save(session.filename, staged, save=False)
+        sha256 = sha256_from_name(document.file_path.name)
+
+        mismatch = bool(session.sha256) and sha256 != session.sha256
+        if mismatch:
+            # The bytes are not what the client meant to send; the orphaned
+            # blob is left to garbage collection
+            _discard(session)
+        else:
+            document.file_name = session.filename
+            document.save(update_fields=['file_path', 'file_name', 'file_sha256', 'updated_at'])
+            session.status = 'COMPLETE'
+            session.save(update_fields=['status', 'updated_at'])
+    if mismatch:
+        raise UploadChecksumMismatch("File checksum does not match")
+    _remove_staging_file(path)
+    logger.info(f"Upload {session.pk} stored as {document.file_path.name} ({session.size} bytes)")
+    return document
+
+
+def _remove_staging_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _discard(session: UploadSession) -> None:
+    session.status = 'ABORTED'
+    session.save(update_fields=['status', 'updated_at'])
+    _remove_staging_file(staging_path(session))
+
+
+def abort_upload(session: UploadSession) -> None:
+    with transaction.atomic():
+        _discard(_locked(session))
+
+
+def purge_expired_uploads(now=None) -> int:
+    """Abort unfinished sessions past their expiry and delete their staging files"""
+    now = now or timezone.now()
+    expired = list(UploadSession.objects.filter(status='RECEIVING', expires_at__lt=now))
+    for session in expired:
+        _remove_staging_file(staging_path(session))
+    UploadSession.objects.filter(pk__in=[session.pk for session in expired]).update(
+        status='ABORTED', updated_at=now
+    )
+    return len(expired)
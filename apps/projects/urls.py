@@ -8,6 +8,7 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('create/', views.ProjectCreateView.as_view(), name='create'),
     path('<uuid:pk>/', views.ProjectDetailView.as_view(), name='detail'),
+    path('<uuid:pk>/activity/', views.project_activity, name='activity'),
     path('<uuid:pk>/update/', views.ProjectUpdateView.as_view(), name='update'),
     path('<uuid:pk>/submit/', views.submit_project, name='submit'),
     path('<uuid:pk>/review/', views.review_project, name='review'),
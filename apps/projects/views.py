@@ -8,7 +8,7 @@ from django.template.loader import render_to_string
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.utils import timezone
 from django.urls import reverse_lazy, reverse
-from django.db.models import Q, Count, Max
+from django.db.models import Q, Count, Exists, Max, OuterRef
 from django.core.paginator import Paginator
 from django.db import transaction
 
@@ -25,10 +25,15 @@ from .permissions import (
 )
 from .services import (
     ProjectStatsService, ProjectSubmissionService, ProjectVersionService,
-    ProjectBulkOperationsService, ProjectRestoreService
+    ProjectBulkOperationsService, ProjectRestoreService, ProjectHistoryFeedService,
+    ProjectDetailContextBuilder
 )
 from apps.accounts.views import is_admin_role_user
 from apps.accounts.utils import get_client_ip
+from apps.accounts.roles import has_role, MANAGER_ROLES
+from apps.core.search import search_ids
+from .facets import FACET_FIELDS, annotate_review_status, project_facets
+from .workflow import REVIEWABLE
 import uuid
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -39,7 +44,7 @@ from django.template.loader import render_to_string
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.utils import timezone
 from django.urls import reverse_lazy, reverse
-from django.db.models import Q, Count, Max
+from django.db.models import Q, Count, Exists, Max, OuterRef
 from django.core.paginator import Paginator
 from django.db import transaction
 
@@ -56,10 +61,15 @@ from .permissions import (
 )
 from .services import (
     ProjectStatsService, ProjectSubmissionService, ProjectVersionService,
-    ProjectBulkOperationsService, ProjectRestoreService
+    ProjectBulkOperationsService, ProjectRestoreService, ProjectHistoryFeedService,
+    ProjectDetailContextBuilder
 )
 from apps.accounts.views import is_admin_role_user
 from apps.accounts.utils import get_client_ip
+from apps.accounts.roles import has_role, MANAGER_ROLES
+from apps.core.search import search_ids
+from .facets import FACET_FIELDS, annotate_review_status, project_facets
+from .workflow import REVIEWABLE
 import uuid
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -70,7 +80,7 @@ from django.template.loader import render_to_string
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.utils import timezone
 from django.urls import reverse_lazy, reverse
-from django.db.models import Q, Count, Max
+from django.db.models import Q, Count, Exists, Max, OuterRef
 from django.core.paginator import Paginator
 from django.db import transaction
 
@@ -87,10 +97,15 @@ from .permissions import (
 )
 from .services import (
     ProjectStatsService, ProjectSubmissionService, ProjectVersionService,
-    ProjectBulkOperationsService, ProjectRestoreService
+    ProjectBulkOperationsService, ProjectRestoreService, ProjectHistoryFeedService,
+    ProjectDetailContextBuilder
 )
 from apps.accounts.views import is_admin_role_user
 from apps.accounts.utils import get_client_ip
+from apps.accounts.roles import has_role, MANAGER_ROLES
+from apps.core.search import search_ids
+from .facets import FACET_FIELDS, annotate_review_status, project_facets
+from .workflow import REVIEWABLE
 from apps.accounts.models import UserProfile # Import UserProfile
 
 def is_admin_or_approver(user):
@@ -1977,14 +1992,28 @@ def get_project_versions(request, project_group_id):
     return JsonResponse(data)
 
 
+@login_required
+def project_activity(request, pk):
+    """HTMX partial: one page of the activity log across a project's versions"""
+    project = get_object_or_404(Project, pk=pk)
+    if not CanViewProject.has_permission(request.user, project):
+        return HttpResponseForbidden("You do not have permission to view this project.")
+    
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 1
+    activity = ProjectDetailContextBuilder(project).activity_page(page)
+    return render(request, 'projects/partials/activity_log.html', {
+        'project': project,
+        'full_activity_log': activity['items'],
+        'activity_next_page': activity['next_page'],
+    })
+
+
 def is_admin_or_approver(user):
     """Helper function to check if a user is an Admin or Approver."""
-    if not user.is_authenticated:
-        return False
-    try:
-        return user.profile.role.name in ['Admin', 'Approver']
-    except AttributeError:
-        return False
+    return has_role(user, *MANAGER_ROLES)
 
 @login_required
 @user_passes_test(is_admin_or_approver)
@@ -2056,45 +2085,74 @@ class ProjectListView(LoginRequiredMixin, ListView):
     context_object_name = 'projects'
     paginate_by = 20
     
-    def get_queryset(self):
+    def get_visible_queryset(self, with_search=True):
         """
-        Filter projects based on user permissions:
+        Latest versions the user may see, with the search applied (unless
+        ``with_search`` is False) but not the status / priority facets:
         - Approver can see all except draft
         - Submitter can view his own projects (any status) and all approved projects
         """
         user = self.request.user
         
         if IsProjectManager.has_permission(user):
-            # Approvers can see all projects except Draft status
-            base_queryset = Project.objects.exclude(status='Draft')
+            # Approvers can see all projects except drafts (nothing submitted yet)
+            base_queryset = Project.objects.filter(
+                Exists(Document.objects.filter(project=OuterRef('pk')).exclude(status='DRAFT'))
+            )
         else:
             # Submitters can see:
             # 1. Their own projects (any status)
             # 2. All approved projects from anyone
             base_queryset = Project.objects.filter(
-                Q(submitted_by=user) | Q(status='Approved_Endorsed')
-            ).distinct()
-        
-        status = self.request.GET.get('status')
-        if status:
-            base_queryset = base_queryset.filter(status=status)
+                Q(created_by=user) |
+                Exists(Document.objects.filter(project=OuterRef('pk'), status='APPROVED'))
+            )
 
-        search = self.request.GET.get('search')
+        search = self.request.GET.get('search') if with_search else None
         if search:
+            # Matches on the project's own text or on its owner's name
             base_queryset = base_queryset.filter(
-                Q(project_name__icontains=search) |
-                Q(project_description__icontains=search) |
-                Q(submitted_by__first_name__icontains=search) |
-                Q(submitted_by__last_name__icontains=search)
+                Q(pk__in=search_ids('project', search)) |
+                Q(created_by_id__in=search_ids('user', search))
             )
 
-        latest_versions_pks = base_queryset.values('project_group_id').annotate(
-            latest_pk=Max('pk')
-        ).values_list('latest_pk', flat=True)
+        # Only the latest version of each group, via the group's denormalised
+        # latest_project pointer (an indexed join, no GROUP BY). The status
+        # facet filters and groups on the documents' rolled-up status.
+        return annotate_review_status(base_queryset.filter(latest_of_group__isnull=False))
 
-        queryset = Project.objects.filter(pk__in=latest_versions_pks).select_related(
-            'submitted_by', 'reviewed_by'
-        ).prefetch_related('drawings')
+    def get_selected_facets(self):
+        return {name: self.request.GET.get(name) or None for name in FACET_FIELDS}
+
+    def get_facet_scope(self):
+        user = self.request.user
+        return 'managers' if IsProjectManager.has_permission(user) else f'user:{user.pk}'
+
+    def get_facets(self):
+        """Total and per-status / per-priority counts, from one cached grouped aggregate"""
+        if not hasattr(self, '_facets'):
+            self._facets = project_facets(
+                self.get_visible_queryset(), self.get_selected_facets(), self.get_facet_scope(),
+                filters=(self.request.GET.get('search', '').strip().lower(),)
+            )
+        return self._facets
+
+    def get_stats_facets(self):
+        """Counts of everything the user may see, for the stats cards; ignores search and facets"""
+        return project_facets(
+            self.get_visible_queryset(with_search=False), {name: None for name in FACET_FIELDS},
+            self.get_facet_scope(), filters=('',)
+        )
+    
+    def get_queryset(self):
+        queryset = self.get_visible_queryset()
+        for name, value in self.get_selected_facets().items():
+            if value:
+                queryset = queryset.filter(**{FACET_FIELDS[name]: value})
+
+        queryset = queryset.select_related(
+            'created_by', 'project_group'
+        ).prefetch_related('documents')
 
         # Apply sorting
         sort = self.request.GET.get('sort')
@@ -2112,29 +2170,25 @@ class ProjectListView(LoginRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         context['is_admin'] = IsProjectManager.has_permission(self.request.user)
         
-        # Get base queryset for statistics (before pagination)
-        user = self.request.user
-        if IsProjectManager.has_permission(user):
-            stats_queryset = Project.objects.exclude(status='Draft')
-        else:
-            stats_queryset = Project.objects.filter(
-                Q(submitted_by=user) | Q(status='Approved_Endorsed')
-            ).distinct()
-        
-        # Get latest versions for statistics
-        latest_versions_pks = stats_queryset.values('project_group_id').annotate(
-            latest_pk=Max('pk')
-        ).values_list('latest_pk', flat=True)
-        
-        stats_projects = Project.objects.filter(pk__in=latest_versions_pks)
-        
-        # Calculate statistics
-        stats = {
-            'draft_projects': stats_projects.filter(status='Draft').count(),
-            'pending_projects': stats_projects.filter(status='Pending_Approval').count(),
-            'approved_projects': stats_projects.filter(status='Approved_Endorsed').count(),
+        facets = self.get_facets()
+        context['facets'] = facets
+        context['status_facets'] = [
+            (value, label, facets['status'].get(value, 0)) for value, label in Document.STATUS_CHOICES
+        ]
+        context['priority_facets'] = [
+            (value, label, facets['priority'].get(value, 0)) for value, label in Project.PRIORITY_CHOICES
+        ]
+        # The stats cards stay unfiltered, as before the facets; without a search
+        # or facet selected this is the same cached aggregate as the list's
+        status_counts = self.get_stats_facets()['status']
+        context['stats'] = {
+            'draft_projects': status_counts.get('DRAFT', 0),
+            'submitted_projects': status_counts.get('SUBMITTED', 0),
+            'pending_review_projects': status_counts.get('PENDING_REVIEW', 0),
+            # Awaiting a review decision, either way
+            'pending_projects': sum(status_counts.get(status, 0) for status in REVIEWABLE),
+            'approved_projects': status_counts.get('APPROVED', 0),
         }
-        context['stats'] = stats
         
         return context
 
@@ -2144,35 +2198,10 @@ class ProjectDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'project'
 
     def get_object(self, queryset=None):
-        pk = self.kwargs['pk']
-        print(f"DEBUG: ProjectDetailView received PK: {pk}")
-        obj = get_object_or_404(
-            Project.objects.select_related('submitted_by', 'reviewed_by'),
-            pk=pk
+        return get_object_or_404(
+            Project.objects.select_related('created_by', 'project_group'),
+            pk=self.kwargs['pk']
         )
-        print(f"DEBUG: ProjectDetailView found object: {obj.pk}")
-        return obj
-
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        
-        # Use proper permission checking
-        if not CanViewProject.has_permission(self.request.user, self.object):
-            return HttpResponseForbidden("You do not have permission to view this project.")
-        
-        # If user is viewing their own project, always redirect to the latest version
-        if self.object.submitted_by == request.user:
-            latest_version = Project.objects.filter(
-                project_group_id=self.object.project_group_id,
-                project_name=self.object.project_name,
-                submitted_by=self.object.submitted_by
-            ).order_by('-version').first()
-            
-            if latest_version and latest_version.pk != self.object.pk:
-                return redirect('projects:detail', pk=latest_version.pk)
-             
-        context = self.get_context_data(object=self.object)
-        return self.render_to_response(context)
 
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
@@ -2190,27 +2219,13 @@ class ProjectDetailView(LoginRequiredMixin, DetailView):
         is_admin = IsProjectManager.has_permission(self.request.user)
         context['can_edit'] = CanEditProject.has_permission(self.request.user, self.object)
         context['can_create_new_version'] = CanCreateNewVersion.has_permission(self.request.user, self.object)
-        context['can_review'] = is_admin and (self.object.status == 'Pending_Approval')
+        context['can_review'] = is_admin and self.object.documents.filter(status__in=REVIEWABLE).exists()
         context['is_review_page'] = False
-        context['drawings'] = self.object.drawings.select_related('added_by')
 
-        # Get all project versions for the version history sidebar
-        # Only get versions that belong to the same project group
-        context['project_versions'] = Project.objects.filter(
-            project_group_id=self.object.project_group_id,
-            project_name=self.object.project_name,
-            submitted_by=self.object.submitted_by
-        ).select_related('submitted_by', 'reviewed_by').order_by('-version')
-        
-        # Get the complete activity log for ALL versions of this specific project group
-        context['full_activity_log'] = ApprovalHistory.objects.filter(
-            project__project_group_id=self.object.project_group_id,
-            project__project_name=self.object.project_name,
-            project__submitted_by=self.object.submitted_by
-        ).select_related('performed_by', 'project').order_by('-performed_at')
-        
-        # Get the detailed project history log
-        context['project_history_logs'] = ProjectStatsService.get_project_history_log(self.object)
+        # Drawings, versions, the first activity page and the history log,
+        # one query each; further activity pages come from project_activity
+        context.update(ProjectDetailContextBuilder(self.object).build())
+        context['is_project_owner'] = self.object.created_by_id == self.request.user.id
         
         # Log project access for audit trail
         if self.request.user.is_staff:
@@ -2219,7 +2234,7 @@ class ProjectDetailView(LoginRequiredMixin, DetailView):
             logger.info(
                 f"Project detail accessed by admin {self.request.user.username}: "
                 f"Project {self.object.project_name} (Group: {self.object.project_group_id}), "
-                f"Found {context['project_versions'].count()} versions"
+                f"Found {len(context['project_versions'])} versions"
             )
         
         return context
@@ -2775,110 +2790,19 @@ def create_new_version(request, pk):
 @login_required
 def history_log(request):
     """History log view: Users see their own, approvers/viewers see all."""
-    from itertools import chain
-    from django.db.models import Q
-    from datetime import datetime
-    
     # Initialize filter form
     filter_form = HistoryFilterForm(request.GET, user=request.user)
-    
-    # Base querysets
-    if IsProjectManager.has_permission(request.user):
-        project_history = ProjectHistory.objects.all()
-        approval_history = ApprovalHistory.objects.all()
-    else:
-        project_history = ProjectHistory.objects.filter(submitted_by=request.user)
-        approval_history = ApprovalHistory.objects.filter(performed_by=request.user)
-    
-    # Apply filters if form is valid
-    if filter_form.is_valid():
-        filters = filter_form.cleaned_data
-        
-        # Project filter
-        if filters.get('project'):
-            project_history = project_history.filter(project=filters['project'])
-            approval_history = approval_history.filter(project=filters['project'])
-        
-        # User filter
-        if filters.get('user'):
-            project_history = project_history.filter(submitted_by=filters['user'])
-            approval_history = approval_history.filter(performed_by=filters['user'])
-        
-        # Status filter
-        if filters.get('status'):
-            project_history = project_history.filter(approval_status=filters['status'])
-            approval_history = approval_history.filter(
-                Q(previous_status=filters['status']) | Q(new_status=filters['status'])
-            )
-        
-        # Date range filters
-        if filters.get('date_from'):
-            project_history = project_history.filter(date_submitted__date__gte=filters['date_from'])
-            approval_history = approval_history.filter(performed_at__date__gte=filters['date_from'])
-        
-        if filters.get('date_to'):
-            project_history = project_history.filter(date_submitted__date__lte=filters['date_to'])
-            approval_history = approval_history.filter(performed_at__date__lte=filters['date_to'])
-        
-        # Type filter (submission or change)
-        if filters.get('entry_type') == 'submission':
-            approval_history = ApprovalHistory.objects.none()  # Empty queryset
-        elif filters.get('entry_type') == 'change':
-            project_history = ProjectHistory.objects.none()  # Empty queryset
-    
-    # Apply sorting
-    sort_by = filter_form.cleaned_data.get('sort_by', '-date') if filter_form.is_valid() else '-date'
-    
-    if sort_by == 'project':
-        combined_history = sorted(
-            chain(project_history, approval_history),
-            key=lambda x: x.project.project_name.lower()
-        )
-    elif sort_by == '-project':
-        combined_history = sorted(
-            chain(project_history, approval_history),
-            key=lambda x: x.project.project_name.lower(),
-            reverse=True
-        )
-    elif sort_by == 'user':
-        combined_history = sorted(
-            chain(project_history, approval_history),
-            key=lambda x: (getattr(x, 'submitted_by', None) or getattr(x, 'performed_by', None)).username.lower()
-        )
-    elif sort_by == '-user':
-        combined_history = sorted(
-            chain(project_history, approval_history),
-            key=lambda x: (getattr(x, 'submitted_by', None) or getattr(x, 'performed_by', None)).username.lower(),
-            reverse=True
-        )
-    elif sort_by == 'type':
-        combined_history = sorted(
-            chain(project_history, approval_history),
-            key=lambda x: 'submission' if hasattr(x, 'receipt_id') and x.receipt_id else 'change'
-        )
-    elif sort_by == 'date':
-        combined_history = sorted(
-            chain(project_history, approval_history),
-            key=lambda x: getattr(x, 'date_submitted', None) or getattr(x, 'performed_at', None)
-        )
-    else:  # Default: '-date'
-        combined_history = sorted(
-            chain(project_history, approval_history),
-            key=lambda x: getattr(x, 'date_submitted', None) or getattr(x, 'performed_at', None),
-            reverse=True
-        )
-    
-    # Pagination
-    paginator = Paginator(combined_history, 25)  # 25 records per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {}
+
+    # Merged, keyset-paginated feed (no OFFSET scans, no full materialisation)
+    feed = ProjectHistoryFeedService(request.user, filters, per_page=25)
+    page_obj = feed.get_page(request.GET.get('cursor'))
+
     context = {
         'history': page_obj,
         'filter_form': filter_form,
-        'total_count': len(combined_history)
     }
-    
+
     return render(request, 'projects/history_log.html', context)
 
 @login_required
@@ -2944,7 +2868,9 @@ def update_drawing_status(request, pk):
         new_status = request.POST.get('drawing_status_' + str(pk))
         if new_status and new_status in [choice[0] for choice in Document.STATUS_CHOICES]:
             drawing.status = new_status
-            drawing.save()
+            # Re-posting the current status is a no-op: skip the UPDATE
+            if drawing.has_changed('status'):
+                drawing.save(update_fields=['status', 'updated_at'])
             
             if request.headers.get('HX-Request'):
                 # Return the updated row for HTMX
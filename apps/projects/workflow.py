@@ -0,0 +1,262 @@
+"""
+Project review workflow.
+
+Every review decision goes through ``ProjectWorkflow.apply``, driven by the
+``TRANSITIONS`` table. A project has no status of its own: it is reviewed
+through its documents, and a transition moves every document of the project
+that sits in one of its source statuses. One grouped SELECT counts those
+documents, which is the guard; the move is one conditional UPDATE
+(``WHERE status = <source>``) per source status, checked against those
+counts; history is one bulk INSERT and the ProjectHistory snapshot one
+UPDATE. A transition's ``after_apply`` hook runs in the same transaction:
+approval uses it to release the version (``ProjectWorkflow._release``).
+Notifications and cache invalidation (dashboard stats and
+detail-page fragments) run after commit. Model save() and its signals are
+bypassed, so a decision is recorded exactly once whichever view or service
+triggers it.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import Project, ProjectGroup, Document, ApprovalHistory, ProjectHistory
+from .fragments import invalidate_project_fragments
+from .stats import invalidate_dashboard_stats
+
+logger = logging.getLogger('projects')
+
+# Document statuses that are awaiting a review decision
+REVIEWABLE = ('SUBMITTED', 'PENDING_REVIEW')
+
+
+@dataclass(frozen=True)
+class Transition:
+    name: str
+    sources: Tuple[str, ...]
+    target: str
+    action: str
+    # BrevoEmailService method called with (project, submitter, actor)
+    notify: Optional[str] = None
+    # ProjectWorkflow method called with (projects, actor, request_meta) inside
+    # the transaction, after the documents have moved
+    after_apply: Optional[str] = None
+
+
+TRANSITIONS = {
+    transition.name: transition for transition in (
+        Transition('approve', REVIEWABLE, 'APPROVED', 'APPROVED',
+                   notify='notify_project_approved', after_apply='_release'),
+        Transition('reject', REVIEWABLE, 'REJECTED', 'REJECTED',
+                   notify='notify_project_rejected'),
+        Transition('request_revision', REVIEWABLE, 'REVISION_REQUIRED', 'REVISION_REQUESTED',
+                   notify='notify_revision_required'),
+    )
+}
+
+
+class TransitionConflict(Exception):
+    """A project's documents changed status between being counted and being updated"""
+
+
+@dataclass
+class TransitionResult:
+    applied: List[Project] = field(default_factory=list)
+    # (project, reason) for projects with no document the transition applies to
+    skipped: List[Tuple[Project, str]] = field(default_factory=list)
+
+
+class ProjectWorkflow:
+    """Applies TRANSITIONS to one project or a batch"""
+
+    def __init__(self, email_service=None):
+        if email_service is None:
+            from apps.notifications.services import BrevoEmailService
+            email_service = BrevoEmailService()
+        self.email_service = email_service
+
+    def apply(self, name: str, projects: Union[Project, Iterable[Project]], actor: User,
+              comments: str = "", history_comment: Optional[str] = None,
+              request_meta: Optional[Dict] = None) -> TransitionResult:
+        """
+        Move the documents of ``projects`` through transition ``name``.
+
+        The documents counted in each source status are the expected row
+        counts of the conditional UPDATEs. If any count no longer matches,
+        the whole call is rolled back and TransitionConflict raised, so a
+        batch never applies partially. Projects with no document in a
+        source status are returned in ``skipped`` without being written.
+        """
+        transition = TRANSITIONS[name]
+        if isinstance(projects, Project):
+            projects = [projects]
+        projects = list(projects)
+
+        result = TransitionResult()
+        if not projects:
+            return result
+
+        expected = self._expected_documents(transition, projects)
+        for project in projects:
+            if any(project.pk in by_project for by_project in expected.values()):
+                result.applied.append(project)
+            else:
+                result.skipped.append((
+                    project,
+                    f"cannot {name.replace('_', ' ')}: no {' or '.join(transition.sources)} documents"
+                ))
+        if not result.applied:
+            return result
+
+        now = timezone.now()
+        request_meta = request_meta or {}
+        comment = comments if history_comment is None else history_comment
+
+        with transaction.atomic():
+            for source, by_project in expected.items():
+                if not by_project:
+                    continue
+                updated = Document.objects.filter(project_id__in=list(by_project), status=source).update(
+                    status=transition.target, updated_by=actor, updated_at=now
+                )
+                if updated != sum(by_project.values()):
+                    raise TransitionConflict(
+                        f"{sum(by_project.values())} documents were {source}, {updated} still are"
+                    )
+
+            # One row per project and source status: a single row for a project under review
+            ApprovalHistory.objects.bulk_create([
+                ApprovalHistory(
+                    project=project,
+                    action=transition.action,
+                    performed_by=actor,
+                    comment=comment,
+                    from_status=source,
+                    to_status=transition.target,
+                    ip_address=request_meta.get('ip_address'),
+                    user_agent=request_meta.get('user_agent') or ''
+                )
+                for project in result.applied
+                for source, by_project in expected.items()
+                if project.pk in by_project
+            ])
+
+            ProjectHistory.objects.filter(
+                project_id__in=[project.pk for project in result.applied],
+                version=models.F('project__version_number')
+            ).update(approval_status=transition.target)
+
+            if transition.after_apply:
+                getattr(self, transition.after_apply)(result.applied, actor, request_meta)
+
+            # Read by the notification templates; not model fields
+            for project in result.applied:
+                project.date_reviewed = now
+                project.reviewed_by = actor
+                project.review_comments = comments
+
+            applied = list(result.applied)
+            transaction.on_commit(invalidate_dashboard_stats)
+            transaction.on_commit(lambda: self._invalidate_fragments(applied))
+            if transition.notify:
+                transaction.on_commit(lambda: self._notify(transition, applied, actor))
+
+        logger.info(
+            f"Transition {name} by {actor.username}: {len(result.applied)} applied, "
+            f"{len(result.skipped)} skipped"
+        )
+        return result
+
+    @staticmethod
+    def _expected_documents(transition: Transition, projects: List[Project]) -> Dict[str, Dict]:
+        """``{source status: {project id: documents}}`` for the documents ``transition`` would move"""
+        expected = {source: {} for source in transition.sources}
+        counts = (
+            Document.objects
+            .filter(project_id__in=[project.pk for project in projects], status__in=transition.sources)
+            .values('project_id', 'status')
+            .annotate(documents=models.Count('pk'))
+            .order_by()
+        )
+        for row in counts:
+            expected[row['status']][row['project_id']] = row['documents']
+        return expected
+
+    @staticmethod
+    def _release(projects: List[Project], actor: User, request_meta: Dict) -> None:
+        """
+        Approval releases a version: the previously approved version of its
+        group is recorded as OBSOLETED and the newest approved version takes
+        over the group's latest pointer. Set-based like the rest of apply: one
+        SELECT, one history INSERT and, for versions that were not latest yet,
+        three UPDATEs.
+
+        Documents have no obsolete status, so the old version's documents stay
+        APPROVED; only the OBSOLETED history entry marks it superseded.
+        """
+        approved = TRANSITIONS['approve'].target
+        group_ids = {project.project_group_id for project in projects}
+        # Includes the versions just approved, so a batch with two versions of
+        # one group retires the older through the newer
+        approved_versions = {}
+        for group_id, version_number, pk in (
+            Project.objects
+            .filter(project_group_id__in=group_ids, documents__status=approved)
+            .values_list('project_group_id', 'version_number', 'pk')
+            .distinct()
+            .order_by('version_number')
+        ):
+            approved_versions.setdefault(group_id, []).append((version_number, pk))
+
+        retired = []
+        releasing = {}
+        for project in sorted(projects, key=lambda project: project.version_number):
+            releasing[project.project_group_id] = project
+            earlier = [
+                pk for version_number, pk in approved_versions.get(project.project_group_id, [])
+                if version_number < project.version_number
+            ]
+            if earlier:
+                retired.append(ApprovalHistory(
+                    project_id=earlier[-1],
+                    action='OBSOLETED',
+                    performed_by=actor,
+                    comment=f"Superseded by version {project.version_display}.",
+                    from_status=approved,
+                    to_status='OBSOLETED',
+                    ip_address=request_meta.get('ip_address'),
+                    user_agent=request_meta.get('user_agent') or ''
+                ))
+        if retired:
+            ApprovalHistory.objects.bulk_create(retired)
+
+        stale = [project for project in releasing.values() if not project.is_latest]
+        if stale:
+            Project.objects.filter(
+                project_group_id__in=[project.project_group_id for project in stale], is_latest=True
+            ).update(is_latest=False)
+            Project.objects.filter(pk__in=[project.pk for project in stale]).update(is_latest=True)
+            ProjectGroup.objects.filter(pk__in=[project.project_group_id for project in stale]).update(
+                latest_project=models.Case(
+                    *[models.When(pk=project.project_group_id, then=models.Value(project.pk)) for project in stale],
+                    output_field=models.UUIDField()
+                )
+            )
+            for project in stale:
+                project.is_latest = True
+
+    @staticmethod
+    def _invalidate_fragments(projects: List[Project]) -> None:
+        for group_id in {project.project_group_id for project in projects}:
+            invalidate_project_fragments(project_group_id=group_id)
+
+    def _notify(self, transition: Transition, projects: List[Project], actor: User) -> None:
+        notify = getattr(self.email_service, transition.notify)
+        for project in projects:
+            try:
+                notify(project, project.created_by, actor)
+            except Exception as e:
+                logger.error(f"Failed to queue {transition.name} notification for project {project.id}: {e}")
@@ -1 +1,4 @@
-from .version import __version__
\ No newline at end of file
+from .version import __version__
+from .celery import app as celery_app
+
+__all__ = ('__version__', 'celery_app')
@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -131,7 +132,6 @@ if DEBUG:
     CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
     AUTH_PASSWORD_VALIDATORS = [{'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator', 'OPTIONS': {'min_length': 4}}]
     RATELIMIT_ENABLE = False
-    REST_FRAMEWORK = {} # Reset to avoid production settings
 else:
     # --- Production Settings ---
     allowed_hosts_str = config('ALLOWED_HOSTS', default='')
@@ -223,7 +223,7 @@ REST_FRAMEWORK_BASE = {
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'apps.core.pagination.DefaultCursorPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
     'DEFAULT_PARSER_CLASSES': [
@@ -331,6 +331,16 @@ BREVO_API_KEY = config('BREVO_API_KEY', default='')
 BREVO_API_URL = 'https://api.brevo.com/v3/smtp/email'
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='')
 BREVO_SENDER_NAME = config('BREVO_SENDER_NAME', default='')
+BREVO_API_TIMEOUT = config('BREVO_API_TIMEOUT', default=10, cast=int)
+
+# Email delivery pipeline: messages are written to the outbox and sent after commit.
+# 'celery' hands them to a worker, 'eager' sends in-process, 'outbox' leaves them for drain_email_outbox.
+EMAIL_DELIVERY_MODE = config('EMAIL_DELIVERY_MODE', default='eager' if DEBUG else 'celery')
+EMAIL_TRANSPORT = config('EMAIL_TRANSPORT', default='apps.notifications.services.BrevoHttpTransport')
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = config('EMAIL_OUTBOX_RETRY_BASE_SECONDS', default=30, cast=int)
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = 3600
+EMAIL_OUTBOX_SEND_LEASE_SECONDS = 300
 
 # Frontend URL for email links
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:8000')
@@ -353,6 +363,30 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'drain-email-outbox': {
+        'task': 'apps.notifications.tasks.drain_email_outbox',
+        'schedule': 60.0,
+    },
+    'flush-session-activity': {
+        'task': 'apps.accounts.tasks.flush_session_activity',
+        'schedule': 60.0,
+    },
+}
+
+# Document previews: 'celery' renders new files on a worker, 'eager' in-process after commit,
+# 'lazy' only when first requested. render_document_previews backfills existing files.
+DOCUMENT_PREVIEW_MODE = config('DOCUMENT_PREVIEW_MODE', default='lazy' if DEBUG else 'celery')
+
+# Route limits of apps.core.middleware.RateLimitMiddleware (RATELIMIT_RULES). Off by
+# default: they count page views too, so set this only with limits sized for real traffic.
+RATELIMIT_MIDDLEWARE_ENABLE = config('RATELIMIT_MIDDLEWARE_ENABLE', default=False, cast=bool)
+
+# Session activity is written to user_sessions at most once per this many seconds
+SESSION_ACTIVITY_GRANULARITY = config('SESSION_ACTIVITY_GRANULARITY', default=60, cast=int)
+
+# Report security middleware timings in a Server-Timing response header
+SECURITY_SERVER_TIMING = config('SECURITY_SERVER_TIMING', default=DEBUG, cast=bool)
 
 # Login/Logout URLs
 LOGIN_URL = '/accounts/login/'
@@ -29,6 +29,8 @@ const AdminUsers: React.FC = () => {
   const [users, setUsers] = useState<User[]>([]);
   const [roles, setRoles] = useState<Role[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextPage, setNextPage] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState('');
   const [searchTerm, setSearchTerm] = useState('');
   const [roleFilter, setRoleFilter] = useState('');
@@ -72,6 +74,7 @@ const AdminUsers: React.FC = () => {
       
       const response = await userService.getUsers(params);
       setUsers(response.users);
+      setNextPage(response.next);
     } catch (err) {
       setError('Failed to load users');
       console.error('Error fetching users:', err);
@@ -80,6 +83,22 @@ const AdminUsers: React.FC = () => {
     }
   }, [searchTerm, roleFilter, statusFilter]);
 
+  // The list is paginated; each click appends the next page
+  const loadMoreUsers = async () => {
+    if (!nextPage) return;
+    try {
+      setLoadingMore(true);
+      const response = await userService.getUserPage(nextPage);
+      setUsers(current => [...current, ...response.users]);
+      setNextPage(response.next);
+    } catch (err) {
+      setError('Failed to load more users');
+      console.error('Error fetching users:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const fetchRoles = useCallback(async () => {
     try {
       const response = await userService.getRoles();
@@ -411,6 +430,18 @@ const AdminUsers: React.FC = () => {
           </div>
         )}
 
+        {nextPage && !loading && (
+          <div className="pt-4 text-center">
+            <button
+              onClick={loadMoreUsers}
+              disabled={loadingMore}
+              className="inline-flex items-center px-4 py-2 border border-gray-300 shadow-sm text-sm font-medium rounded-md text-gray-700 bg-white hover:bg-gray-50 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-primary-500 disabled:opacity-50"
+            >
+              {loadingMore ? 'Loading...' : 'Load more users'}
+            </button>
+          </div>
+        )}
+
         {filteredUsers.length === 0 && !loading && (
           <div className="px-4 py-12 text-center">
             <UserIcon className="mx-auto h-12 w-12 text-gray-400" />
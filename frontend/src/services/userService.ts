@@ -35,6 +35,12 @@ export interface User {
   notification_preferences: NotificationPreferences;
 }
 
+export interface UserPage {
+  users: User[];
+  next: string | null;
+  previous: string | null;
+}
+
 export interface Role {
   id: string;
   name: string;
@@ -76,7 +82,7 @@ class UserService {
     search?: string;
     role?: string;
     status?: string;
-  }): Promise<{ users: User[] }> {
+  }): Promise<UserPage> {
     const queryParams = new URLSearchParams();
     
     if (params?.search) queryParams.append('search', params.search);
@@ -85,6 +91,11 @@ class UserService {
     
     const url = `${API_BASE_URL}accounts/api/users/${queryParams.toString() ? '?' + queryParams.toString() : ''}`;
     
+    return this.getUserPage(url);
+  }
+
+  // Follows a `next` / `previous` link from a previous page; it keeps the filters
+  async getUserPage(url: string): Promise<UserPage> {
     const response = await fetch(url, {
       method: 'GET',
       headers: this.getAuthHeaders(),